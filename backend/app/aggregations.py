@@ -0,0 +1,214 @@
+# Aggregation-based retrieval layer
+# Each chat intent declares the fields its response template actually reads
+# (INTENT_FIELDS). Pipelines join the related collections server-side with
+# $lookup and project only those fields, so an order/user/product answer is a
+# single round trip with a minimal payload.
+
+# ============================================================================
+# FIELDS NEEDED PER INTENT
+# ============================================================================
+# intent -> {collection: [fields]}; a collection that is not listed is not joined
+
+INTENT_FIELDS = {
+    "order_status": {
+        "orders": ["order_id", "status"],
+    },
+    "order_shipping": {
+        "orders": ["order_id", "user_id", "status", "created_at", "shipped_at", "delivered_at"],
+    },
+    "user_info": {
+        "users": ["id", "first_name", "last_name", "email", "age", "city", "state"],
+    },
+    "user_with_orders": {
+        "users": ["id", "first_name", "last_name", "city", "state"],
+        "orders": ["order_id", "status"],
+    },
+    "product_details": {
+        "products": ["id", "name", "brand", "retail_price", "category", "department"],
+        "inventory_items": ["id"],
+    },
+    "shipping_origin": {
+        "users": ["id", "city", "latitude", "longitude"],
+        "distribution_centers": ["id", "name", "distance_m"],
+    },
+}
+
+
+def projection(fields):
+    """Build a $project stage body for the given fields (always dropping _id unless asked for)"""
+    stage = {field: 1 for field in fields}
+    if "_id" not in stage:
+        stage["_id"] = 0
+    return stage
+
+
+def intent_projection(intent, collection_name):
+    """Projection for a plain find() from the intent's field contract"""
+    return projection(INTENT_FIELDS[intent][collection_name])
+
+
+def _lookup(from_collection, local_field, foreign_field, as_field, fields, limit=None, extra_stages=None):
+    """$lookup with a concise correlated sub-pipeline (equality join uses the foreign index)"""
+    pipeline = []
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.extend(extra_stages or [])
+    pipeline.append({"$project": projection(fields)})
+    return {"$lookup": {
+        "from": from_collection,
+        "localField": local_field,
+        "foreignField": foreign_field,
+        "pipeline": pipeline,
+        "as": as_field,
+    }}
+
+
+def order_pipeline(order_id, intent="order_status"):
+    """
+    orders -> order_items -> products for one order
+    Items (and their products) are only joined when the intent needs them
+    """
+    fields = INTENT_FIELDS[intent]
+    stages = [
+        {"$match": {"order_id": int(order_id)}},
+        {"$limit": 1},
+    ]
+    order_fields = list(fields["orders"])
+    if "order_items" in fields:
+        item_stages = []
+        item_fields = list(fields["order_items"])
+        if "products" in fields:
+            item_stages.append(_lookup("products", "product_id", "id", "product", fields["products"]))
+            item_stages.append({"$unwind": {"path": "$product", "preserveNullAndEmptyArrays": True}})
+            item_fields.append("product")
+        stages.append(_lookup("order_items", "order_id", "order_id", "items", item_fields, extra_stages=item_stages))
+        order_fields.append("items")
+    stages.append({"$project": projection(order_fields)})
+    return stages
+
+
+def user_pipeline(user_id, intent="user_info", order_limit=3):
+    """users (-> orders) for one user, matched by numeric id or by _id"""
+    fields = INTENT_FIELDS[intent]
+    stages = [
+        {"$match": {"$or": [{"id": int(user_id)}, {"_id": user_id}]}},
+        {"$limit": 1},
+    ]
+    user_fields = list(fields["users"])
+    if "orders" in fields:
+        stages.append(_lookup("orders", "id", "user_id", "orders", fields["orders"], limit=order_limit))
+        user_fields.append("orders")
+    stages.append({"$project": projection(user_fields)})
+    return stages
+
+
+def product_pipeline(product_id, intent="product_details", inventory_limit=3):
+    """products -> inventory_items for one product"""
+    fields = INTENT_FIELDS[intent]
+    stages = [
+        {"$match": {"id": int(product_id)}},
+        {"$limit": 1},
+    ]
+    product_fields = list(fields["products"])
+    if "inventory_items" in fields:
+        stages.append(_lookup("inventory_items", "id", "product_id", "inventory", fields["inventory_items"], limit=inventory_limit))
+        product_fields.append("inventory")
+    stages.append({"$project": projection(product_fields)})
+    return stages
+
+
+# ============================================================================
+# ANALYTICS
+# ============================================================================
+# $group equivalents of the columnar snapshot in app.analytics, used until the
+# snapshot is loaded (and as the baseline in benchmarks/bench_analytics)
+
+# Order item statuses that do not count as sales (same as app.analytics)
+NON_SALE_STATUSES = ["Cancelled", "Returned"]
+
+
+def _timestamp_bound(value):
+    """Dataset timestamps are "YYYY-MM-DD HH:MM:SS UTC" strings, so a string range compares correctly"""
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _window_match(question, only_sales=False):
+    match = {}
+    created = {}
+    if question.since is not None:
+        created["$gte"] = _timestamp_bound(question.since)
+    if question.until is not None:
+        created["$lt"] = _timestamp_bound(question.until)
+    if created:
+        match["created_at"] = created
+    if only_sales:
+        match["status"] = {"$nin": NON_SALE_STATUSES}
+    return {"$match": match}
+
+
+def analytics_pipeline(question):
+    """(collection, pipeline) answering an app.analytics.AnalyticsQuestion with $group"""
+    if question.kind == "orders":
+        return "orders", [
+            _window_match(question),
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+        ]
+
+    if question.kind == "revenue" and question.group_by == "status":
+        return "order_items", [
+            _window_match(question),
+            {"$group": {"_id": "$status", "revenue": {"$sum": "$sale_price"}, "units": {"$sum": 1}}},
+            {"$sort": {"revenue": -1}},
+        ]
+
+    stages = [_window_match(question, only_sales=True)]
+    if question.kind == "top_products":
+        rank = question.rank_by
+        return "order_items", stages + [
+            {"$group": {"_id": "$product_id", "units": {"$sum": 1}, "revenue": {"$sum": "$sale_price"}}},
+            {"$sort": {rank: -1, "_id": 1}},
+            {"$limit": question.limit},
+            _lookup("products", "_id", "id", "product", ["name", "brand"]),
+            {"$unwind": {"path": "$product", "preserveNullAndEmptyArrays": True}},
+            {"$project": {"units": 1, "revenue": 1, "name": "$product.name", "brand": "$product.brand"}},
+        ]
+
+    if question.kind == "revenue" and question.group_by:
+        field = question.group_by
+        # Group by product first so the join runs once per product, not per item
+        return "order_items", stages + [
+            {"$group": {"_id": "$product_id", "units": {"$sum": 1}, "revenue": {"$sum": "$sale_price"}}},
+            _lookup("products", "_id", "id", "product", [field]),
+            {"$unwind": "$product"},
+            {"$group": {"_id": f"$product.{field}", "revenue": {"$sum": "$revenue"}, "units": {"$sum": "$units"}}},
+            {"$sort": {"revenue": -1}},
+        ]
+
+    # Totals (revenue, items and distinct orders), also used for the average order value
+    return "order_items", stages + [
+        {"$group": {"_id": "$order_id", "revenue": {"$sum": "$sale_price"}, "units": {"$sum": 1}}},
+        {"$group": {"_id": None, "revenue": {"$sum": "$revenue"}, "units": {"$sum": "$units"},
+                    "orders": {"$sum": 1}}},
+    ]
+
+
+def nearest_center_pipeline(latitude, longitude):
+    """Nearest distribution center to a point ($geoNear on the location_2dsphere index)"""
+    return [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [float(longitude), float(latitude)]},
+            "key": "location",
+            "distanceField": "distance_m",
+            "spherical": True,
+        }},
+        {"$limit": 1},
+        {"$project": projection(INTENT_FIELDS["shipping_origin"]["distribution_centers"])},
+    ]
+
+
+def first_result(cursor):
+    """Return the first document of an aggregation cursor, or None"""
+    for doc in cursor:
+        return doc
+    return None
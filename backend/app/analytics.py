@@ -0,0 +1,484 @@
+# Columnar analytics snapshot
+# Aggregate questions ("top selling products this week", "revenue by category",
+# "how many orders are still Processing") are answered from an in-memory,
+# column-oriented copy of orders, order_items and products: one NumPy array per
+# field, strings dictionary-encoded to int32 codes, and group-bys done with
+# np.bincount over those codes - milliseconds per question, no MongoDB round trip.
+#
+# The snapshot is refreshed incrementally on a schedule: documents with an _id
+# above the last one loaded are appended. A collection whose document count no
+# longer adds up (deletes) or that the dataset sync changed is reloaded in full.
+# Until the first load finishes, chat_logic answers with the equivalent $group
+# pipelines from app.aggregations.
+
+import copy
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from app.aggregations import NON_SALE_STATUSES
+from app.config import settings
+from app.database import get_database
+from app.intent_router import TOP_PRODUCTS
+
+# ============================================================================
+# QUESTIONS
+# ============================================================================
+
+# Lowercase status word -> status value in the dataset
+STATUS_WORDS = {
+    "processing": "Processing", "shipped": "Shipped", "complete": "Complete",
+    "completed": "Complete", "delivered": "Complete", "cancelled": "Cancelled",
+    "canceled": "Cancelled", "returned": "Returned",
+}
+STATUS_PATTERN = re.compile(r"\b(" + "|".join(STATUS_WORDS) + r")\b")
+GROUP_BY_PATTERN = re.compile(r"\b(?:by|per)\s+(category|categories|brands?|departments?|status)\b")
+LAST_N_PATTERN = re.compile(r"\b(?:last|past)\s+(\d+)\s+(day|week|month)s?\b")
+TOP_N_PATTERN = re.compile(r"\btop\s+(\d+)\b")
+TOP_PRODUCTS_PATTERN = re.compile(rf"\b{TOP_PRODUCTS}\b")
+
+GROUP_BY_FIELDS = {"category": "category", "categories": "category", "brand": "brand",
+                   "brands": "brand", "department": "department", "departments": "department",
+                   "status": "status"}
+
+MAX_TOP_N = 20
+
+
+@dataclass
+class AnalyticsQuestion:
+    """A parsed aggregate question"""
+    kind: str                 # "top_products", "revenue", "orders" or "average_order_value"
+    group_by: str = None      # revenue by "category", "brand", "department" or "status"
+    status: str = None        # order status filter ("how many orders are Processing")
+    rank_by: str = "units"    # top products by "units" or "revenue"
+    period: str = "all time"  # label for the answer
+    since: datetime = None    # UTC, inclusive
+    until: datetime = None    # UTC, exclusive
+    limit: int = 5
+
+
+def parse_period(text, now):
+    """(label, since, until) for the time window named in the question"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week = today - timedelta(days=today.weekday())
+    month = today.replace(day=1)
+    match = LAST_N_PATTERN.search(text)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        days = count * {"day": 1, "week": 7, "month": 30}[unit]
+        return f"last {count} {unit}{'s' if count != 1 else ''}", now - timedelta(days=days), None
+    if "yesterday" in text:
+        return "yesterday", today - timedelta(days=1), today
+    if "today" in text:
+        return "today", today, None
+    if "last week" in text:
+        return "last week", week - timedelta(days=7), week
+    if "this week" in text:
+        return "this week", week, None
+    if "last month" in text:
+        return "last month", (month - timedelta(days=1)).replace(day=1), month
+    if "this month" in text:
+        return "this month", month, None
+    if "this year" in text:
+        return "this year", today.replace(month=1, day=1), None
+    return "all time", None, None
+
+
+def parse_question(message, now=None):
+    """Turn an analytics message into an AnalyticsQuestion"""
+    text = message.lower()
+    now = now or datetime.now(timezone.utc)
+    period, since, until = parse_period(text, now)
+    status = STATUS_PATTERN.search(text)
+    group_by = GROUP_BY_PATTERN.search(text)
+    top_n = TOP_N_PATTERN.search(text)
+    question = AnalyticsQuestion(
+        kind="revenue", period=period, since=since, until=until,
+        status=STATUS_WORDS[status.group(1)] if status else None,
+        group_by=GROUP_BY_FIELDS[group_by.group(1)] if group_by else None,
+        limit=min(int(top_n.group(1)), MAX_TOP_N) if top_n and int(top_n.group(1)) > 0 else 5,
+    )
+    if TOP_PRODUCTS_PATTERN.search(text) or any(
+            term in text for term in ("top selling", "best selling", "best seller", "most popular")):
+        question.kind = "top_products"
+        question.rank_by = "revenue" if "revenue" in text else "units"
+    elif "average order value" in text:
+        question.kind = "average_order_value"
+    elif "revenue" not in text and "sales" not in text:
+        question.kind = "orders"
+    return question
+
+
+# ============================================================================
+# COLUMNAR TABLES
+# ============================================================================
+
+def parse_timestamps(values):
+    """Dataset timestamp strings ("2022-02-20 10:57:00 UTC") -> datetime64[s] (NaT if missing)"""
+    parsed = pd.to_datetime(pd.Series(values, dtype="string").str.removesuffix(" UTC"),
+                            utc=True, errors="coerce", format="ISO8601")
+    return parsed.dt.tz_convert(None).to_numpy(dtype="datetime64[s]")
+
+
+def to_datetime64(value):
+    """UTC datetime -> numpy datetime64[s] for comparisons against timestamp columns"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "s")
+
+
+class Dictionary:
+    """Stable string <-> int32 code mapping for one column (-1 = missing)"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values):
+        """Codes for a batch of values (new values get the next free codes)"""
+        batch_codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            mapping[i] = code
+        mapping[-1] = -1  # factorize marks missing values with -1
+        return mapping[batch_codes]
+
+    def code(self, value):
+        return self.codes.get(value, -1)
+
+    def decode(self, code):
+        return self.values[code] if code >= 0 else None
+
+
+# Column kinds: "int" (int64, -1 if missing), "float" (float64, 0 if missing),
+# "time" (datetime64[s], NaT if missing), "text" (dictionary-encoded int32)
+EMPTY = {
+    "int": lambda: np.empty(0, dtype=np.int64),
+    "float": lambda: np.empty(0, dtype=np.float64),
+    "time": lambda: np.empty(0, dtype="datetime64[s]"),
+    "text": lambda: np.empty(0, dtype=np.int32),
+}
+
+
+class ColumnarTable:
+    """
+    One collection held as NumPy columns
+    Appends build new arrays and swap them in at once, so readers always see
+    columns of equal length.
+    """
+
+    def __init__(self, collection, columns, key):
+        self.collection = collection
+        self.columns = columns  # field -> kind
+        self.key = key
+        self.dictionaries = {field: Dictionary() for field, kind in columns.items() if kind == "text"}
+        self.data = {field: EMPTY[kind]() for field, kind in columns.items()}
+        self.last_id = None
+        self._key_order = None  # argsort of the key column, built on first lookup
+
+    def __len__(self):
+        return len(self.data[self.key])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.data.values())
+
+    def convert(self, field, values):
+        kind = self.columns[field]
+        if kind == "text":
+            return self.dictionaries[field].encode(values)
+        if kind == "time":
+            return parse_timestamps(values)
+        numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+        if kind == "int":
+            return numbers.fillna(-1).to_numpy(dtype=np.int64)
+        return numbers.fillna(0.0).to_numpy(dtype=np.float64)
+
+    def append(self, docs):
+        """Append a batch of documents (sorted by _id)"""
+        batch = {field: self.convert(field, [doc.get(field) for doc in docs]) for field in self.columns}
+        self.data = {field: np.concatenate([self.data[field], batch[field]]) for field in self.columns}
+        self._key_order = None
+        self.last_id = docs[-1]["_id"]
+
+    def load(self, db, batch_size, since_last=True):
+        """Append the documents added since the last load (or all of them); returns the count"""
+        query = {"_id": {"$gt": self.last_id}} if since_last and self.last_id is not None else {}
+        projection = {field: 1 for field in self.columns}
+        cursor = db[self.collection].find(query, projection).sort("_id", 1).batch_size(batch_size)
+        loaded = 0
+        while True:
+            docs = list(islice(cursor, batch_size))
+            if not docs:
+                return loaded
+            self.append(docs)
+            loaded += len(docs)
+
+    def rows_for(self, keys):
+        """Row index of each key (-1 where the key is not in the table)"""
+        column = self.data[self.key]
+        order = self._key_order
+        if order is None:
+            order = self._key_order = np.argsort(column, kind="stable")
+        if not len(column):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.searchsorted(column, keys, sorter=order)
+        positions = np.minimum(positions, len(column) - 1)
+        rows = order[positions]
+        return np.where(column[rows] == keys, rows, -1)
+
+    def decode(self, field, code):
+        return self.dictionaries[field].decode(int(code))
+
+
+TABLES = {
+    "orders": ({"order_id": "int", "user_id": "int", "status": "text", "created_at": "time"}, "order_id"),
+    "order_items": ({"order_id": "int", "product_id": "int", "status": "text",
+                     "created_at": "time", "sale_price": "float"}, "order_id"),
+    "products": ({"id": "int", "name": "text", "brand": "text", "category": "text",
+                  "department": "text"}, "id"),
+}
+
+
+# ============================================================================
+# SNAPSHOT
+# ============================================================================
+
+def top_rows(scores, ids, limit):
+    """Rows of the `limit` highest non-zero scores, ties broken by ascending id"""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > limit:
+        # Keep everything tied with the limit-th score so the id tie-break is exact
+        threshold = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+        candidates = candidates[scores[candidates] >= threshold]
+    order = np.lexsort((ids[candidates], -scores[candidates]))
+    return candidates[order][:limit]
+
+
+class AnalyticsSnapshot:
+    """Holds the columnar tables, answers questions and refreshes on a schedule"""
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.ANALYTICS_LOAD_BATCH_SIZE
+        self.tables = None
+        self.refreshed_at = None
+        self.refresh_seconds = None
+        self.full_reloads = 0
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_ready(self):
+        return self.tables is not None
+
+    # ------------------------------------------------------------------
+    # refresh
+    # ------------------------------------------------------------------
+
+    def mark_stale(self, collections):
+        """Reload these collections in full on the next refresh (e.g. after a dataset sync)"""
+        with self._lock:
+            self._stale.update(name for name in collections if name in TABLES)
+
+    def _reload(self, db, name):
+        columns, key = TABLES[name]
+        table = ColumnarTable(name, columns, key)
+        table.load(db, self.batch_size, since_last=False)
+        self.full_reloads += 1
+        return table
+
+    def refresh(self, db=None):
+        """Append new documents; reload collections that changed in place"""
+        db = db if db is not None else get_database()
+        with self._lock:
+            stale, self._stale = self._stale, set()
+            start = time.perf_counter()
+            try:
+                tables = dict(self.tables or {})
+                for name in TABLES:
+                    if name not in tables or name in stale:
+                        tables[name] = self._reload(db, name)
+                        continue
+                    # Append to a copy: readers keep the table they started with
+                    table = tables[name] = copy.copy(tables[name])
+                    expected = db[name].estimated_document_count()
+                    before = len(table)
+                    table.load(db, self.batch_size)
+                    # Fewer rows than documents: inserted below the last _id;
+                    # more rows before the append than now exist: deletes
+                    if len(table) < expected or before > expected:
+                        tables[name] = self._reload(db, name)
+            except Exception as e:
+                self._stale.update(stale)
+                print(f"❌ Error refreshing analytics snapshot: {e}")
+                return False
+            self.tables = tables
+            self.refreshed_at = time.time()
+            self.refresh_seconds = time.perf_counter() - start
+        return True
+
+    def start(self, interval_seconds=None):
+        """Load the snapshot now, then refresh it every interval_seconds (0: load once)"""
+        interval = settings.ANALYTICS_REFRESH_SECONDS if interval_seconds is None else interval_seconds
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+
+        def loop():
+            if self.refresh():
+                print(f"✅ Built analytics snapshot: "
+                      f"{', '.join(f'{len(t):,} {n}' for n, t in self.tables.items())} "
+                      f"in {self.refresh_seconds:.2f}s")
+            while interval > 0 and not self._stop.wait(interval):
+                self.refresh()
+
+        self._thread = threading.Thread(target=loop, name="analytics-refresh", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self):
+        tables = self.tables or {}
+        return {
+            "ready": self.is_ready,
+            "rows": {name: len(table) for name, table in tables.items()},
+            "approx_bytes": sum(table.nbytes for table in tables.values()),
+            "refreshed_at": self.refreshed_at,
+            "refresh_seconds": round(self.refresh_seconds, 3) if self.refresh_seconds is not None else None,
+            "full_reloads": self.full_reloads,
+            "refresh_interval_seconds": settings.ANALYTICS_REFRESH_SECONDS,
+        }
+
+    # ------------------------------------------------------------------
+    # queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _window(table, question):
+        """Rows whose created_at falls in the question's time window"""
+        created = table.data["created_at"]
+        mask = np.ones(len(created), dtype=bool)
+        if question.since is not None:
+            mask &= created >= to_datetime64(question.since)
+        if question.until is not None:
+            mask &= created < to_datetime64(question.until)
+        return mask
+
+    def _sales(self, items, question, only_sales=True):
+        mask = self._window(items, question)
+        if only_sales:
+            excluded = [items.dictionaries["status"].code(status) for status in NON_SALE_STATUSES]
+            mask &= ~np.isin(items.data["status"], excluded)
+        return mask
+
+    @staticmethod
+    def data_through(tables):
+        """Latest order timestamp in the snapshot (ISO string)"""
+        created = tables["orders"].data["created_at"]
+        created = created[~np.isnat(created)]
+        return str(created.max()).replace("T", " ") if len(created) else None
+
+    def top_products(self, tables, question):
+        items, products = tables["order_items"], tables["products"]
+        mask = self._sales(items, question)
+        rows = products.rows_for(items.data["product_id"][mask])
+        found = rows >= 0
+        rows = rows[found]
+        units = np.bincount(rows, minlength=len(products)).astype(np.float64)
+        revenue = np.bincount(rows, weights=items.data["sale_price"][mask][found], minlength=len(products))
+        scores = revenue if question.rank_by == "revenue" else units
+        return {"rows": [{
+            "id": int(products.data["id"][row]),
+            "name": products.decode("name", products.data["name"][row]),
+            "brand": products.decode("brand", products.data["brand"][row]),
+            "units": int(units[row]),
+            "revenue": round(float(revenue[row]), 2),
+        } for row in top_rows(scores, products.data["id"], question.limit)]}
+
+    def revenue(self, tables, question):
+        items = tables["order_items"]
+        if question.group_by == "status":
+            mask = self._sales(items, question, only_sales=False)
+            codes, dictionary = items.data["status"][mask], items.dictionaries["status"]
+            prices = items.data["sale_price"][mask]
+        elif question.group_by:
+            products = tables["products"]
+            mask = self._sales(items, question)
+            rows = products.rows_for(items.data["product_id"][mask])
+            found = rows >= 0
+            codes = products.data[question.group_by][rows[found]]
+            dictionary = products.dictionaries[question.group_by]
+            prices = items.data["sale_price"][mask][found]
+        else:
+            mask = self._sales(items, question)
+            return {"revenue": round(float(items.data["sale_price"][mask].sum()), 2),
+                    "units": int(mask.sum()),
+                    "orders": int(len(np.unique(items.data["order_id"][mask])))}
+
+        known = codes >= 0
+        revenue = np.bincount(codes[known], weights=prices[known], minlength=len(dictionary))
+        units = np.bincount(codes[known], minlength=len(dictionary))
+        order = [code for code in np.argsort(-revenue, kind="stable") if units[code]]
+        return {"rows": [{"key": dictionary.decode(code), "revenue": round(float(revenue[code]), 2),
+                          "units": int(units[code])} for code in order]}
+
+    def orders(self, tables, question):
+        orders = tables["orders"]
+        mask = self._window(orders, question)
+        codes = orders.data["status"][mask]
+        dictionary = orders.dictionaries["status"]
+        counts = np.bincount(codes[codes >= 0], minlength=len(dictionary))
+        by_status = {dictionary.decode(code): int(counts[code])
+                     for code in np.argsort(-counts, kind="stable") if counts[code]}
+        return {"total": int(mask.sum()), "by_status": by_status}
+
+    def average_order_value(self, tables, question):
+        totals = self.revenue(tables, AnalyticsQuestion("revenue", since=question.since, until=question.until))
+        totals["average"] = round(totals["revenue"] / totals["orders"], 2) if totals["orders"] else 0.0
+        return totals
+
+    def run(self, question):
+        """Answer a parsed question from the snapshot"""
+        tables = self.tables
+        result = getattr(self, question.kind)(tables, question)
+        result["data_through"] = self.data_through(tables)
+        return result
+
+
+def result_from_pipeline(question, rows):
+    """Normalize the rows of the $group fallback pipeline to the snapshot's result format"""
+    if question.kind == "top_products":
+        return {"rows": [{"id": row["_id"], "name": row.get("name"), "brand": row.get("brand"),
+                          "units": row["units"], "revenue": round(row["revenue"], 2)} for row in rows]}
+    if question.kind == "orders":
+        by_status = {row["_id"]: row["count"] for row in rows if row["_id"] is not None}
+        return {"total": sum(row["count"] for row in rows), "by_status": by_status}
+    if question.kind == "revenue" and question.group_by:
+        return {"rows": [{"key": row["_id"], "revenue": round(row["revenue"], 2), "units": row["units"]}
+                         for row in rows if row["_id"] is not None]}
+    totals = rows[0] if rows else {"revenue": 0.0, "units": 0, "orders": 0}
+    result = {"revenue": round(totals["revenue"], 2), "units": totals["units"], "orders": totals["orders"]}
+    if question.kind == "average_order_value":
+        result["average"] = round(result["revenue"] / result["orders"], 2) if result["orders"] else 0.0
+    return result
+
+
+# Global analytics snapshot
+analytics = AnalyticsSnapshot()
@@ -0,0 +1,421 @@
+# Think41 E-commerce Chatbot - asyncio-native RAG System
+# Same behaviour as app.chat_logic, but every MongoDB round trip goes through the
+# async driver and the LLM calls use the pooled httpx.AsyncClient of
+# app.llm_client, so a single worker can keep many chats in flight without
+# tying up threadpool workers.
+
+import asyncio
+import inspect
+import json
+import time
+from app.async_database import get_async_database
+from app.chat_logic import EcommerceChatLogic, HELP_TEXT, LLM_UNAVAILABLE_TEXT
+from app.intent_router import route_message
+from app.config import settings
+from app.cache import cached
+from app.llm_cache import llm_response_cache
+from app.llm_client import llm_client
+from app.metrics import stage, set_intent
+from app.search import product_search, user_location_search
+from app.aggregations import (
+    order_pipeline, user_pipeline, product_pipeline, intent_projection, analytics_pipeline, nearest_center_pipeline,
+)
+from app.analytics import analytics, parse_question, result_from_pipeline
+from app.geo import distribution_centers, nearest_result
+from app.vector_search import product_vectors
+
+class StreamInterrupted(Exception):
+    """The LLM stream failed after some tokens were sent; answer is the rule-based answer"""
+    def __init__(self, answer):
+        super().__init__("LLM stream interrupted")
+        self.answer = answer
+
+class AsyncEcommerceChatLogic(EcommerceChatLogic):
+    """
+    Async variant of EcommerceChatLogic
+    Message parsing and response formatting are inherited unchanged;
+    the query_* methods, generate_contextual_response and the LLM calls are coroutines.
+    """
+    
+    def __init__(self):
+        """Initialize without opening any connection - clients are created on first use"""
+    
+    @property
+    def db(self):
+        """Shared async database handle (resolved lazily so it binds to the running event loop)"""
+        return get_async_database()
+    
+    async def aclose(self):
+        """Close the pooled LLM HTTP clients (called on application shutdown)"""
+        llm_client.close()
+        await llm_client.aclose()
+    
+    # ============================================================================
+    # DATABASE QUERIES
+    # ============================================================================
+    
+    async def aggregate_one(self, collection_name, pipeline):
+        """Run an aggregation and return its first document, or None"""
+        cursor = await self.db[collection_name].aggregate(pipeline)
+        docs = await cursor.to_list(1)
+        return docs[0] if docs else None
+    
+    @cached("orders")
+    async def query_order_status(self, order_id, user_id=None, intent="order_status"):
+        """Query order status (and, depending on the intent, its items) in one aggregation"""
+        try:
+            order = await self.aggregate_one("orders", order_pipeline(order_id, intent))
+            return self.build_order_info(order)
+        except:
+            return None
+    
+    async def query_product_availability(self, product_keywords):
+        """Query product availability across inventory fields"""
+        if product_search.is_ready:
+            return product_search.search_availability(product_keywords)
+        try:
+            query = self.build_product_availability_query(product_keywords)
+            if not query["$or"]:
+                return []
+            
+            inventory_items = await self.db.inventory_items.find(query).limit(5).to_list()
+            return [self.format_product_inventory(item) for item in inventory_items]
+        except Exception as e:
+            print(f"Error querying products: {e}")
+            return []
+    
+    async def query_analytics(self, question):
+        """Answer an aggregate question from the snapshot, or with $group until it is loaded"""
+        if analytics.is_ready:
+            return analytics.run(question)
+        try:
+            collection, pipeline = analytics_pipeline(question)
+            cursor = await self.db[collection].aggregate(pipeline)
+            return result_from_pipeline(question, await cursor.to_list())
+        except Exception as e:
+            print(f"Error running analytics query: {e}")
+            return None
+    
+    @cached("users")
+    async def query_user_info(self, user_id):
+        """Query user information by ID or ObjectId"""
+        try:
+            return await self.aggregate_one("users", user_pipeline(user_id, "user_info"))
+        except:
+            return None
+    
+    @cached("orders")
+    async def query_user_with_orders(self, user_id, limit=3):
+        """Query a user together with up to `limit` of their orders"""
+        try:
+            user = await self.aggregate_one("users", user_pipeline(user_id, "user_with_orders", order_limit=limit))
+            if not user:
+                return None, []
+            return user, user.pop("orders", [])
+        except:
+            return None, []
+    
+    async def query_user_orders(self, user_id, limit=0):
+        """Query orders for a specific user"""
+        try:
+            return await self.db.orders.find({"user_id": int(user_id)}).limit(limit).to_list()
+        except:
+            return []
+    
+    @cached("products")
+    async def query_products_by_category(self, category):
+        """Query products by category"""
+        if product_search.is_ready:
+            return product_search.search_category(category)
+        try:
+            return await self.db.products.find({"category": {"$regex": category, "$options": "i"}}).limit(5).to_list()
+        except:
+            return []
+    
+    @cached("users")
+    async def query_users_by_location(self, location):
+        """Query users by city, state or country"""
+        if user_location_search.is_ready:
+            return user_location_search.search_location(location)
+        try:
+            return await self.db.users.find({
+                "$or": [
+                    {"city": {"$regex": location, "$options": "i"}},
+                    {"state": {"$regex": location, "$options": "i"}},
+                    {"country": {"$regex": location, "$options": "i"}}
+                ]
+            }).limit(5).to_list()
+        except:
+            return []
+    
+    @cached("products")
+    async def query_product_by_id(self, product_id):
+        """Query product by ID"""
+        try:
+            return await self.db.products.find_one({"id": int(product_id)})
+        except:
+            return None
+    
+    @cached("inventory_items")
+    async def query_product_details(self, product_id):
+        """Query a product together with its first inventory items"""
+        try:
+            product = await self.aggregate_one("products", product_pipeline(product_id))
+            if not product:
+                return None, []
+            return product, product.pop("inventory", [])
+        except:
+            return None, []
+    
+    async def query_orders_batch(self, order_ids):
+        """Query several orders at once, returns {order_id: order}"""
+        try:
+            orders = await self.db.orders.find(
+                {"order_id": {"$in": [int(i) for i in order_ids]}}, intent_projection("order_status", "orders")).to_list()
+            return {str(order["order_id"]): order for order in orders}
+        except Exception as e:
+            print(f"Error querying orders batch: {e}")
+            return {}
+    
+    async def query_users_batch(self, user_ids):
+        """Query several users at once, returns {user_id: user}"""
+        try:
+            users = await self.db.users.find(
+                {"id": {"$in": [int(i) for i in user_ids]}}, intent_projection("user_info", "users")).to_list()
+            return {str(user["id"]): user for user in users}
+        except Exception as e:
+            print(f"Error querying users batch: {e}")
+            return {}
+    
+    async def query_products_batch(self, product_ids):
+        """Query several products at once, returns {product_id: product}"""
+        try:
+            products = await self.db.products.find(
+                {"id": {"$in": [int(i) for i in product_ids]}}, intent_projection("product_details", "products")).to_list()
+            return {str(product["id"]): product for product in products}
+        except Exception as e:
+            print(f"Error querying products batch: {e}")
+            return {}
+    
+    async def query_entities_batch(self, entities):
+        """Fetch every referenced order, user and product - collections queried concurrently"""
+        jobs = self.batch_queries(entities)
+        results = await asyncio.gather(*(query(ids) for _, query, ids in jobs))
+        return {key: result for (key, _, _), result in zip(jobs, results)}
+    
+    @cached("inventory_items")
+    async def query_inventory_by_product(self, product_id):
+        """Query inventory items by product ID"""
+        try:
+            return await self.db.inventory_items.find({"product_id": int(product_id)}).limit(3).to_list()
+        except:
+            return []
+    
+    @cached("products")
+    async def query_related_products(self, message):
+        """Products closest in meaning to a free-text question (vector index + one $in query)"""
+        hits = product_vectors.search(message)
+        if not hits:
+            return []
+        found = await self.query_products_batch([product_id for product_id, _ in hits])
+        return [found[str(product_id)] for product_id, _ in hits if str(product_id) in found]
+    
+    async def query_nearest_center(self, user_id=None, city=None):
+        """Nearest distribution center for a user or a city (in memory, or $geoNear until it is built)"""
+        if distribution_centers.is_ready:
+            return distribution_centers.for_user(user_id) if user_id else distribution_centers.for_city(city)
+        try:
+            origin = await self.db.users.find_one(self.shipping_origin_query(user_id, city),
+                                                  intent_projection("shipping_origin", "users"))
+            if not origin or origin.get("latitude") is None or origin.get("longitude") is None:
+                return None
+            center = await self.aggregate_one(
+                "distribution_centers", nearest_center_pipeline(origin["latitude"], origin["longitude"]))
+            if not center:
+                return None
+            return nearest_result(origin.get("city"), center, center["distance_m"] / 1000)
+        except Exception as e:
+            print(f"Error querying nearest distribution center: {e}")
+            return None
+    
+    # ============================================================================
+    # RESPONSE GENERATION
+    # ============================================================================
+    
+    async def generate_contextual_response(self, message, conversation_history, generate=True):
+        """
+        Async version of EcommerceChatLogic.generate_contextual_response
+        Same routing table; handlers that do I/O are coroutines, the rest are inherited
+        """
+        with stage("routing"):
+            routed = route_message(message)
+        set_intent(routed.intent)
+        with stage("retrieval"):
+            answer = getattr(self, self.INTENT_HANDLERS[routed.intent])(routed)
+            if inspect.isawaitable(answer):
+                answer = await answer
+        if routed.llm_context is not None and generate:
+            return await self.call_llm_with_context(message, routed.llm_context, conversation_history)
+        return answer
+    
+    async def answer_multi_entity(self, routed):
+        return self.format_multi_entity(routed.entities, await self.query_entities_batch(routed.entities))
+    
+    async def answer_order_status(self, routed):
+        order_id = routed.values[0]
+        return self.format_order_status(order_id, await self.query_order_status(order_id))
+    
+    async def answer_user_info(self, routed):
+        user_id = routed.values[0]
+        return self.format_user_info(user_id, await self.query_user_info(user_id))
+    
+    async def answer_category(self, routed):
+        category = routed.values[0]
+        return self.format_category_products(category, await self.query_products_by_category(category))
+    
+    async def answer_location(self, routed):
+        location = routed.values[0]
+        return self.format_location_users(location, await self.query_users_by_location(location))
+    
+    async def answer_product_details(self, routed):
+        product_id = routed.values[0]
+        product, inventory = await self.query_product_details(product_id)
+        return self.format_product_details(product_id, product, inventory)
+    
+    async def answer_availability(self, routed):
+        product_keywords = routed.values
+        products = await self.query_product_availability(product_keywords)
+        if not products and not routed.entities.product_keywords:
+            related = await self.query_related_products(routed.entities.message)
+            if related:
+                return self.answer_related_products(routed, related)
+        return self.format_product_availability(product_keywords, products)
+    
+    async def answer_help(self, routed):
+        related = await self.query_related_products(routed.entities.message)
+        if related:
+            return self.answer_related_products(routed, related)
+        return HELP_TEXT
+    
+    async def answer_user_orders(self, routed):
+        user_id = routed.values[0]
+        user, user_orders = await self.query_user_with_orders(user_id, limit=3)
+        return self.format_user_with_orders(user_id, user, user_orders)
+    
+    async def answer_analytics(self, routed):
+        question = parse_question(routed.entities.message)
+        return self.format_analytics(question, await self.query_analytics(question))
+    
+    async def answer_shipping(self, routed):
+        order_id, user_id, city = self.shipping_subject(routed.entities)
+        order_info = None
+        if order_id:
+            order_info = await self.query_order_status(order_id, intent="order_shipping")
+            if not order_info:
+                return self.format_order_status(order_id, None)
+            user_id = order_info["order"].get("user_id")
+        if not user_id and not city:
+            return self.format_shipping(None, None, None)
+        return self.format_shipping(order_id, order_info, await self.query_nearest_center(user_id, city))
+    
+    async def call_llm_with_context(self, user_message, context, conversation_history):
+        """Call LLM with MongoDB context to generate natural response"""
+        system_prompt, chat_history = self.build_llm_messages(user_message, context, conversation_history)
+        cached_answer = llm_response_cache.lookup(settings.GROQ_MODEL, system_prompt, context, chat_history)
+        if cached_answer is not None:
+            return cached_answer
+        
+        start = time.perf_counter()
+        with stage("llm"):
+            answer = await self.call_llm(chat_history, system_prompt)
+        if answer == LLM_UNAVAILABLE_TEXT:
+            return context or answer
+        llm_response_cache.store(settings.GROQ_MODEL, system_prompt, context, chat_history,
+                                 answer, (time.perf_counter() - start) * 1000)
+        return answer
+    
+    async def call_llm(self, messages, system_prompt):
+        """Call the LLM through the shared resilient client (see chat_logic.call_llm)"""
+        content = await llm_client.acomplete(self.build_llm_payload(messages, system_prompt))
+        if content is None:
+            return LLM_UNAVAILABLE_TEXT
+        return self.clean_llm_content(content)
+
+    # ============================================================================
+    # STREAMING
+    # ============================================================================
+    
+    async def stream_llm(self, messages, system_prompt, timings=None):
+        """
+        Stream a completion (OpenAI-compatible `stream: true` server-sent events)
+        Yields content deltas as they arrive; records ttft_ms/total_ms into `timings`
+        """
+        timings = timings if timings is not None else {}
+        payload = self.build_llm_payload(messages, system_prompt)
+        start = time.perf_counter()
+        lines = llm_client.stream_lines(payload)
+        try:
+            async for line in lines:
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    if "ttft_ms" not in timings:
+                        timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                    yield self.clean_llm_content(delta)
+        finally:
+            await lines.aclose()
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    
+    async def stream_contextual_response(self, message, conversation_history, timings=None):
+        """
+        Stream the answer to a chat message
+        The rule-based answer from generate_contextual_response is the retrieved
+        database context; the LLM rephrases it token by token. Without an LLM key,
+        or if the LLM fails (or its circuit breaker is open) before its first
+        token, the rule-based answer is sent as-is. If it fails after its first
+        token, StreamInterrupted carries the rule-based answer to store instead.
+        """
+        timings = timings if timings is not None else {}
+        start = time.perf_counter()
+        context = await self.generate_contextual_response(message, conversation_history, generate=False)
+        timings["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        
+        if llm_client.enabled:
+            system_prompt, chat_history = self.build_llm_messages(message, context, conversation_history)
+            cached_answer = llm_response_cache.lookup(settings.GROQ_MODEL, system_prompt, context, chat_history)
+            if cached_answer is not None:
+                timings["llm_cache_hit"] = True
+                yield cached_answer
+                return
+            
+            llm_timings = {}
+            parts = []
+            try:
+                # Includes the time the caller spends sending each token
+                with stage("llm"):
+                    async for delta in self.stream_llm(chat_history, system_prompt, llm_timings):
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                print(f"Groq streaming error: {e}")
+                if parts:
+                    # Part of the answer is already out: keep the rule-based one instead
+                    raise StreamInterrupted(context) from e
+            timings.update({f"llm_{key}": value for key, value in llm_timings.items()})
+            if parts:
+                if "llm_total_ms" in timings:
+                    # Only complete streams are cached
+                    llm_response_cache.store(settings.GROQ_MODEL, system_prompt, context, chat_history,
+                                             "".join(parts), timings["llm_total_ms"])
+                return
+        
+        timings["fallback"] = True
+        yield context
+
+# Initialize async chat logic instance
+async_chat_logic = AsyncEcommerceChatLogic()
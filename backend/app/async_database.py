@@ -0,0 +1,76 @@
+import os
+import threading
+from pymongo import AsyncMongoClient
+from app.config import settings
+from app.database import PoolStatsListener
+from app.metrics import command_listener
+
+# ============================================================================
+# ASYNC CLIENT REGISTRY
+# ============================================================================
+# asyncio-native counterpart of app.database, used by the async chat path.
+# One AsyncMongoClient per process, created lazily (no network I/O at import)
+# and keyed by PID so forked workers never reuse the parent's client.
+
+_client_lock = threading.Lock()
+_client = None
+_client_pid = None
+async_pool_stats_listener = PoolStatsListener()
+
+
+def _reset_after_fork():
+    """Drop the inherited async client in a forked child"""
+    global _client_lock, _client, _client_pid
+    _client_lock = threading.Lock()
+    _client = None
+    _client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_async_client():
+    """Get the shared AsyncMongoClient for this process"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                async_pool_stats_listener.reset()
+                _client = AsyncMongoClient(
+                    settings.MONGO_URI,
+                    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                    minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+                    serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    event_listeners=[async_pool_stats_listener, command_listener],
+                    connect=False,
+                )
+                _client_pid = pid
+    return _client
+
+
+async def close_async_client():
+    """Close the shared AsyncMongoClient (called on application shutdown)"""
+    global _client, _client_pid
+    client = _client
+    _client = None
+    if client is not None and _client_pid == os.getpid():
+        await client.close()
+    _client_pid = None
+
+
+def get_async_pool_stats():
+    """Get connection pool statistics for the shared async client"""
+    stats = async_pool_stats_listener.snapshot()
+    stats["max_pool_size"] = settings.MONGO_MAX_POOL_SIZE
+    stats["min_pool_size"] = settings.MONGO_MIN_POOL_SIZE
+    stats["client_initialized"] = _client is not None and _client_pid == os.getpid()
+    return stats
+
+
+def get_async_database():
+    """Get MongoDB database from the shared async client"""
+    return get_async_client()[settings.DATABASE_NAME]
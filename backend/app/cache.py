@@ -0,0 +1,307 @@
+# Read-through cache for the EcommerceChatLogic query methods
+# Catalog and user data are static between data loads, so lookups are served
+# from a cache with per-collection TTLs. Backends:
+#   - LRUTTLCache: in-process LRU with TTL and a size limit (default)
+#   - SharedCacheBackend: any Redis-compatible client, shared across workers
+# Order data changes, so its namespace has a short (default 0 = bypass) TTL.
+
+import fnmatch
+import functools
+import inspect
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from app.config import settings
+
+_MISSING = object()
+
+# namespace -> names of the query methods cached in it (registered by @cached)
+CACHED_METHODS = {}
+
+
+class CacheStats:
+    """Hit/miss/eviction counters per namespace"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def incr(self, namespace, counter, amount=1):
+        with self._lock:
+            ns = self.counters.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+            ns[counter] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {ns: dict(c) for ns, c in self.counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+
+
+class LRUTTLCache:
+    """
+    In-process LRU cache with per-entry TTL and a maximum number of entries
+    Expired entries are dropped lazily on access; the least recently used entry
+    is evicted when the cache is full.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.on_evict = None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                if self.on_evict:
+                    self.on_evict(evicted_key)
+
+    def delete(self, keys):
+        with self._lock:
+            return sum(1 for key in keys if self._entries.pop(key, None) is not None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedCacheBackend:
+    """
+    Cache backend over a Redis-compatible client (get/set with ex/delete/scan_iter)
+    Values are pickled; TTL and eviction are handled by the server.
+    """
+
+    KEY_PREFIX = "think41:cache:"
+
+    def __init__(self, client):
+        self.client = client
+        self.on_evict = None
+
+    def get(self, key):
+        raw = self.client.get(self.KEY_PREFIX + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.KEY_PREFIX + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, keys):
+        return self.client.delete(*[self.KEY_PREFIX + key for key in keys]) if keys else 0
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.KEY_PREFIX + prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
+
+    def clear(self):
+        return self.delete_prefix("")
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.KEY_PREFIX + "*"))
+
+
+class LocalSharedStore:
+    """
+    Local stand-in for a Redis client implementing the subset SharedCacheBackend uses
+    Lets the shared backend be exercised without a Redis server.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def scan_iter(self, match="*"):
+        with self._lock:
+            names = list(self._data)
+        return iter([name for name in names if fnmatch.fnmatchcase(name, match)])
+
+
+def create_cache_backend():
+    """Create the cache backend selected by Settings.CACHE_BACKEND"""
+    if settings.CACHE_BACKEND == "redis":
+        try:
+            import redis
+            return SharedCacheBackend(redis.Redis.from_url(settings.CACHE_REDIS_URL))
+        except ImportError:
+            print("⚠️  CACHE_BACKEND=redis but the redis package is not installed - using in-process cache")
+    elif settings.CACHE_BACKEND == "local-shared":
+        return SharedCacheBackend(LocalSharedStore())
+    return LRUTTLCache(settings.CACHE_MAX_ENTRIES)
+
+
+class QueryCache:
+    """
+    Namespaced read-through cache (one namespace per MongoDB collection)
+    TTLs come from Settings.CACHE_TTL_SECONDS; a TTL of 0 bypasses the cache.
+    """
+
+    def __init__(self, backend=None):
+        self.stats = CacheStats()
+        self.set_backend(backend if backend is not None else create_cache_backend())
+
+    def set_backend(self, backend):
+        """Swap the backend (e.g. for a shared store) - counters are kept"""
+        self.backend = backend
+        self.backend.on_evict = lambda key: self.stats.incr(key.split(":", 1)[0], "evictions")
+
+    def ttl_for(self, namespace):
+        return settings.CACHE_TTL_SECONDS.get(namespace, 0)
+
+    def get_or_load(self, namespace, key, loader):
+        """Return the cached value for key, or call loader() and cache a non-empty result"""
+        ttl = self.ttl_for(namespace)
+        if ttl <= 0:
+            return loader()
+        full_key = f"{namespace}:{key}"
+        value = self._safe_get(full_key)
+        if value is not _MISSING:
+            self.stats.incr(namespace, "hits")
+            return value
+        self.stats.incr(namespace, "misses")
+        value = loader()
+        self._store(full_key, value, ttl)
+        return value
+
+    async def get_or_load_async(self, namespace, key, loader):
+        """Async variant of get_or_load - loader is a coroutine function"""
+        ttl = self.ttl_for(namespace)
+        if ttl <= 0:
+            return await loader()
+        full_key = f"{namespace}:{key}"
+        value = self._safe_get(full_key)
+        if value is not _MISSING:
+            self.stats.incr(namespace, "hits")
+            return value
+        self.stats.incr(namespace, "misses")
+        value = await loader()
+        self._store(full_key, value, ttl)
+        return value
+
+    def _safe_get(self, full_key):
+        # A cache failure must never fail the query
+        try:
+            return self.backend.get(full_key)
+        except Exception as e:
+            print(f"⚠️  Cache read error: {e}")
+            return _MISSING
+
+    def _store(self, full_key, value, ttl):
+        # None/empty results are not cached: query methods also return them on errors
+        if value is None or value == [] or value == (None, []):
+            return
+        try:
+            self.backend.set(full_key, value, ttl)
+        except Exception as e:
+            print(f"⚠️  Cache write error: {e}")
+
+    def invalidate(self, namespace=None, method=None):
+        """
+        Drop cached entries for one namespace (or only one query method of it),
+        or everything (call after data reloads)
+        """
+        if namespace is None:
+            count = self.backend.clear()
+        elif method is None:
+            count = self.backend.delete_prefix(f"{namespace}:")
+        else:
+            count = self.backend.delete_prefix(f"{namespace}:{method}:")
+        self.stats.incr(namespace or "*", "invalidations")
+        return count
+
+    def invalidate_keys(self, namespace, method, ids):
+        """
+        Drop the entries of method(id) for each id (positional call, id as str or
+        int) - a changed row only costs the lookups of that row
+        """
+        keys = [f"{namespace}:{method}:{(form,)!r}:[]" for value in ids for form in {str(value), value}]
+        count = self.backend.delete(keys)
+        self.stats.incr(namespace, "invalidations")
+        return count
+
+    def get_stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "ttl_seconds": dict(settings.CACHE_TTL_SECONDS),
+            "namespaces": self.stats.snapshot(),
+        }
+
+
+query_cache = QueryCache()
+
+
+def cached(namespace):
+    """
+    Decorator for EcommerceChatLogic query methods (sync or async)
+    The key is the method name plus its arguments, so the sync and async
+    variants of a query share cache entries.
+    """
+    def decorator(func):
+        CACHED_METHODS.setdefault(namespace, set()).add(func.__name__)
+
+        def make_key(args, kwargs):
+            return f"{func.__name__}:{args!r}:{sorted(kwargs.items())!r}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                return await query_cache.get_or_load_async(
+                    namespace, make_key(args, kwargs), lambda: func(self, *args, **kwargs))
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return query_cache.get_or_load(namespace, make_key(args, kwargs), lambda: func(self, *args, **kwargs))
+        return wrapper
+    return decorator
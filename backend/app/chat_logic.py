@@ -3,10 +3,47 @@
 # and generating contextual responses using the LLM (Groq API)
 
 import re
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from app.database import get_database
 from app.config import settings
+from app.cache import cached
+from app.llm_cache import llm_response_cache
+from app.llm_client import llm_client
+from app.metrics import stage, set_intent
+from app.search import product_search, user_location_search
+from app.aggregations import (
+    order_pipeline, user_pipeline, product_pipeline, first_result, intent_projection, analytics_pipeline,
+    nearest_center_pipeline,
+)
+from app.analytics import analytics, parse_question, result_from_pipeline
+from app.geo import distribution_centers, nearest_result, arrival_window
+from app.vector_search import product_vectors
+from app.intent_router import route_message, extract_entities
+
+# Fallback answer listing the supported query types
+HELP_TEXT = "I can help with:\n• Order status (order #123)\n• User details (user 123)\n• Product categories (socks, accessories)\n• Product details (product 123)\n• Return policy\n• Location-based users (Rio Branco)\n• Sales analytics (top selling products this week, revenue by category, orders by status)\n• Shipping estimates (when will order 123 arrive, where does user 42's order ship from)"
+
+# Patterns for extract_user_info, compiled once
+USER_PATTERNS = [
+    re.compile(r'user\s+#?(\d+)'),      # "user 123" or "user #123"
+    re.compile(r'user\s+id\s+(\d+)'),   # "user id 123"
+    re.compile(r'(\d{5})'),             # 5-digit user IDs
+    re.compile(r'(\w+)\s+(gilmore|smith|johnson)'),  # First name + last name
+]
+
+# Upper bound on IDs resolved from one message (keeps $in queries small)
+MAX_ENTITIES_PER_MESSAGE = 20
+
+# Order statuses that reached the customer (thelook has no "Delivered" status)
+DELIVERED_STATUSES = ("Complete", "Returned")
+
+# Runs the per-collection batch queries of a multi-entity message in parallel
+batch_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="chat-batch")
+
+# Returned when the LLM service cannot be reached
+LLM_UNAVAILABLE_TEXT = "I apologize, but I'm having trouble connecting to my AI service. Please try again in a moment or contact our support team directly."
 
 class EcommerceChatLogic:
     """
@@ -18,129 +55,77 @@ class EcommerceChatLogic:
     4. Generating natural language responses
     """
     
-    def __init__(self):
-        """Initialize the chat logic with database connection"""
-        self.db = get_database()
+    @property
+    def db(self):
+        """Shared database handle (resolved per use, so it follows the client after a fork or close_client())"""
+        return get_database()
         
     def extract_order_info(self, message):
         """
-        Extract order-related information from user message using regex patterns
+        Extract order-related information from user message
         Looks for patterns like "order 123", "order #123", "order number 123"
         """
-        # Define regex patterns to match order IDs in natural language
-        order_patterns = [
-            r'order\s+#?(\d+)',      # "order 123" or "order #123"
-            r'order\s+(\d+)',        # "order 123"
-            r'order\s+number\s+(\d+)', # "order number 123"
-            r'order\s+id\s+(\d+)'    # "order id 123"
-        ]
-        
-        # Try each pattern to find order ID
-        for pattern in order_patterns:
-            match = re.search(pattern, message.lower())
-            if match:
-                return match.group(1)  # Return the extracted order ID
-        return None
+        order_ids = extract_entities(message).order_ids
+        return order_ids[0] if order_ids else None
     
     def extract_product_info(self, message):
         """
         Extract product-related information from user message
-        Looks for product names, categories, and keywords
+        Looks for product keywords first, then quoted text, parentheses and 2-4 word groups
         """
-        # Define product keywords that indicate product queries
-        product_keywords = [
-            'jacket', 'shirt', 'pants', 'dress', 'shoes', 'denim', 'headband',
-            'size', 'color', 'available', 'in stock', 'satin'
-        ]
-        
-        found_keywords = []
-        message_lower = message.lower()
-        
-        # Check for exact keywords in the message
-        for keyword in product_keywords:
-            if keyword in message_lower:
-                found_keywords.append(keyword)
-        
-        # If no keywords found, try to extract product names from the message
-        if not found_keywords:
-            # Look for quoted text or specific product names using regex
-            product_patterns = [
-                r'"([^"]+)"',  # Text in quotes like "satin headband"
-                r'\(([^)]+)\)',  # Text in parentheses
-                r'(\w+(?:\s+\w+){1,3})',  # 2-4 word combinations
-            ]
-            
-            for pattern in product_patterns:
-                matches = re.findall(pattern, message)
-                for match in matches:
-                    if len(match) > 3:  # Only consider meaningful product names
-                        found_keywords.append(match.lower())
-        
-        return found_keywords
+        entities = extract_entities(message)
+        return entities.product_keywords or entities.product_phrases
     
     def extract_user_info(self, message):
         """
         Extract user-related information from user message
         Looks for user IDs, names, and other user identifiers
         """
-        # Define regex patterns to match user information
-        user_patterns = [
-            r'user\s+#?(\d+)',      # "user 123" or "user #123"
-            r'user\s+(\d+)',        # "user 123"
-            r'user\s+id\s+(\d+)',   # "user id 123"
-            r'(\d{5})',             # 5-digit user IDs
-            r'(\w+)\s+(gilmore|smith|johnson)',  # First name + last name
-        ]
-        
         # Try each pattern to find user information
-        for pattern in user_patterns:
-            match = re.search(pattern, message.lower())
+        message_lower = message.lower()
+        for pattern in USER_PATTERNS:
+            match = pattern.search(message_lower)
             if match:
                 return match.group(1)
         return None
     
-    def query_order_status(self, order_id, user_id=None):
+    @cached("orders")
+    def query_order_status(self, order_id, user_id=None, intent="order_status"):
         """
         Query order status from database
         Returns order details and associated order items
+        Single aggregation: order items (and their products) are joined server-side
+        only when the intent's field contract needs them (see app.aggregations)
         """
         try:
-            # Query orders collection by order_id
-            order = self.db.orders.find_one({"order_id": int(order_id)})
-            if not order:
-                return None
-            
-            # Get order items for this order (cross-collection query)
-            order_items = list(self.db.order_items.find({"order_id": int(order_id)}))
-            
-            return {
-                "order": order,
-                "items": order_items,
-                "status": order.get("status", "unknown")
-            }
+            order = first_result(self.db.orders.aggregate(order_pipeline(order_id, intent)))
+            return self.build_order_info(order)
         except:
             return None
     
+    def build_order_info(self, order):
+        """Split an aggregated order document into the order_info dict used by answers"""
+        if not order:
+            return None
+        order_items = order.pop("items", [])
+        return {
+            "order": order,
+            "items": order_items,
+            "status": order.get("status", "unknown")
+        }
+    
     def query_product_availability(self, product_keywords):
         """
         Query product availability from database
         Searches across multiple fields for product matches
         """
+        # Ranked in-memory search (no round trip) once the index is built
+        if product_search.is_ready:
+            return product_search.search_availability(product_keywords)
+        
         try:
-            # Build complex query to search across multiple fields
-            query = {"$or": []}
-            for keyword in product_keywords:
-                if keyword in ['size', 'available', 'in stock']:
-                    continue  # Skip generic keywords
-                query["$or"].append({
-                    "$or": [
-                        {"product_name": {"$regex": keyword, "$options": "i"}},
-                        {"product_category": {"$regex": keyword, "$options": "i"}},
-                        {"product_brand": {"$regex": keyword, "$options": "i"}},
-                        {"product_department": {"$regex": keyword, "$options": "i"}}
-                    ]
-                })
-            
+            # Fallback: regex query across multiple fields
+            query = self.build_product_availability_query(product_keywords)
             if not query["$or"]:
                 return []
             
@@ -148,66 +133,70 @@ class EcommerceChatLogic:
             inventory_items = list(self.db.inventory_items.find(query).limit(5))
             
             # Convert inventory items to product format for consistent response
-            products = []
-            for item in inventory_items:
-                product = {
-                    "name": item.get("product_name", "Unknown"),
-                    "category": item.get("product_category", "Unknown"),
-                    "brand": item.get("product_brand", "Unknown"),
-                    "price": item.get("product_retail_price", 0),
-                    "available": item.get("sold_at") is None,  # If sold_at is null, it's available
-                    "sku": item.get("product_sku", ""),
-                    "department": item.get("product_department", "")
-                }
-                products.append(product)
-            
-            return products
+            return [self.format_product_inventory(item) for item in inventory_items]
         except Exception as e:
             print(f"Error querying products: {e}")
             return []
     
+    @cached("users")
     def query_user_info(self, user_id):
         """
         Query user information from database
         Tries multiple ways to find user (by ID or ObjectId)
         """
         try:
-            # Try to find user by ID first
-            user = self.db.users.find_one({"id": int(user_id)})
-            if not user:
-                # Try by _id if it's a MongoDB ObjectId
-                user = self.db.users.find_one({"_id": user_id})
-            return user
+            # Match by numeric ID or by _id in one query, projecting only the answer fields
+            return first_result(self.db.users.aggregate(user_pipeline(user_id, "user_info")))
         except:
             return None
     
-    def query_user_orders(self, user_id):
+    @cached("orders")
+    def query_user_with_orders(self, user_id, limit=3):
+        """
+        Query a user together with up to `limit` of their orders
+        Single aggregation (users -> orders $lookup), used for mixed user + product queries
+        """
+        try:
+            user = first_result(self.db.users.aggregate(user_pipeline(user_id, "user_with_orders", order_limit=limit)))
+            if not user:
+                return None, []
+            return user, user.pop("orders", [])
+        except:
+            return None, []
+    
+    def query_user_orders(self, user_id, limit=0):
         """
         Query all orders for a specific user
         Used for cross-collection queries (users -> orders)
         """
         try:
-            orders = list(self.db.orders.find({"user_id": int(user_id)}))
+            orders = list(self.db.orders.find({"user_id": int(user_id)}).limit(limit))
             return orders
         except:
             return []
     
+    @cached("products")
     def query_products_by_category(self, category):
         """
         Query products by category
         Used for category-based product searches
         """
+        if product_search.is_ready:
+            return product_search.search_category(category)
         try:
             products = list(self.db.products.find({"category": {"$regex": category, "$options": "i"}}).limit(5))
             return products
         except:
             return []
     
+    @cached("users")
     def query_users_by_location(self, location):
         """
         Query users by location (city, state, country)
         Used for location-based user searches
         """
+        if user_location_search.is_ready:
+            return user_location_search.search_location(location)
         try:
             users = list(self.db.users.find({
                 "$or": [
@@ -220,6 +209,7 @@ class EcommerceChatLogic:
         except:
             return []
     
+    @cached("products")
     def query_product_by_id(self, product_id):
         """
         Query product by ID
@@ -231,6 +221,77 @@ class EcommerceChatLogic:
         except:
             return None
     
+    @cached("inventory_items")
+    def query_product_details(self, product_id):
+        """
+        Query a product together with its first inventory items
+        Single aggregation (products -> inventory_items $lookup), used for product details answers
+        """
+        try:
+            product = first_result(self.db.products.aggregate(product_pipeline(product_id)))
+            if not product:
+                return None, []
+            return product, product.pop("inventory", [])
+        except:
+            return None, []
+    
+    # ============================================================================
+    # BATCHED MULTI-ENTITY RETRIEVAL
+    # ============================================================================
+    # One $in query per collection for every ID referenced in a message
+    
+    def query_orders_batch(self, order_ids):
+        """Query several orders at once, returns {order_id: order}"""
+        try:
+            orders = self.db.orders.find(
+                {"order_id": {"$in": [int(i) for i in order_ids]}}, intent_projection("order_status", "orders"))
+            return {str(order["order_id"]): order for order in orders}
+        except Exception as e:
+            print(f"Error querying orders batch: {e}")
+            return {}
+    
+    def query_users_batch(self, user_ids):
+        """Query several users at once, returns {user_id: user}"""
+        try:
+            users = self.db.users.find(
+                {"id": {"$in": [int(i) for i in user_ids]}}, intent_projection("user_info", "users"))
+            return {str(user["id"]): user for user in users}
+        except Exception as e:
+            print(f"Error querying users batch: {e}")
+            return {}
+    
+    def query_products_batch(self, product_ids):
+        """Query several products at once, returns {product_id: product}"""
+        try:
+            products = self.db.products.find(
+                {"id": {"$in": [int(i) for i in product_ids]}}, intent_projection("product_details", "products"))
+            return {str(product["id"]): product for product in products}
+        except Exception as e:
+            print(f"Error querying products batch: {e}")
+            return {}
+    
+    def batch_queries(self, entities):
+        """(result key, query method, IDs) for each collection referenced by the message"""
+        jobs = [
+            ("orders", self.query_orders_batch, entities.order_ids[:MAX_ENTITIES_PER_MESSAGE]),
+            ("users", self.query_users_batch, entities.user_ids[:MAX_ENTITIES_PER_MESSAGE]),
+            ("products", self.query_products_batch, entities.product_ids[:MAX_ENTITIES_PER_MESSAGE]),
+        ]
+        return [job for job in jobs if job[2]]
+    
+    def query_entities_batch(self, entities):
+        """
+        Fetch every referenced order, user and product
+        One $in query per collection; independent collections are queried concurrently
+        """
+        jobs = self.batch_queries(entities)
+        if len(jobs) == 1:
+            key, query, ids = jobs[0]
+            return {key: query(ids)}
+        futures = {key: batch_executor.submit(query, ids) for key, query, ids in jobs}
+        return {key: future.result() for key, future in futures.items()}
+    
+    @cached("inventory_items")
     def query_inventory_by_product(self, product_id):
         """
         Query inventory items by product ID
@@ -242,6 +303,62 @@ class EcommerceChatLogic:
         except:
             return []
     
+    def query_analytics(self, question):
+        """
+        Answer an aggregate question
+        From the in-memory columnar snapshot once it is loaded, otherwise with
+        the equivalent $group pipeline
+        """
+        if analytics.is_ready:
+            return analytics.run(question)
+        try:
+            collection, pipeline = analytics_pipeline(question)
+            return result_from_pipeline(question, list(self.db[collection].aggregate(pipeline)))
+        except Exception as e:
+            print(f"Error running analytics query: {e}")
+            return None
+    
+    @cached("products")
+    def query_related_products(self, message):
+        """
+        Products closest in meaning to a free-text question ("something warm for winter")
+        Ranked ids come from the memory-mapped vector index (app.vector_search),
+        the documents from one $in query
+        """
+        hits = product_vectors.search(message)
+        if not hits:
+            return []
+        found = self.query_products_batch([product_id for product_id, _ in hits])
+        return [found[str(product_id)] for product_id, _ in hits if str(product_id) in found]
+    
+    def query_nearest_center(self, user_id=None, city=None):
+        """
+        Nearest distribution center and delivery window for a user or a city
+        Precomputed in memory once the index is built, otherwise the user's (or a
+        user in the city's) coordinates and a $geoNear aggregation
+        """
+        if distribution_centers.is_ready:
+            return distribution_centers.for_user(user_id) if user_id else distribution_centers.for_city(city)
+        try:
+            origin = self.db.users.find_one(self.shipping_origin_query(user_id, city),
+                                            intent_projection("shipping_origin", "users"))
+            if not origin or origin.get("latitude") is None or origin.get("longitude") is None:
+                return None
+            center = first_result(self.db.distribution_centers.aggregate(
+                nearest_center_pipeline(origin["latitude"], origin["longitude"])))
+            if not center:
+                return None
+            return nearest_result(origin.get("city"), center, center["distance_m"] / 1000)
+        except Exception as e:
+            print(f"Error querying nearest distribution center: {e}")
+            return None
+    
+    def shipping_origin_query(self, user_id, city):
+        """users filter for the shipping destination: the user, or any user in the city"""
+        if user_id:
+            return {"id": int(user_id)}
+        return {"city": {"$regex": f"^{re.escape(city)}$", "$options": "i"}}
+    
     def get_return_policy_info(self):
         """
         Get return policy information
@@ -253,136 +370,337 @@ class EcommerceChatLogic:
             "conditions": "Items must be unworn, unwashed, and in original packaging with tags attached."
         }
     
-    def generate_contextual_response(self, message, conversation_history):
+    # Intent (from app.intent_router) -> answer method
+    INTENT_HANDLERS = {
+        "multi_entity": "answer_multi_entity",
+        "order": "answer_order_status",
+        "user": "answer_user_info",
+        "category": "answer_category",
+        "location": "answer_location",
+        "product": "answer_product_details",
+        "availability": "answer_availability",
+        "policy": "answer_return_policy",
+        "user_orders": "answer_user_orders",
+        "analytics": "answer_analytics",
+        "shipping": "answer_shipping",
+        "help": "answer_help",
+    }
+    
+    def generate_contextual_response(self, message, conversation_history, generate=True):
         """
         Generate response using RAG approach - Simplified and effective
         This is the main method that processes user queries and generates responses
+        The message is classified once by the intent router, then answered by the
+        handler registered for its intent. Routing and retrieval are timed as
+        stages of the current chat request, tagged with the intent. Context a
+        handler retrieved for the LLM (related products) is answered by the LLM,
+        unless generate is False (streaming runs the LLM itself).
         """
-        message_lower = message.lower()
-        
-        # ============================================================================
-        # 1. ORDER STATUS QUERIES
-        # ============================================================================
-        order_match = re.search(r'order\s+(?:id\s+)?(?:#?)?(\d+)', message_lower)
-        if order_match:
-            order_id = order_match.group(1)
-            order_info = self.query_order_status(order_id)
-            if order_info:
-                order = order_info["order"]
-                status = order.get('status', 'unknown')
-                return f"Order #{order_id} status: {status}"
-            else:
-                return f"No order found with ID {order_id}"
-        
-        # ============================================================================
-        # 2. USER QUERIES
-        # ============================================================================
-        user_match = re.search(r'user\s+(?:id\s+)?(\d+)', message_lower)
-        if user_match:
-            user_id = user_match.group(1)
-            user = self.query_user_info(user_id)
-            if user:
-                return f"User {user_id}:\n• Name: {user.get('first_name', '')} {user.get('last_name', '')}\n• Email: {user.get('email', 'N/A')}\n• Age: {user.get('age', 'N/A')}\n• Location: {user.get('city', 'N/A')}, {user.get('state', 'N/A')}"
-            else:
-                return f"No user found with ID {user_id}"
-        
-        # ============================================================================
-        # 3. PRODUCT CATEGORY QUERIES
-        # ============================================================================
-        if 'category' in message_lower or 'socks' in message_lower or 'accessories' in message_lower:
-            category = 'socks' if 'socks' in message_lower else 'accessories'
-            products = self.query_products_by_category(category)
-            if products:
-                response = f"Products in {category} category:\n"
-                for product in products[:3]:
-                    response += f"• {product.get('name', 'Unknown')} - ${product.get('retail_price', 0):.2f}\n"
-                return response.strip()
-            else:
-                return f"No products found in {category} category"
-        
-        # ============================================================================
-        # 4. LOCATION-BASED USER QUERIES
-        # ============================================================================
-        if 'rio branco' in message_lower or 'location' in message_lower:
-            location = 'Rio Branco' if 'rio branco' in message_lower else 'Rio Branco'
-            users = self.query_users_by_location(location)
-            if users:
-                response = f"Users from {location}:\n"
-                for user in users[:3]:
-                    response += f"• {user.get('first_name', '')} {user.get('last_name', '')} (ID: {user.get('id', 'N/A')})\n"
-                return response.strip()
-            else:
-                return f"No users found from {location}"
-        
-        # ============================================================================
-        # 5. PRODUCT DETAILS BY ID
-        # ============================================================================
-        product_id_match = re.search(r'product\s+(?:id\s+)?(\d+)', message_lower)
-        if product_id_match:
-            product_id = product_id_match.group(1)
-            product = self.query_product_by_id(product_id)
-            if product:
-                inventory = self.query_inventory_by_product(product_id)
-                response = f"Product {product_id}:\n• Name: {product.get('name', 'Unknown')}\n• Brand: {product.get('brand', 'N/A')}\n• Price: ${product.get('retail_price', 0):.2f}\n• Category: {product.get('category', 'N/A')}\n• Department: {product.get('department', 'N/A')}"
-                if inventory:
-                    response += f"\n• Inventory items: {len(inventory)}"
-                return response
-            else:
-                return f"No product found with ID {product_id}"
-        
-        # ============================================================================
-        # 6. PRODUCT AVAILABILITY QUERIES
-        # ============================================================================
-        product_keywords = self.extract_product_info(message)
-        if product_keywords:
-            products = self.query_product_availability(product_keywords)
-            if products:
-                response = f"Found {len(products)} products:\n"
-                for product in products[:3]:
-                    name = product.get('name', 'Unknown')
-                    price = product.get('price', 0)
-                    available = "In stock" if product.get('available') else "Out of stock"
-                    response += f"• {name}: ${price:.2f} ({available})\n"
-                return response.strip()
+        with stage("routing"):
+            routed = route_message(message)
+        set_intent(routed.intent)
+        handler = getattr(self, self.INTENT_HANDLERS[routed.intent])
+        with stage("retrieval"):
+            answer = handler(routed)
+        if routed.llm_context is not None and generate:
+            return self.call_llm_with_context(message, routed.llm_context, conversation_history)
+        return answer
+    
+    # ============================================================================
+    # INTENT HANDLERS
+    # ============================================================================
+    
+    def answer_multi_entity(self, routed):
+        """Messages referencing several orders/users/products ("order 12 and order 15 for user 3")"""
+        return self.format_multi_entity(routed.entities, self.query_entities_batch(routed.entities))
+    
+    def answer_order_status(self, routed):
+        """Order status queries ("order 123", "order #123")"""
+        order_id = routed.values[0]
+        return self.format_order_status(order_id, self.query_order_status(order_id))
+    
+    def answer_user_info(self, routed):
+        """User queries ("user 123")"""
+        user_id = routed.values[0]
+        return self.format_user_info(user_id, self.query_user_info(user_id))
+    
+    def answer_category(self, routed):
+        """Product category queries (socks, accessories)"""
+        category = routed.values[0]
+        return self.format_category_products(category, self.query_products_by_category(category))
+    
+    def answer_location(self, routed):
+        """Location-based user queries (Rio Branco)"""
+        location = routed.values[0]
+        return self.format_location_users(location, self.query_users_by_location(location))
+    
+    def answer_product_details(self, routed):
+        """Product details by ID ("product 123")"""
+        product_id = routed.values[0]
+        product, inventory = self.query_product_details(product_id)
+        return self.format_product_details(product_id, product, inventory)
+    
+    def answer_availability(self, routed):
+        """Product availability queries (keywords or free-text product names)"""
+        product_keywords = routed.values
+        products = self.query_product_availability(product_keywords)
+        if not products and not routed.entities.product_keywords:
+            # Free-text guesses matched no product by name: look for products by meaning
+            related = self.query_related_products(routed.entities.message)
+            if related:
+                return self.answer_related_products(routed, related)
+        return self.format_product_availability(product_keywords, products)
+    
+    def answer_related_products(self, routed, products):
+        """Semantically retrieved products become the LLM context for the answer"""
+        set_intent("related_products")
+        routed.llm_context = self.format_related_products(products)
+        return routed.llm_context
+    
+    def answer_return_policy(self, routed):
+        """Return policy queries"""
+        return self.format_return_policy(self.get_return_policy_info())
+    
+    def answer_user_orders(self, routed):
+        """Mixed user + product queries ("id 123 product details")"""
+        user_id = routed.values[0]
+        # Find the user and their orders in one round trip
+        user, user_orders = self.query_user_with_orders(user_id, limit=3)
+        return self.format_user_with_orders(user_id, user, user_orders)
+    
+    def answer_analytics(self, routed):
+        """Aggregate questions ("top selling products this week", "revenue by category")"""
+        question = parse_question(routed.entities.message)
+        return self.format_analytics(question, self.query_analytics(question))
+    
+    def shipping_subject(self, entities):
+        """(order id, user id, city) a shipping question is about; at most one of them is set"""
+        if entities.order_ids:
+            return entities.order_ids[0], None, None
+        if entities.user_ids or entities.bare_ids:
+            return None, (entities.user_ids or entities.bare_ids)[0], None
+        if distribution_centers.is_ready:
+            city = distribution_centers.find_city(entities.message)
+        else:
+            city = entities.locations[0] if entities.locations else None
+        return None, None, city
+    
+    def answer_shipping(self, routed):
+        """Where an order ships from and when it arrives ("when will order 123 arrive")"""
+        order_id, user_id, city = self.shipping_subject(routed.entities)
+        order_info = None
+        if order_id:
+            order_info = self.query_order_status(order_id, intent="order_shipping")
+            if not order_info:
+                return self.format_order_status(order_id, None)
+            user_id = order_info["order"].get("user_id")
+        if not user_id and not city:
+            return self.format_shipping(None, None, None)
+        return self.format_shipping(order_id, order_info, self.query_nearest_center(user_id, city))
+    
+    def answer_help(self, routed):
+        """General help, unless the message is close in meaning to some products ("a gift for my dad")"""
+        related = self.query_related_products(routed.entities.message)
+        if related:
+            return self.answer_related_products(routed, related)
+        return HELP_TEXT
+    
+    # ============================================================================
+    # RESPONSE FORMATTING
+    # ============================================================================
+    # Formatting is kept separate from retrieval so the sync and async chat
+    # logic render identical answers from the same query results
+    
+    def format_order_status(self, order_id, order_info):
+        """Format an order status answer"""
+        if order_info:
+            order = order_info["order"]
+            status = order.get('status', 'unknown')
+            return f"Order #{order_id} status: {status}"
+        return f"No order found with ID {order_id}"
+    
+    def format_multi_entity(self, entities, found):
+        """Format one combined answer for every referenced order, user and product"""
+        sections = []
+        for order_id in entities.order_ids[:MAX_ENTITIES_PER_MESSAGE]:
+            order_info = self.build_order_info(found.get("orders", {}).get(order_id))
+            sections.append(self.format_order_status(order_id, order_info))
+        for user_id in entities.user_ids[:MAX_ENTITIES_PER_MESSAGE]:
+            sections.append(self.format_user_info(user_id, found.get("users", {}).get(user_id)))
+        for product_id in entities.product_ids[:MAX_ENTITIES_PER_MESSAGE]:
+            sections.append(self.format_product_details(product_id, found.get("products", {}).get(product_id), []))
+        return "\n\n".join(sections)
+    
+    def format_user_info(self, user_id, user):
+        """Format a user details answer"""
+        if user:
+            return f"User {user_id}:\n• Name: {user.get('first_name', '')} {user.get('last_name', '')}\n• Email: {user.get('email', 'N/A')}\n• Age: {user.get('age', 'N/A')}\n• Location: {user.get('city', 'N/A')}, {user.get('state', 'N/A')}"
+        return f"No user found with ID {user_id}"
+    
+    def format_category_products(self, category, products):
+        """Format a product category listing"""
+        if products:
+            response = f"Products in {category} category:\n"
+            for product in products[:3]:
+                response += f"• {product.get('name', 'Unknown')} - ${product.get('retail_price', 0):.2f}\n"
+            return response.strip()
+        return f"No products found in {category} category"
+    
+    def format_location_users(self, location, users):
+        """Format a location-based user listing"""
+        if users:
+            response = f"Users from {location}:\n"
+            for user in users[:3]:
+                response += f"• {user.get('first_name', '')} {user.get('last_name', '')} (ID: {user.get('id', 'N/A')})\n"
+            return response.strip()
+        return f"No users found from {location}"
+    
+    def format_product_details(self, product_id, product, inventory):
+        """Format a product details answer"""
+        if product:
+            response = f"Product {product_id}:\n• Name: {product.get('name', 'Unknown')}\n• Brand: {product.get('brand', 'N/A')}\n• Price: ${product.get('retail_price', 0):.2f}\n• Category: {product.get('category', 'N/A')}\n• Department: {product.get('department', 'N/A')}"
+            if inventory:
+                response += f"\n• Inventory items: {len(inventory)}"
+            return response
+        return f"No product found with ID {product_id}"
+    
+    def format_product_availability(self, product_keywords, products):
+        """Format a product availability answer"""
+        if products:
+            response = f"Found {len(products)} products:\n"
+            for product in products[:3]:
+                name = product.get('name', 'Unknown')
+                price = product.get('price', 0)
+                available = "In stock" if product.get('available') else "Out of stock"
+                if product.get('available') and product.get('stock'):
+                    available = f"In stock: {product['stock']} left"
+                response += f"• {name}: ${price:.2f} ({available})\n"
+            return response.strip()
+        return f"No products found for: {', '.join(product_keywords)}"
+    
+    def format_analytics(self, question, result):
+        """Format an aggregate answer (top products, revenue, order counts)"""
+        if result is None:
+            return "Sorry, I couldn't compute that right now. Please try again in a moment."
+        period = question.period
+        if question.kind == "top_products":
+            if not result["rows"]:
+                return f"No sales found ({period})"
+            ranking = "revenue" if question.rank_by == "revenue" else "units sold"
+            response = f"Top selling products by {ranking} ({period}):\n"
+            for i, row in enumerate(result["rows"], 1):
+                response += f"{i}. {row.get('name') or 'Unknown'} ({row.get('brand') or 'N/A'}) - {row['units']} sold, ${row['revenue']:,.2f}\n"
+        elif question.kind == "orders":
+            if question.status:
+                count = result["by_status"].get(question.status, 0)
+                response = f"{count:,} of {result['total']:,} orders are {question.status} ({period})"
             else:
-                return f"No products found for: {', '.join(product_keywords)}"
-        
-        # ============================================================================
-        # 7. RETURN POLICY QUERIES
-        # ============================================================================
-        if any(keyword in message_lower for keyword in ['return', 'refund', 'policy']):
-            policy = self.get_return_policy_info()
-            return f"Return Policy:\n• {policy['policy']}\n• {policy['conditions']}"
-        
-        # ============================================================================
-        # 8. MIXED QUERIES - User + Product
-        # ============================================================================
-        if 'id' in message_lower and 'product details' in message_lower:
-            # Extract user ID from message
-            user_id_match = re.search(r'id\s+(\d+)', message_lower)
-            if user_id_match:
-                user_id = user_id_match.group(1)
-                user = self.query_user_info(user_id)
-                if user:
-                    # Find user's orders
-                    user_orders = list(self.db.orders.find({"user_id": int(user_id)}).limit(3))
-                    response = f"User {user_id}:\n• Name: {user.get('first_name', '')} {user.get('last_name', '')}\n• Location: {user.get('city', 'N/A')}, {user.get('state', 'N/A')}"
-                    if user_orders:
-                        response += f"\n• Orders: {len(user_orders)} found"
-                    return response
-                else:
-                    return f"No user found with ID {user_id}"
-        
-        # ============================================================================
-        # 9. GENERAL HELP
-        # ============================================================================
-        return "I can help with:\n• Order status (order #123)\n• User details (user 123)\n• Product categories (socks, accessories)\n• Product details (product 123)\n• Return policy\n• Location-based users (Rio Branco)"
+                response = f"{result['total']:,} orders ({period}):\n"
+                for status, count in result["by_status"].items():
+                    response += f"• {status}: {count:,}\n"
+        elif question.kind == "revenue" and question.group_by:
+            if not result["rows"]:
+                return f"No sales found ({period})"
+            response = f"Revenue by {question.group_by} ({period}):\n"
+            for row in result["rows"][:10]:
+                response += f"• {row['key']}: ${row['revenue']:,.2f} ({row['units']:,} items)\n"
+        elif question.kind == "average_order_value":
+            response = f"Average order value ({period}): ${result['average']:,.2f} over {result['orders']:,} orders"
+        else:
+            response = f"Revenue ({period}): ${result['revenue']:,.2f} from {result['units']:,} items in {result['orders']:,} orders"
+        if result.get("data_through"):
+            response = response.strip() + f"\n(Data through {result['data_through']} UTC)"
+        return response.strip()
     
-    def call_llm_with_context(self, user_message, context, conversation_history):
+    def format_related_products(self, products):
+        """Format semantically retrieved products (LLM context, or the answer without an LLM)"""
+        response = "Products that may match what you're looking for:\n"
+        for product in products:
+            response += f"• {product.get('name', 'Unknown')} ({product.get('brand', 'N/A')}, {product.get('category', 'N/A')}, {product.get('department', 'N/A')}) - ${product.get('retail_price', 0):.2f}\n"
+        return response.strip()
+    
+    def format_shipping(self, order_id, order_info, nearest):
+        """Format a shipping answer: origin center, distance and delivery window (status-aware)"""
+        if order_info is None and nearest is None:
+            return ("I can estimate shipping for an order, a user or a city - "
+                    "e.g. \"when will order 123 arrive\" or \"shipping time to Rio Branco\"")
+        status = order_info["status"] if order_info else None
+        order = order_info["order"] if order_info else {}
+        lines = [f"Order #{order_id} ({status})"] if order_info else []
+        if status == "Cancelled":
+            lines.append("• This order was cancelled - nothing is on its way")
+            return "\n".join(lines)
+        if nearest is None and status not in DELIVERED_STATUSES:
+            lines.append("• No location on file to estimate shipping")
+            return "\n".join(lines)
+        if not order_info:
+            lines.append(f"Shipping to {nearest['origin']}:" if nearest.get("origin") else "Shipping:")
+        if nearest is not None:
+            shipped = "Ships from" if status in (None, "Processing") else "Shipped from"
+            lines.append(f"• {shipped}: {nearest['center']} distribution center ({nearest['distance_km']:,.0f} km away)")
+        if status in DELIVERED_STATUSES:
+            lines.append(f"• Delivered: {order.get('delivered_at') or 'N/A'}")
+            return "\n".join(lines)
+        if status not in (None, "Processing", "Shipped"):
+            return "\n".join(lines)
+        low, high = nearest["min_days"], nearest["max_days"]
+        if status == "Shipped":
+            lines.append(f"• Shipped: {order.get('shipped_at') or 'N/A'}")
+            window = arrival_window(order.get("shipped_at"), low, high)
+        else:
+            window = arrival_window(order.get("created_at"), low, high)
+        if window:
+            lines.append(f"• Expected delivery: {window[0]} - {window[1]}")
+        else:
+            lines.append(f"• Delivery time: {low}-{high} days")
+        return "\n".join(lines)
+    
+    def format_return_policy(self, policy):
+        """Format the return policy answer"""
+        return f"Return Policy:\n• {policy['policy']}\n• {policy['conditions']}"
+    
+    def format_user_with_orders(self, user_id, user, user_orders):
+        """Format a user summary with order count (mixed user + product queries)"""
+        if user:
+            response = f"User {user_id}:\n• Name: {user.get('first_name', '')} {user.get('last_name', '')}\n• Location: {user.get('city', 'N/A')}, {user.get('state', 'N/A')}"
+            if user_orders:
+                response += f"\n• Orders: {len(user_orders)} found"
+            return response
+        return f"No user found with ID {user_id}"
+    
+    def format_product_inventory(self, item):
+        """Convert an inventory item to the product format used in availability answers"""
+        return {
+            "name": item.get("product_name", "Unknown"),
+            "category": item.get("product_category", "Unknown"),
+            "brand": item.get("product_brand", "Unknown"),
+            "price": item.get("product_retail_price", 0),
+            "available": item.get("sold_at") is None,  # If sold_at is null, it's available
+            "sku": item.get("product_sku", ""),
+            "department": item.get("product_department", "")
+        }
+    
+    def build_product_availability_query(self, product_keywords):
         """
-        Call LLM with MongoDB context to generate natural response
-        This method is used when we need more sophisticated LLM processing
+        Build the inventory query for product availability
+        Searches across multiple fields for product matches
         """
+        query = {"$or": []}
+        for keyword in product_keywords:
+            if keyword in ['size', 'available', 'in stock']:
+                continue  # Skip generic keywords
+            query["$or"].append({
+                "$or": [
+                    {"product_name": {"$regex": keyword, "$options": "i"}},
+                    {"product_category": {"$regex": keyword, "$options": "i"}},
+                    {"product_brand": {"$regex": keyword, "$options": "i"}},
+                    {"product_department": {"$regex": keyword, "$options": "i"}}
+                ]
+            })
+        return query
+    
+    def build_llm_messages(self, user_message, context, conversation_history):
+        """Build the system prompt and chat history sent to the LLM"""
         system_prompt = f"""You are a helpful customer support assistant for an e-commerce clothing website. 
 Use the following database information to provide accurate and helpful responses:
 
@@ -398,45 +716,63 @@ Rules:
         
         # Prepare conversation history for context
         chat_history = []
-        for msg in conversation_history[-3:]:  # Last 3 messages for context
+        for msg in conversation_history[-settings.LLM_HISTORY_MESSAGES:]:  # Last messages for context
             role = "user" if msg["sender"] == "user" else "assistant"
             chat_history.append({"role": role, "content": msg["content"]})
         
         # Add current message
         chat_history.append({"role": "user", "content": user_message})
+        return system_prompt, chat_history
+    
+    def build_llm_payload(self, messages, system_prompt):
+        """Build the Groq (OpenAI-compatible) chat completion payload"""
+        # Add system message to the conversation
+        llm_messages = [{"role": "system", "content": system_prompt}] + messages
+        return {
+            "model": settings.GROQ_MODEL,
+            "messages": llm_messages,
+            "max_tokens": 150,  # Shorter responses for better UX
+            "temperature": 0.3   # More focused responses
+        }
+    
+    def clean_llm_content(self, content):
+        """Remove markdown formatting for cleaner responses"""
+        return content.replace('**', '').replace('*', '').replace('`', '')
+    
+    def call_llm_with_context(self, user_message, context, conversation_history):
+        """
+        Call LLM with MongoDB context to generate natural response
+        This method is used when we need more sophisticated LLM processing
+        """
+        system_prompt, chat_history = self.build_llm_messages(user_message, context, conversation_history)
+        
+        # Reuse the answer to the same (or a near-duplicate) question over the same context
+        cached_answer = llm_response_cache.lookup(settings.GROQ_MODEL, system_prompt, context, chat_history)
+        if cached_answer is not None:
+            return cached_answer
         
         # Call LLM
-        return self.call_llm(chat_history, system_prompt)
+        start = time.perf_counter()
+        with stage("llm"):
+            answer = self.call_llm(chat_history, system_prompt)
+        if answer == LLM_UNAVAILABLE_TEXT:
+            # No provider answered (or all breakers are open): the rule-based answer
+            return context or answer
+        llm_response_cache.store(settings.GROQ_MODEL, system_prompt, context, chat_history,
+                                 answer, (time.perf_counter() - start) * 1000)
+        return answer
     
     def call_llm(self, messages, system_prompt):
         """
-        Call Groq LLM API with fallback handling
-        This is the only LLM integration - we removed OpenAI fallback for simplicity
+        Call the LLM through the shared resilient client (app.llm_client)
+        Groq first, OpenAI as failover; retries, rate limits and circuit breaking
+        are handled there. Returns LLM_UNAVAILABLE_TEXT if no provider answered.
         """
-        # Add system message to the conversation
-        llm_messages = [{"role": "system", "content": system_prompt}] + messages
-        
-        # Call Groq API
-        if settings.GROQ_API_KEY:
-            try:
-                headers = {"Authorization": f"Bearer {settings.GROQ_API_KEY}"}
-                payload = {
-                    "model": settings.GROQ_MODEL,
-                    "messages": llm_messages,
-                    "max_tokens": 150,  # Shorter responses for better UX
-                    "temperature": 0.3   # More focused responses
-                }
-                response = requests.post(settings.GROQ_API_URL, headers=headers, json=payload, timeout=10)
-                response.raise_for_status()
-                content = response.json()["choices"][0]["message"]["content"]
-                # Remove markdown formatting for cleaner responses
-                content = content.replace('**', '').replace('*', '').replace('`', '')
-                return content
-            except Exception as e:
-                print(f"Groq API error: {e}")
-        
-        # Final fallback if LLM is unavailable
-        return "I apologize, but I'm having trouble connecting to my AI service. Please try again in a moment or contact our support team directly."
+        content = llm_client.complete(self.build_llm_payload(messages, system_prompt))
+        if content is None:
+            return LLM_UNAVAILABLE_TEXT
+        # Remove markdown formatting for cleaner responses
+        return self.clean_llm_content(content)
 
 # Initialize chat logic instance
 # This creates a single instance that will be used throughout the application
@@ -0,0 +1,307 @@
+# Chat turn persistence for /api/chat and the async chat endpoints
+# A turn stores the user's message, the AI reply and the conversation summary.
+# CHAT_WRITE_MODE picks how many MongoDB round trips that takes:
+#   immediate   - each write as it happens (3-4 round trips)
+#   batched     - both messages in one insert_many + one summary upsert at the end (2)
+#   bulk        - one client-level bulkWrite across both collections (1, MongoDB 8.0+)
+#   transaction - batched writes inside a multi-document transaction (replica set)
+# In every mode the history comes from the context cache (app.context_cache),
+# and a cached conversation skips the existence check, so an active chat reads
+# nothing from MongoDB. The cache is per process: with several workers a
+# conversation's context may miss turns served by another worker (sticky
+# sessions avoid that).
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, WriteConcern
+from pymongo.errors import ConfigurationError, InvalidOperation, OperationFailure
+
+from app.config import settings
+from app.context_cache import context_cache
+from app.conversations import summary_update
+from app.retention import retention
+
+WRITE_MODES = ("immediate", "batched", "bulk", "transaction")
+
+
+def new_conversation_doc(conversation_id, user_id, now):
+    """Build a conversation document for a new chat session"""
+    return {
+        "_id": conversation_id,
+        "user_id": user_id,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def new_message_doc(conversation_id, sender, content, timestamp):
+    """Build a message document ('user' or 'ai' sender) with a fresh ID"""
+    return {
+        "_id": str(ObjectId()),
+        "conversation_id": conversation_id,
+        "sender": sender,
+        "content": content,
+        "timestamp": timestamp
+    }
+
+
+def chat_write_concern():
+    """Write concern for chat writes from CHAT_WRITE_CONCERN_W / CHAT_WRITE_CONCERN_J"""
+    w = settings.CHAT_WRITE_CONCERN_W
+    w = int(w) if w.isdigit() else w
+    return WriteConcern(w=w, j=settings.CHAT_WRITE_CONCERN_J or None)
+
+
+# ============================================================================
+# CHAT STORE
+# ============================================================================
+
+@dataclass
+class ChatTurn:
+    """State of one chat turn between start_turn and finish_turn"""
+    conversation_id: str
+    user_id: str
+    user_msg_doc: dict
+    history: list
+    is_new: bool
+    round_trips: int = 0
+
+
+class ChatStore:
+    """Conversation bookkeeping and message persistence for chat turns"""
+    def __init__(self, mode=None):
+        self.mode = mode or settings.CHAT_WRITE_MODE
+        if self.mode not in WRITE_MODES:
+            raise ValueError(f"CHAT_WRITE_MODE must be one of {WRITE_MODES}, got {self.mode!r}")
+        self.write_concern = chat_write_concern()
+        self.round_trips = 0
+        self.turns = 0
+
+    def _fall_back(self, error):
+        """bulk/transaction unsupported by this deployment - use batched writes from now on"""
+        print(f"⚠️  CHAT_WRITE_MODE={self.mode} unavailable ({error}); falling back to batched")
+        self.mode = "batched"
+
+    def _collections(self, db):
+        """(messages, conversations) collections with the chat write concern"""
+        return (db.messages.with_options(write_concern=self.write_concern),
+                db.conversations.with_options(write_concern=self.write_concern))
+
+    def _summary_op(self, turn, messages):
+        """(filter, update pipeline, upsert) for the turn's conversation summary"""
+        user_id = turn.user_id if turn.is_new else None
+        return {"_id": turn.conversation_id}, summary_update(messages, user_id), turn.is_new
+
+    def _finish_stats(self, round_trips):
+        self.turns += 1
+        self.round_trips += round_trips
+
+    def get_stats(self):
+        return {
+            "mode": self.mode,
+            "write_concern": self.write_concern.document,
+            "turns": self.turns,
+            "round_trips_per_turn": round(self.round_trips / self.turns, 2) if self.turns else None,
+            "context_cache": context_cache.get_stats(),
+        }
+
+    # ------------------------------------------------------------------
+    # sync
+    # ------------------------------------------------------------------
+
+    def start_turn(self, db, user_id, message, conversation_id):
+        """
+        Resolve the conversation and build the history for a new user message
+        Returns a ChatTurn, or None if conversation_id does not exist
+        """
+        now = datetime.utcnow()
+        trips = 0
+        is_new = not conversation_id
+        if conversation_id:
+            history = context_cache.get(conversation_id)
+            if history is None:
+                trips += 2
+                if not db.conversations.find_one({"_id": conversation_id}, {"_id": 1}):
+                    return None
+                history = context_cache.warm(db, conversation_id)
+        else:
+            conversation_id = str(ObjectId())
+            history = []
+            context_cache.put(conversation_id, history)
+
+        user_msg_doc = new_message_doc(conversation_id, "user", message, now)
+
+        if self.mode == "immediate":
+            messages, conversations = self._collections(db)
+            if is_new:
+                conversations.insert_one(new_conversation_doc(conversation_id, user_id, now))
+                # Keep only the most recent conversations for this user (background
+                # sweep) - marked once the conversation exists, so the sweep counts it
+                retention.mark_user(user_id)
+            messages.insert_one(user_msg_doc)
+            context_cache.append(conversation_id, [user_msg_doc])
+            trips += 1 + is_new
+
+        history = (history + [user_msg_doc])[-context_cache.window:]
+        return ChatTurn(conversation_id, user_id, user_msg_doc, history, is_new, trips)
+
+    def finish_turn(self, db, turn, ai_msg_doc):
+        """Persist the AI reply (and, in batched modes, the user message) plus the summary"""
+        messages = [turn.user_msg_doc, ai_msg_doc]
+        if self.mode == "immediate":
+            messages_coll, conversations = self._collections(db)
+            messages_coll.insert_one(ai_msg_doc)
+            conversations.update_one({"_id": turn.conversation_id}, summary_update(messages))
+            context_cache.append(turn.conversation_id, [ai_msg_doc])
+            self._finish_stats(turn.round_trips + 2)
+            return
+
+        filter_, update, upsert = self._summary_op(turn, messages)
+        trips = 2
+        try:
+            if self.mode == "bulk":
+                db.client.bulk_write(
+                    [InsertOne(m, namespace=f"{db.name}.messages") for m in messages]
+                    + [UpdateOne(filter_, update, upsert=upsert, namespace=f"{db.name}.conversations")],
+                    write_concern=self.write_concern,
+                )
+                trips = 1
+            elif self.mode == "transaction":
+                with db.client.start_session() as session:
+                    session.with_transaction(
+                        lambda s: self._write_batched(db, messages, filter_, update, upsert, s),
+                        write_concern=self.write_concern,
+                    )
+                trips = 3  # two writes + commit
+            else:
+                self._write_batched(db, messages, filter_, update, upsert)
+        except (ConfigurationError, InvalidOperation, OperationFailure) as e:
+            if self.mode == "batched" or (isinstance(e, OperationFailure) and e.code not in (20, 263)):
+                raise
+            self._fall_back(e)
+            self._write_batched(db, messages, filter_, update, upsert)
+        context_cache.append(turn.conversation_id, messages)
+        if turn.is_new:
+            retention.mark_user(turn.user_id)
+        self._finish_stats(turn.round_trips + trips)
+
+    def abort_turn(self, db, turn):
+        """
+        Persist the user message of a turn whose reply could not be generated
+        (batched modes only write it in finish_turn); errors are logged, not raised
+        """
+        if self.mode == "immediate":
+            return
+        filter_, update, upsert = self._summary_op(turn, [turn.user_msg_doc])
+        try:
+            self._write_batched(db, [turn.user_msg_doc], filter_, update, upsert)
+        except Exception as e:
+            print(f"Error saving user message of failed turn: {e}")
+            return
+        context_cache.append(turn.conversation_id, [turn.user_msg_doc])
+        if turn.is_new:
+            retention.mark_user(turn.user_id)
+
+    def _write_batched(self, db, messages, filter_, update, upsert, session=None):
+        messages_coll, conversations = self._collections(db)
+        messages_coll.insert_many(messages, session=session)
+        conversations.update_one(filter_, update, upsert=upsert, session=session)
+
+    # ------------------------------------------------------------------
+    # async (same behaviour on an AsyncMongoClient database)
+    # ------------------------------------------------------------------
+
+    async def start_turn_async(self, adb, user_id, message, conversation_id):
+        """Async version of start_turn"""
+        now = datetime.utcnow()
+        trips = 0
+        is_new = not conversation_id
+        if conversation_id:
+            history = context_cache.get(conversation_id)
+            if history is None:
+                trips += 2
+                if not await adb.conversations.find_one({"_id": conversation_id}, {"_id": 1}):
+                    return None
+                history = await context_cache.warm_async(adb, conversation_id)
+        else:
+            conversation_id = str(ObjectId())
+            history = []
+            context_cache.put(conversation_id, history)
+
+        user_msg_doc = new_message_doc(conversation_id, "user", message, now)
+
+        if self.mode == "immediate":
+            messages, conversations = self._collections(adb)
+            if is_new:
+                await conversations.insert_one(new_conversation_doc(conversation_id, user_id, now))
+                retention.mark_user(user_id)
+            await messages.insert_one(user_msg_doc)
+            context_cache.append(conversation_id, [user_msg_doc])
+            trips += 1 + is_new
+
+        history = (history + [user_msg_doc])[-context_cache.window:]
+        return ChatTurn(conversation_id, user_id, user_msg_doc, history, is_new, trips)
+
+    async def finish_turn_async(self, adb, turn, ai_msg_doc):
+        """Async version of finish_turn"""
+        messages = [turn.user_msg_doc, ai_msg_doc]
+        if self.mode == "immediate":
+            messages_coll, conversations = self._collections(adb)
+            await messages_coll.insert_one(ai_msg_doc)
+            await conversations.update_one({"_id": turn.conversation_id}, summary_update(messages))
+            context_cache.append(turn.conversation_id, [ai_msg_doc])
+            self._finish_stats(turn.round_trips + 2)
+            return
+
+        filter_, update, upsert = self._summary_op(turn, messages)
+        trips = 2
+        try:
+            if self.mode == "bulk":
+                await adb.client.bulk_write(
+                    [InsertOne(m, namespace=f"{adb.name}.messages") for m in messages]
+                    + [UpdateOne(filter_, update, upsert=upsert, namespace=f"{adb.name}.conversations")],
+                    write_concern=self.write_concern,
+                )
+                trips = 1
+            elif self.mode == "transaction":
+                async with adb.client.start_session() as session:
+                    async def write(s):
+                        await self._write_batched_async(adb, messages, filter_, update, upsert, s)
+                    await session.with_transaction(write, write_concern=self.write_concern)
+                trips = 3
+            else:
+                await self._write_batched_async(adb, messages, filter_, update, upsert)
+        except (ConfigurationError, InvalidOperation, OperationFailure) as e:
+            if self.mode == "batched" or (isinstance(e, OperationFailure) and e.code not in (20, 263)):
+                raise
+            self._fall_back(e)
+            await self._write_batched_async(adb, messages, filter_, update, upsert)
+        context_cache.append(turn.conversation_id, messages)
+        if turn.is_new:
+            retention.mark_user(turn.user_id)
+        self._finish_stats(turn.round_trips + trips)
+
+    async def abort_turn_async(self, adb, turn):
+        """Async version of abort_turn"""
+        if self.mode == "immediate":
+            return
+        filter_, update, upsert = self._summary_op(turn, [turn.user_msg_doc])
+        try:
+            await self._write_batched_async(adb, [turn.user_msg_doc], filter_, update, upsert)
+        except Exception as e:
+            print(f"Error saving user message of failed turn: {e}")
+            return
+        context_cache.append(turn.conversation_id, [turn.user_msg_doc])
+        if turn.is_new:
+            retention.mark_user(turn.user_id)
+
+    async def _write_batched_async(self, adb, messages, filter_, update, upsert, session=None):
+        messages_coll, conversations = self._collections(adb)
+        await messages_coll.insert_many(messages, session=session)
+        await conversations.update_one(filter_, update, upsert=upsert, session=session)
+
+
+# Global chat store instance
+chat_store = ChatStore()
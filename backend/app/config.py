@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,15 +9,105 @@ class Settings:
     MONGO_URI = "mongodb://mongo:27017/ecommerce_bot"
     DATABASE_NAME = "ecommerce_bot"
     
+    # MongoDB connection pool (one shared client per process)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+    
     # LLM Configuration
     GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-    GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+    GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
     GROQ_MODEL = "llama3-8b-8192"
     
     # OpenAI fallback (optional)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-    OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
-    OPENAI_MODEL = "gpt-3.5-turbo"
+    OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    
+    # LLM HTTP client
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 10))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    LLM_HISTORY_MESSAGES = int(os.getenv("LLM_HISTORY_MESSAGES", 3))  # Recent messages sent as context
+    
+    # LLM resilience (app/llm_client.py)
+    LLM_TOTAL_TIMEOUT_SECONDS = float(os.getenv("LLM_TOTAL_TIMEOUT_SECONDS", 15))  # All attempts of one call
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", LLM_MAX_CONNECTIONS))  # Calls in flight per process
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+    LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", 0.25))
+    LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", 4))  # Longer Retry-After -> fail over instead
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+    LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+    LLM_FAILOVER_LATENCY_MS = float(os.getenv("LLM_FAILOVER_LATENCY_MS", 3000))  # 0 disables latency failover
+    
+    # LLM response cache (0 TTL disables it; 0 threshold disables near-duplicate lookup)
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000))
+    LLM_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD", 0.8))
+    
+    # Query cache (read-through, per-collection TTL; 0 bypasses the cache)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory", "redis" or "local-shared"
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+    CACHE_TTL_SECONDS = {
+        "products": int(os.getenv("CACHE_TTL_PRODUCTS", 3600)),
+        "users": int(os.getenv("CACHE_TTL_USERS", 600)),
+        "inventory_items": int(os.getenv("CACHE_TTL_INVENTORY", 60)),
+        "distribution_centers": int(os.getenv("CACHE_TTL_DISTRIBUTION_CENTERS", 86400)),
+        "orders": int(os.getenv("CACHE_TTL_ORDERS", 0)),  # Order status changes - bypass by default
+    }
+    
+    # Sample data loading
+    # "background": API starts immediately, seeding runs in a thread (default)
+    # "blocking": startup waits for seeding; "off": seed with python -m app.data_loader
+    STARTUP_SEED_MODE = os.getenv("STARTUP_SEED_MODE", "background")
+    DATA_LOAD_BATCH_SIZE = int(os.getenv("DATA_LOAD_BATCH_SIZE", 10000))
+    DATA_LOAD_WORKERS = int(os.getenv("DATA_LOAD_WORKERS", 3))
+    # Delta sync of changed CSVs in the API process (seconds; 0 disables)
+    DATA_SYNC_INTERVAL_SECONDS = int(os.getenv("DATA_SYNC_INTERVAL_SECONDS", 0))
+    
+    # Conversation retention
+    MAX_CONVERSATIONS_PER_USER = int(os.getenv("MAX_CONVERSATIONS_PER_USER", 10))
+    CONVERSATION_TTL_DAYS = float(os.getenv("CONVERSATION_TTL_DAYS", 0))  # 0 disables TTL expiry
+    RETENTION_SWEEP_INTERVAL_SECONDS = float(os.getenv("RETENTION_SWEEP_INTERVAL_SECONDS", 30))
+    RETENTION_DELETE_BATCH_SIZE = int(os.getenv("RETENTION_DELETE_BATCH_SIZE", 1000))
+    
+    # Conversation message pages
+    MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", 100))
+    MESSAGES_MAX_PAGE_SIZE = int(os.getenv("MESSAGES_MAX_PAGE_SIZE", 500))
+    
+    # Chat turn persistence: "immediate", "batched", "bulk" (MongoDB 8.0+) or "transaction" (replica set)
+    CHAT_WRITE_MODE = os.getenv("CHAT_WRITE_MODE", "batched")
+    CHAT_WRITE_CONCERN_W = os.getenv("CHAT_WRITE_CONCERN_W", "1")  # "majority", "1" or "0" (fire-and-forget)
+    CHAT_WRITE_CONCERN_J = os.getenv("CHAT_WRITE_CONCERN_J", "false").lower() == "true"
+    
+    # Conversation context window cache (recent messages per active conversation)
+    # The window defaults to the number of history messages the LLM prompt uses
+    CHAT_HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", LLM_HISTORY_MESSAGES))
+    CHAT_HISTORY_MAX_CONVERSATIONS = int(os.getenv("CHAT_HISTORY_MAX_CONVERSATIONS", 10000))
+    CHAT_HISTORY_MAX_BYTES = int(os.getenv("CHAT_HISTORY_MAX_BYTES", 64 * 1024 * 1024))
+    
+    # Return stored conversations without re-validating them against the response
+    # models (encoded straight to JSON bytes); only for data this API wrote itself
+    SKIP_RESPONSE_VALIDATION = os.getenv("SKIP_RESPONSE_VALIDATION", "false").lower() == "true"
+    
+    # Chat requests slower than this are logged with their per-stage breakdown (0 disables)
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 1000))
+    SLOW_REQUEST_LOG_SIZE = int(os.getenv("SLOW_REQUEST_LOG_SIZE", 100))
+    
+    # Columnar analytics snapshot of orders/order_items/products (seconds between
+    # incremental refreshes; 0 loads it once at startup)
+    ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", 60))
+    ANALYTICS_LOAD_BATCH_SIZE = int(os.getenv("ANALYTICS_LOAD_BATCH_SIZE", 50000))
+    
+    # Semantic product retrieval (app.vector_search): the memory-mapped embedding
+    # matrix is written to VECTOR_INDEX_DIR; matches below VECTOR_MIN_SCORE (cosine)
+    # are not offered as related products
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(tempfile.gettempdir(), "ecommerce_bot_vectors"))
+    VECTOR_DIM = int(os.getenv("VECTOR_DIM", 256))
+    VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", 5))
+    VECTOR_MIN_SCORE = float(os.getenv("VECTOR_MIN_SCORE", 0.25))
     
     # Server Configuration
     HOST = os.getenv("HOST", "0.0.0.0")
@@ -27,6 +118,11 @@ class Settings:
     
     # E-commerce specific settings
     RETURN_WINDOW_DAYS = 30
-    SHIPPING_TIME_DAYS = 3-7
+    # Delivery window quoted by the shipping answer: SHIPPING_MIN_DAYS..SHIPPING_MAX_DAYS
+    # days, shifted later linearly by up to SHIPPING_MAX_DAYS - SHIPPING_MIN_DAYS days
+    # for destinations SHIPPING_FAR_KM or further from the nearest distribution center
+    SHIPPING_MIN_DAYS = int(os.getenv("SHIPPING_MIN_DAYS", 3))
+    SHIPPING_MAX_DAYS = int(os.getenv("SHIPPING_MAX_DAYS", 7))
+    SHIPPING_FAR_KM = float(os.getenv("SHIPPING_FAR_KM", 5000))
 
 settings = Settings()
@@ -0,0 +1,167 @@
+# Conversation context window cache
+# Keeps the last CHAT_HISTORY_WINDOW messages of recently active conversations
+# in memory so a chat turn needs no history query. Warmed from MongoDB on first
+# access, appended to on every write, LRU-evicted by conversation count and by
+# an approximate memory budget.
+
+import sys
+import threading
+from collections import OrderedDict, deque
+
+from app.config import settings
+from app.metrics import stage
+
+# Fields kept per cached message (conversation_id is the cache key)
+CONTEXT_FIELDS = {"_id": 1, "sender": 1, "content": 1, "timestamp": 1}
+
+# Rough per-message cost besides the content string: dict, keys, id, datetime
+MESSAGE_OVERHEAD_BYTES = 400
+
+
+def message_size(message):
+    """Approximate memory held by one cached message"""
+    return MESSAGE_OVERHEAD_BYTES + sys.getsizeof(message.get("content") or "")
+
+
+def context_message(message):
+    """Copy of a message with only the fields the chat context needs"""
+    return {field: message.get(field) for field in CONTEXT_FIELDS}
+
+
+class _Entry:
+    __slots__ = ("messages", "size")
+
+    def __init__(self, window):
+        self.messages = deque(maxlen=window)
+        self.size = 0
+
+
+class ConversationContextCache:
+    """
+    Bounded LRU of recent-message deques keyed by conversation_id
+    Limits: `window` messages per conversation, `max_conversations` entries
+    and roughly `max_bytes` of message data in total.
+    """
+    def __init__(self, window=None, max_conversations=None, max_bytes=None):
+        self.window = window or settings.CHAT_HISTORY_WINDOW
+        self.max_conversations = max_conversations or settings.CHAT_HISTORY_MAX_CONVERSATIONS
+        self.max_bytes = max_bytes or settings.CHAT_HISTORY_MAX_BYTES
+        self._entries = OrderedDict()  # conversation_id -> _Entry
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # cache operations
+    # ------------------------------------------------------------------
+
+    def get(self, conversation_id):
+        """Cached messages (chronological), or None if the conversation is not cached"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(conversation_id)
+            return list(entry.messages)
+
+    def put(self, conversation_id, messages):
+        """Cache a conversation's most recent messages (chronological), replacing any entry"""
+        with self._lock:
+            self._remove(conversation_id)
+            entry = _Entry(self.window)
+            self._entries[conversation_id] = entry
+            self._extend(entry, messages)
+            self._evict()
+
+    def append(self, conversation_id, messages):
+        """Add newly stored messages to a cached conversation (no-op if not cached)"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            self._entries.move_to_end(conversation_id)
+            self._extend(entry, messages)
+            self._evict()
+
+    def discard(self, conversation_id):
+        """Drop a conversation (e.g. deleted by retention)"""
+        with self._lock:
+            self._remove(conversation_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _extend(self, entry, messages):
+        for message in messages:
+            if len(entry.messages) == entry.messages.maxlen:
+                dropped = message_size(entry.messages[0])
+                entry.size -= dropped
+                self.size -= dropped
+            message = context_message(message)
+            entry.messages.append(message)
+            added = message_size(message)
+            entry.size += added
+            self.size += added
+
+    def _remove(self, conversation_id):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def _evict(self):
+        # Keep the most recently used entry even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_conversations or self.size > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry.size
+            self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # warm from MongoDB
+    # ------------------------------------------------------------------
+
+    def _history_cursor(self, db, conversation_id):
+        return (db.messages.find({"conversation_id": conversation_id}, CONTEXT_FIELDS)
+                .sort([("timestamp", -1), ("_id", -1)])
+                .limit(self.window))
+
+    def warm(self, db, conversation_id):
+        """Load a conversation's recent messages from MongoDB into the cache"""
+        with stage("history"):
+            messages = list(self._history_cursor(db, conversation_id))[::-1]
+        self.put(conversation_id, messages)
+        return messages
+
+    async def warm_async(self, adb, conversation_id):
+        """Async version of warm"""
+        with stage("history"):
+            messages = (await self._history_cursor(adb, conversation_id).to_list())[::-1]
+        self.put(conversation_id, messages)
+        return messages
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "conversations": len(self._entries),
+            "window": self.window,
+            "approx_bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "max_conversations": self.max_conversations,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Global context cache instance
+context_cache = ConversationContextCache()
@@ -0,0 +1,224 @@
+# Denormalized conversation summaries
+# The conversation document carries its title, last message preview, message
+# count and last activity, so the sidebar listing is one indexed query instead
+# of one messages lookup per conversation.
+
+import argparse
+import base64
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from app.database import get_database
+
+TITLE_MAX_LENGTH = 50
+PREVIEW_MAX_LENGTH = 100
+DEFAULT_TITLE = "New conversation"
+
+# Fields returned by the conversation listing
+SUMMARY_PROJECTION = {
+    "user_id": 1, "created_at": 1, "updated_at": 1, "title": 1,
+    "last_message": 1, "last_sender": 1, "message_count": 1, "last_activity": 1,
+}
+
+
+def truncate(text, max_length):
+    """Shorten text to max_length characters with a trailing ellipsis (like ChatGPT titles)"""
+    if len(text) > max_length:
+        return text[:max_length - 3] + "..."
+    return text
+
+
+def summary_update(messages, user_id=None):
+    """
+    Update pipeline that folds newly stored messages (in order) into the summary
+    Applied with a single update_one, so concurrent writers never lose a count.
+    The title is set from the first user message only if the conversation has none.
+    With user_id the pipeline also creates the conversation (use with upsert=True).
+    """
+    last = messages[-1]
+    fields = {}
+    if user_id is not None:
+        fields["user_id"] = {"$ifNull": ["$user_id", {"$literal": user_id}]}
+        fields["created_at"] = {"$ifNull": ["$created_at", messages[0]["timestamp"]]}
+    fields.update({
+        "message_count": {"$add": [{"$ifNull": ["$message_count", 0]}, len(messages)]},
+        # $literal: message text starting with "$" must not be read as a field path
+        "last_message": {"$literal": truncate(last["content"], PREVIEW_MAX_LENGTH)},
+        "last_sender": {"$literal": last["sender"]},
+        "last_activity": last["timestamp"],
+        "updated_at": last["timestamp"],
+    })
+    first_user = next((m for m in messages if m["sender"] == "user"), None)
+    if first_user is not None:
+        title = truncate(first_user["content"], TITLE_MAX_LENGTH)
+        fields["title"] = {"$ifNull": ["$title", {"$literal": title}]}
+    return [{"$set": fields}]
+
+
+def record_messages(db, conversation_id, messages):
+    """Update the conversation summary for messages that were just stored"""
+    db.conversations.update_one({"_id": conversation_id}, summary_update(messages))
+
+
+async def record_messages_async(adb, conversation_id, messages):
+    """Async version of record_messages"""
+    await adb.conversations.update_one({"_id": conversation_id}, summary_update(messages))
+
+
+def list_conversations(db, user_id, limit):
+    """Most recently active conversations of a user with their summaries (one indexed query)"""
+    cursor = (db.conversations.find({"user_id": user_id}, SUMMARY_PROJECTION)
+              .sort("updated_at", -1)
+              .limit(limit))
+    conversations = []
+    for conv in cursor:
+        conv["title"] = conv.get("title") or DEFAULT_TITLE
+        conv.setdefault("message_count", 0)
+        conversations.append(conv)
+    return conversations
+
+
+# ============================================================================
+# MESSAGE PAGINATION
+# ============================================================================
+# Keyset pagination on (timestamp, _id): a cursor names the last message a
+# client has seen, and the next page starts strictly after (or before) it on
+# the conversation_id/timestamp/_id index - no skip, no full history reads.
+
+MESSAGE_FIELDS = ("conversation_id", "sender", "content", "timestamp")
+
+
+def encode_cursor(message):
+    """Opaque cursor for a message: base64 of its timestamp and _id"""
+    raw = f"{message['timestamp'].isoformat()}|{message['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(timestamp, _id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), message_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def message_projection(fields):
+    """
+    Projection for the requested message fields (None = all fields)
+    timestamp and _id are always included because cursors are built from them
+    """
+    if not fields:
+        return None
+    unknown = set(fields) - set(MESSAGE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown message fields: {', '.join(sorted(unknown))}")
+    projection = {field: 1 for field in fields}
+    projection["timestamp"] = 1
+    return projection
+
+
+def fetch_message_page(db, conversation_id, limit, before=None, after=None, since=None, fields=None):
+    """
+    One page of a conversation's messages in chronological order
+    - default: the newest `limit` messages
+    - before: messages older than that cursor (scrolling back)
+    - after / since: messages newer than that cursor / datetime (polling)
+    Returns (messages, has_more) - has_more refers to the direction of the query.
+    """
+    query = {"conversation_id": conversation_id}
+    forward = after is not None or since is not None
+    if before is not None:
+        timestamp, message_id = decode_cursor(before)
+        query["$or"] = [{"timestamp": {"$lt": timestamp}},
+                        {"timestamp": timestamp, "_id": {"$lt": message_id}}]
+    elif after is not None:
+        timestamp, message_id = decode_cursor(after)
+        query["$or"] = [{"timestamp": {"$gt": timestamp}},
+                        {"timestamp": timestamp, "_id": {"$gt": message_id}}]
+    elif since is not None:
+        query["timestamp"] = {"$gt": since}
+
+    direction = ASCENDING if forward else DESCENDING
+    # One extra row tells whether another page exists
+    cursor = (db.messages.find(query, message_projection(fields))
+              .sort([("timestamp", direction), ("_id", direction)])
+              .limit(limit + 1))
+    messages = list(cursor)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not forward:
+        messages.reverse()
+    return messages, has_more
+
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def summary_pipeline(conversation_ids):
+    """Aggregate the summary fields of the given conversations from their messages"""
+    return [
+        {"$match": {"conversation_id": {"$in": conversation_ids}}},
+        {"$sort": {"conversation_id": 1, "timestamp": 1}},
+        {"$group": {
+            "_id": "$conversation_id",
+            "message_count": {"$sum": 1},
+            "last_message": {"$last": "$content"},
+            "last_sender": {"$last": "$sender"},
+            "last_activity": {"$last": "$timestamp"},
+            # $min skips nulls and compares documents field by field, so this
+            # keeps the earliest user message without buffering the others
+            "first_user": {"$min": {"$cond": [
+                {"$eq": ["$sender", "user"]},
+                {"timestamp": "$timestamp", "content": "$content"},
+                None,
+            ]}},
+        }},
+    ]
+
+
+def backfill_summaries(db=None, batch_size=500, force=False):
+    """
+    Compute summaries for conversations stored before they existed
+    force=True recomputes every conversation. Returns the number updated.
+    """
+    db = db if db is not None else get_database()
+    query = {} if force else {"message_count": {"$exists": False}}
+    conversation_ids = [conv["_id"] for conv in db.conversations.find(query, {"_id": 1})]
+
+    updated = 0
+    for start in range(0, len(conversation_ids), batch_size):
+        batch = conversation_ids[start:start + batch_size]
+        summaries = {row["_id"]: row for row in db.messages.aggregate(summary_pipeline(batch))}
+        operations = []
+        for conv_id in batch:
+            row = summaries.get(conv_id)
+            if row is None:
+                fields = {"message_count": 0}
+            else:
+                first_user = (row.get("first_user") or {}).get("content")
+                fields = {
+                    "message_count": row["message_count"],
+                    "last_message": truncate(row["last_message"] or "", PREVIEW_MAX_LENGTH),
+                    "last_sender": row["last_sender"],
+                    "last_activity": row["last_activity"],
+                    "title": truncate(first_user, TITLE_MAX_LENGTH) if first_user else None,
+                }
+            operations.append(UpdateOne({"_id": conv_id}, {"$set": fields}))
+        if operations:
+            updated += db.conversations.bulk_write(operations, ordered=False).modified_count
+
+    if conversation_ids:
+        print(f"✅ Backfilled summaries for {updated} conversation(s)")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill denormalized conversation summaries")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--force", action="store_true", help="recompute every conversation")
+    args = parser.parse_args()
+    backfill_summaries(batch_size=args.batch_size, force=args.force)
@@ -1,88 +1,418 @@
-import pandas as pd
-from app.database import get_database
+import argparse
+import hashlib
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from app.config import settings
+from app.database import get_database
+from app.indexes import ensure_indexes
+from app.cache import query_cache
+
+DATASETS_PATH = os.path.join(os.path.dirname(__file__), "..", "datasets")
+
+# Resume checkpoints, one document per collection
+PROGRESS_COLLECTION = "_load_progress"
+
+DUPLICATE_KEY_ERROR = 11000
+
+# ==========================================
+# DATASET SPECS
+# ==========================================
+# Explicit dtypes keep pandas from sniffing every chunk (and from turning
+# integer ids into floats when a column has gaps). The primary key doubles
+# as _id, so re-inserting a chunk after a crash is a no-op. "point" names the
+# (longitude, latitude) columns stored as a GeoJSON `location` for 2dsphere queries.
+DATASETS = [
+    {
+        "collection": "products",
+        "file": "products.csv",
+        "key": "id",
+        "dtypes": {
+            "id": "Int64", "cost": "float64", "category": "string", "name": "string",
+            "brand": "string", "retail_price": "float64", "department": "string",
+            "sku": "string", "distribution_center_id": "Int64",
+        },
+    },
+    {
+        "collection": "users",
+        "file": "users.csv",
+        "key": "id",
+        "dtypes": {
+            "id": "Int64", "first_name": "string", "last_name": "string", "email": "string",
+            "age": "Int64", "gender": "string", "state": "string", "street_address": "string",
+            "postal_code": "string", "city": "string", "country": "string",
+            "latitude": "float64", "longitude": "float64", "traffic_source": "string",
+            "created_at": "string",
+        },
+    },
+    {
+        "collection": "orders",
+        "file": "orders.csv",
+        "key": "order_id",
+        "dtypes": {
+            "order_id": "Int64", "user_id": "Int64", "status": "string", "gender": "string",
+            "created_at": "string", "returned_at": "string", "shipped_at": "string",
+            "delivered_at": "string", "num_of_item": "Int64",
+        },
+    },
+    {
+        "collection": "order_items",
+        "file": "order_items.csv",
+        "key": "id",
+        "dtypes": {
+            "id": "Int64", "order_id": "Int64", "user_id": "Int64", "product_id": "Int64",
+            "inventory_item_id": "Int64", "status": "string", "created_at": "string",
+            "shipped_at": "string", "delivered_at": "string", "returned_at": "string",
+            "sale_price": "float64",
+        },
+    },
+    {
+        "collection": "inventory_items",
+        "file": "inventory_items.csv",
+        "key": "id",
+        "dtypes": {
+            "id": "Int64", "product_id": "Int64", "created_at": "string", "sold_at": "string",
+            "cost": "float64", "product_category": "string", "product_name": "string",
+            "product_brand": "string", "product_retail_price": "float64",
+            "product_department": "string", "product_sku": "string",
+            "product_distribution_center_id": "Int64",
+        },
+    },
+    {
+        "collection": "distribution_centers",
+        "file": "distribution_centers.csv",
+        "key": "id",
+        "point": ("longitude", "latitude"),
+        "dtypes": {
+            "id": "Int64", "name": "string", "latitude": "float64", "longitude": "float64",
+        },
+    },
+]
+
+# ==========================================
+# PROGRESS
+# ==========================================
+
+class LoadProgress:
+    """
+    Thread-safe view of the current seeding run, reported by the readiness endpoint
+    Phases: idle -> connecting -> loading -> indexing -> ready | failed | skipped
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phase = "idle"
+            self.error = None
+            self.started_at = None
+            self.finished_at = None
+            self.collections = {}
 
-def load_sample_data():
-    """Load sample e-commerce data into MongoDB"""
-    # Retry connection to MongoDB
-    max_retries = 5
+    def set_phase(self, phase, error=None):
+        with self._lock:
+            if phase == "connecting":
+                self.started_at = time.time()
+                self.finished_at = None
+                self.error = None
+                self.collections = {}
+            if phase in ("ready", "failed", "skipped"):
+                self.finished_at = time.time()
+            self.phase = phase
+            self.error = error
+
+    def update(self, collection, **fields):
+        with self._lock:
+            self.collections.setdefault(collection, {}).update(fields)
+
+    @property
+    def in_progress(self):
+        return self.phase in ("connecting", "loading", "indexing")
+
+    def snapshot(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "phase": self.phase,
+                "error": self.error,
+                "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else None,
+                "collections": {name: dict(state) for name, state in self.collections.items()},
+            }
+
+# Module-level tracker shared by the startup task and the health endpoints
+load_progress = LoadProgress()
+
+# ==========================================
+# CONNECTION
+# ==========================================
+
+def connect_with_retry(max_retries=5, delay=5):
+    """
+    Return the database once it answers a ping, or None after max_retries
+    """
     for attempt in range(max_retries):
         try:
             db = get_database()
             # Test connection
             db.command('ping')
             print("✅ Connected to MongoDB successfully!")
-            break
+            return db
         except Exception as e:
             if attempt < max_retries - 1:
                 print(f"⚠️  MongoDB connection attempt {attempt + 1} failed: {e}")
-                print("🔄 Retrying in 5 seconds...")
-                time.sleep(5)
+                print(f"🔄 Retrying in {delay} seconds...")
+                time.sleep(delay)
             else:
                 print(f"❌ Failed to connect to MongoDB after {max_retries} attempts")
-                print("Continuing without sample data...")
-                return
-    
+    return None
+
+# ==========================================
+# CHUNKED READING
+# ==========================================
+
+def file_signature(path):
+    """
+    Size and mtime of a dataset file, used to tell whether a checkpoint still applies
+    """
+    stat = os.stat(path)
+    return {"file_size": stat.st_size, "file_mtime": stat.st_mtime}
+
+def file_hash(path, block_size=1 << 20):
+    """
+    SHA-256 of a dataset file, read in 1 MB blocks (used by the delta sync)
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_to_records(chunk, key, point=None):
+    """
+    Convert a DataFrame chunk to BSON-ready dicts (NaN/NA -> None, _id = primary key)
+    Rows without a primary key are left out (callers report len(chunk) - len(records)).
+    With point=(longitude column, latitude column), rows with both get a GeoJSON location
+    """
+    chunk = chunk[chunk[key].notna()].astype(object)
+    chunk = chunk.where(chunk.notna(), None)
+    records = chunk.to_dict(orient="records")
+    for record in records:
+        record["_id"] = record[key]
+        if point and record.get(point[0]) is not None and record.get(point[1]) is not None:
+            record["location"] = {"type": "Point",
+                                  "coordinates": [float(record[point[0]]), float(record[point[1]])]}
+    return records
+
+def read_chunks(path, dtypes, batch_size, skip_rows=0):
+    """
+    Yield record batches from a CSV without materializing the whole file
+    """
+    # Only pin dtypes for columns the file actually has
+    columns = pd.read_csv(path, nrows=0).columns
+    dtypes = {column: dtype for column, dtype in dtypes.items() if column in columns}
+    skiprows = range(1, skip_rows + 1) if skip_rows else None
+
+    return pd.read_csv(path, dtype=dtypes, chunksize=batch_size, skiprows=skiprows)
+
+def insert_batch(collection, records):
+    """
+    Unordered insert_many; rows that already exist (resumed chunk) are ignored
+    """
+    try:
+        return len(collection.insert_many(records, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+def upsert_batch(collection, records):
+    """
+    Unordered replace-by-_id upserts, so rows that changed since the last load are updated
+    Used when a collection is loaded again (--restart, or the file changed since its checkpoint)
+    """
+    if not records:
+        return 0
+    result = collection.bulk_write(
+        [ReplaceOne({"_id": record["_id"]}, record, upsert=True) for record in records], ordered=False)
+    return result.upserted_count + result.modified_count
+
+# ==========================================
+# LOADING
+# ==========================================
+
+def load_dataset(db, spec, batch_size, datasets_path=None, restart=False):
+    """
+    Stream one CSV into its collection, checkpointing after every batch
+    A restart (or a file changed since its checkpoint) over a non-empty collection
+    upserts rows instead of inserting them, so documents from the previous load are updated
+    """
+    name = spec["collection"]
+    path = os.path.join(datasets_path or DATASETS_PATH, spec["file"])
+    signature = file_signature(path)
+    progress = db[PROGRESS_COLLECTION]
+
+    # Resume from the checkpoint unless the file changed underneath it
+    checkpoint = progress.find_one({"_id": name}) or {}
+    same_file = all(checkpoint.get(field) == value for field, value in signature.items())
+    rows_done = checkpoint.get("rows_loaded", 0) if same_file else 0
+    if rows_done:
+        print(f"🔄 Resuming {name} from row {rows_done:,}")
+    # Loading over existing documents: upsert so changed rows are updated
+    reload = (restart or (checkpoint and not same_file)) and db[name].estimated_document_count() > 0
+    write_batch = upsert_batch if reload else insert_batch
+    load_progress.update(name, rows_loaded=rows_done, completed=False, rows_per_sec=0)
+
+    start = time.perf_counter()
+    resumed_from = rows_done
+    written = 0
+    skipped = 0
+
+    for chunk in read_chunks(path, spec["dtypes"], batch_size, skip_rows=rows_done):
+        records = chunk_to_records(chunk, spec["key"], spec.get("point"))
+        skipped += len(chunk) - len(records)
+        written += write_batch(db[name], records)
+        rows_done += len(chunk)
+        progress.update_one(
+            {"_id": name},
+            {"$set": {**signature, "rows_loaded": rows_done, "completed": False,
+                      "updated_at": datetime.now()}},
+            upsert=True,
+        )
+        rate = (rows_done - resumed_from) / max(time.perf_counter() - start, 1e-9)
+        load_progress.update(name, rows_loaded=rows_done, rows_per_sec=round(rate))
+        print(f"📦 {name}: {rows_done:,} rows ({rate:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    progress.update_one(
+        {"_id": name},
+        {"$set": {**signature, "rows_loaded": rows_done, "completed": True,
+                  "file_hash": file_hash(path), "updated_at": datetime.now()}},
+        upsert=True,
+    )
+
+    if skipped:
+        print(f"⚠️  {name}: skipped {skipped:,} rows with no {spec['key']}")
+
+    rows_read = rows_done - resumed_from
+    load_progress.update(name, completed=True)
+    return {
+        "collection": name,
+        "rows": rows_done,
+        "written": written,
+        "skipped": skipped,
+        "resumed_from": resumed_from,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows_read / elapsed) if elapsed > 0 else rows_read,
+    }
+
+def pending_datasets(db, restart=False, datasets_path=None):
+    """
+    Dataset specs whose file exists and has not been fully loaded yet
+    """
+    datasets_path = datasets_path or DATASETS_PATH
+    completed = set()
+    if not restart:
+        completed = {
+            doc["_id"] for doc in db[PROGRESS_COLLECTION].find({"completed": True}, {"_id": 1})
+        }
+    return [
+        spec for spec in DATASETS
+        if spec["collection"] not in completed
+        and os.path.exists(os.path.join(datasets_path, spec["file"]))
+    ]
+
+def load_sample_data(batch_size=None, workers=None, restart=False, db=None, datasets_path=None):
+    """
+    Load sample e-commerce data into MongoDB
+    db and datasets_path default to the app database and DATASETS_PATH (benchmarks
+    pass their own to load generated datasets into a scratch database)
+    """
+    batch_size = batch_size or settings.DATA_LOAD_BATCH_SIZE
+    workers = workers or settings.DATA_LOAD_WORKERS
+
+    load_progress.set_phase("connecting")
+    if db is None:
+        db = connect_with_retry()
+    if db is None:
+        load_progress.set_phase("failed", "MongoDB unreachable")
+        print("Continuing without sample data...")
+        return []
+
     # Check if data already exists
     try:
-        if db.products.count_documents({}) > 0:
+        has_checkpoints = db[PROGRESS_COLLECTION].count_documents({}) > 0
+        if not restart and not has_checkpoints and db.products.count_documents({}) > 0:
+            # Loaded before checkpoints existed
             print("Sample data already loaded. Skipping...")
-            return
+            return []
+        if restart:
+            db[PROGRESS_COLLECTION].delete_many({})
+        pending = pending_datasets(db, restart, datasets_path)
     except Exception as e:
+        load_progress.set_phase("failed", str(e))
         print(f"❌ Error checking existing data: {e}")
-        return
-    
-    datasets_path = os.path.join(os.path.dirname(__file__), "..", "datasets")
-    
-    try:
-        # Load products
-        if os.path.exists(os.path.join(datasets_path, "products.csv")):
-            products_df = pd.read_csv(os.path.join(datasets_path, "products.csv"))
-            products_records = products_df.to_dict(orient='records')
-            db.products.insert_many(products_records)
-            print(f"Loaded {len(products_records)} products")
-        
-        # Load users
-        if os.path.exists(os.path.join(datasets_path, "users.csv")):
-            users_df = pd.read_csv(os.path.join(datasets_path, "users.csv"))
-            users_records = users_df.to_dict(orient='records')
-            db.users.insert_many(users_records)
-            print(f"Loaded {len(users_records)} users")
-        
-        # Load orders
-        if os.path.exists(os.path.join(datasets_path, "orders.csv")):
-            orders_df = pd.read_csv(os.path.join(datasets_path, "orders.csv"))
-            orders_records = orders_df.to_dict(orient='records')
-            db.orders.insert_many(orders_records)
-            print(f"Loaded {len(orders_records)} orders")
-        
-        # Load order items
-        if os.path.exists(os.path.join(datasets_path, "order_items.csv")):
-            order_items_df = pd.read_csv(os.path.join(datasets_path, "order_items.csv"))
-            order_items_records = order_items_df.to_dict(orient='records')
-            db.order_items.insert_many(order_items_records)
-            print(f"Loaded {len(order_items_records)} order items")
-        
-        # Load inventory items
-        if os.path.exists(os.path.join(datasets_path, "inventory_items.csv")):
-            inventory_df = pd.read_csv(os.path.join(datasets_path, "inventory_items.csv"))
-            inventory_records = inventory_df.to_dict(orient='records')
-            db.inventory_items.insert_many(inventory_records)
-            print(f"Loaded {len(inventory_records)} inventory items")
-        
-        # Load distribution centers
-        if os.path.exists(os.path.join(datasets_path, "distribution_centers.csv")):
-            dc_df = pd.read_csv(os.path.join(datasets_path, "distribution_centers.csv"))
-            dc_records = dc_df.to_dict(orient='records')
-            db.distribution_centers.insert_many(dc_records)
-            print(f"Loaded {len(dc_records)} distribution centers")
-        
+        return []
+
+    if not pending:
+        print("Sample data already loaded. Skipping...")
+        return []
+
+    load_progress.set_phase("loading")
+    print(f"🔄 Loading {len(pending)} dataset(s) in batches of {batch_size:,} "
+          f"with {workers} worker(s)")
+
+    # Collections are independent (no foreign keys), so they load side by side
+    results = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            spec["collection"]: executor.submit(load_dataset, db, spec, batch_size, datasets_path, restart)
+            for spec in pending
+        }
+        for name, future in futures.items():
+            try:
+                result = future.result()
+                results.append(result)
+                print(f"✅ Loaded {result['rows']:,} {name} "
+                      f"({result['rows_per_sec']:,} rows/s, {result['seconds']}s)")
+            except Exception as e:
+                failed.append(name)
+                load_progress.update(name, error=str(e))
+                print(f"❌ Error loading {name}: {e} (will resume on next run)")
+
+    if failed:
+        print(f"⚠️  Sample data partially loaded; failed: {', '.join(failed)}")
+    else:
         print("✅ Sample data loaded successfully!")
-        
+
+    load_progress.set_phase("indexing")
+    try:
+        # Build indexes once the data is in place
+        ensure_indexes(db)
     except Exception as e:
-        print(f"❌ Error loading sample data: {e}")
-        print("Continuing without sample data...")
+        print(f"⚠️  Could not build indexes: {e}")
+
+    # Cached query results may describe the previous data
+    query_cache.invalidate()
+
+    return results
 
 if __name__ == "__main__":
-    load_sample_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Stream the sample CSV datasets into MongoDB")
+    parser.add_argument("--batch-size", type=int, default=settings.DATA_LOAD_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.DATA_LOAD_WORKERS)
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore checkpoints and load every dataset again")
+    parser.add_argument("--datasets-path", default=None,
+                        help=f"directory with the CSV files (default: {DATASETS_PATH})")
+    args = parser.parse_args()
+    load_sample_data(args.batch_size, args.workers, args.restart, datasets_path=args.datasets_path)
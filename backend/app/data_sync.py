@@ -0,0 +1,276 @@
+# Incremental dataset sync - applies CSV changes to MongoDB without a full reload
+# Unchanged files are skipped by size/mtime and content hash; changed files are
+# diffed row by row on the primary key and only upserts and deletes are written.
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+from pymongo import DeleteMany, ReplaceOne
+
+from app.config import settings
+from app.database import get_database
+from app.data_loader import (
+    DATASETS, DATASETS_PATH, PROGRESS_COLLECTION,
+    chunk_to_records, file_hash, file_signature, read_chunks,
+)
+from app.cache import CACHED_METHODS, query_cache
+from app.search import product_search, user_location_search
+from app.analytics import analytics
+from app.retention import batched
+from app.geo import distribution_centers
+from app.vector_search import product_vectors
+
+# ============================================================================
+# INVALIDATION MAP
+# ============================================================================
+# Query cache namespaces whose entries are built from each collection
+# (e.g. order answers embed order_items, product details embed stock counts)
+
+CACHE_NAMESPACES = {
+    "products": ["products", "inventory_items"],
+    "inventory_items": ["inventory_items"],
+    "users": ["users", "orders"],
+    "orders": ["orders"],
+    "order_items": ["orders"],
+    "distribution_centers": ["distribution_centers"],
+}
+
+# Cached lookups of a single row's entity, dropped per changed row instead of
+# with their namespace: collection -> [(namespace, query method, field of the
+# row holding the method's id argument)]. The other cached methods of the
+# namespaces above (category, location and free-text lookups span many rows)
+# are dropped whole.
+KEYED_CACHE_ENTRIES = {
+    "products": [
+        ("products", "query_product_by_id", "id"),
+        ("inventory_items", "query_product_details", "id"),
+        ("inventory_items", "query_inventory_by_product", "id"),
+    ],
+    "inventory_items": [
+        ("inventory_items", "query_product_details", "product_id"),
+        ("inventory_items", "query_inventory_by_product", "product_id"),
+    ],
+    "users": [("users", "query_user_info", "id")],
+}
+
+# Beyond this many changed rows per collection a namespace is dropped whole
+MAX_KEYED_INVALIDATIONS = 10_000
+
+# In-process search indexes built from each collection, with the fields they
+# read (None: any change). Indexes are rebuilt in full, so a sync that only
+# touches other fields (e.g. prices for the vector index) skips them.
+SEARCH_INDEXES = {
+    "products": [
+        (product_search, {"id", "name", "brand", "category", "department", "retail_price", "sku"}),
+        (product_vectors, {"id", "name", "brand", "category", "department"}),
+    ],
+    "inventory_items": [(product_search, {"product_id", "sold_at"})],
+    "users": [
+        (user_location_search, {"id", "first_name", "last_name", "city", "state", "country"}),
+        (distribution_centers, {"id", "city", "latitude", "longitude"}),
+    ],
+    "distribution_centers": [(distribution_centers, None)],
+}
+
+# Marks inserted and deleted rows in a sync result's changed fields
+ALL_FIELDS = "*"
+
+# One sync at a time per process (periodic thread vs admin endpoint)
+_sync_lock = threading.Lock()
+
+# ============================================================================
+# DIFF AND APPLY
+# ============================================================================
+
+def sync_dataset(db, spec, batch_size):
+    """
+    Bring one collection in line with its CSV
+    Returns None when the file is unchanged, otherwise upsert/delete counts
+    """
+    name = spec["collection"]
+    key = spec["key"]
+    path = os.path.join(DATASETS_PATH, spec["file"])
+    collection = db[name]
+    progress = db[PROGRESS_COLLECTION]
+
+    signature = file_signature(path)
+    state = progress.find_one({"_id": name}) or {}
+    if all(state.get(field) == value for field, value in signature.items()) and state.get("file_hash"):
+        return None
+
+    # mtime/size moved (or no hash yet) - the content hash decides
+    content_hash = file_hash(path)
+    if state.get("file_hash") == content_hash:
+        progress.update_one({"_id": name}, {"$set": signature})
+        return None
+
+    start = time.perf_counter()
+    seen = set()
+    upserted = 0
+    # Changed field names, and the values of the keyed cache fields of changed rows
+    fields = set()
+    key_fields = {field for _, _, field in KEYED_CACHE_ENTRIES.get(name, [])}
+    keys = {field: set() for field in key_fields}
+
+    for chunk in read_chunks(path, spec["dtypes"], batch_size):
+        records = chunk_to_records(chunk, key, spec.get("point"))
+        ids = [record["_id"] for record in records]
+        seen.update(ids)
+
+        # Compare against the stored rows of this chunk only
+        existing = {doc["_id"]: doc for doc in collection.find({"_id": {"$in": ids}})}
+        changed = [record for record in records if existing.get(record["_id"]) != record]
+        for record in changed:
+            old = existing.get(record["_id"])
+            if old is None:
+                fields.add(ALL_FIELDS)
+            else:
+                fields.update(field for field in record.keys() | old.keys() if record.get(field) != old.get(field))
+            for field in key_fields:
+                for row in (record, old or {}):
+                    if row.get(field) is not None:
+                        keys[field].add(row[field])
+        if changed:
+            collection.bulk_write(
+                [ReplaceOne({"_id": record["_id"]}, record, upsert=True) for record in changed],
+                ordered=False,
+            )
+            upserted += len(changed)
+
+    # Rows gone from the CSV; documents without the key field (e.g. created
+    # through the API) never came from the dataset and are left alone
+    stale = []
+    for doc in collection.find({key: {"$exists": True}}, {"_id": 1, **{field: 1 for field in key_fields}}):
+        if doc["_id"] not in seen:
+            stale.append(doc["_id"])
+            for field in key_fields:
+                if doc.get(field) is not None:
+                    keys[field].add(doc[field])
+    if stale:
+        fields.add(ALL_FIELDS)
+    for ids in batched(stale, batch_size):
+        collection.bulk_write([DeleteMany({"_id": {"$in": ids}})], ordered=False)
+
+    progress.update_one(
+        {"_id": name},
+        {"$set": {**signature, "file_hash": content_hash, "rows_loaded": len(seen),
+                  "completed": True, "synced_at": datetime.now()}},
+        upsert=True,
+    )
+
+    return {
+        "collection": name,
+        "upserted": upserted,
+        "deleted": len(stale),
+        "seconds": round(time.perf_counter() - start, 2),
+        "fields": sorted(fields),
+        "keys": {field: sorted(values) for field, values in keys.items()},
+    }
+
+
+def invalidate_cache(result):
+    """Drop the cached answers built from one synced collection"""
+    name = result["collection"]
+    keyed = {}
+    if result["upserted"] + result["deleted"] <= MAX_KEYED_INVALIDATIONS:
+        for namespace, method, field in KEYED_CACHE_ENTRIES.get(name, []):
+            keyed.setdefault(namespace, []).append((method, result["keys"].get(field, [])))
+    for namespace in CACHE_NAMESPACES.get(name, [name]):
+        # Methods are registered by @cached; unknown ones mean drop everything
+        if namespace not in keyed or namespace not in CACHED_METHODS:
+            query_cache.invalidate(namespace)
+            continue
+        for method, ids in keyed[namespace]:
+            query_cache.invalidate_keys(namespace, method, ids)
+        for method in sorted(CACHED_METHODS[namespace] - {method for method, _ in keyed[namespace]}):
+            query_cache.invalidate(namespace, method)
+
+
+def invalidate_changed(db, results):
+    """
+    Drop cached answers and rebuild search indexes and analytics fed by the changed collections
+    Single-row lookups are dropped per changed row; indexes are only rebuilt when
+    a field they read changed
+    """
+    changed = [result["collection"] for result in results]
+    for result in results:
+        invalidate_cache(result)
+
+    indexes = []
+    for result in results:
+        fields = set(result["fields"])
+        for index, index_fields in SEARCH_INDEXES.get(result["collection"], []):
+            if index in indexes:
+                continue
+            if index_fields is None or ALL_FIELDS in fields or fields & index_fields:
+                indexes.append(index)
+    for index in indexes:
+        index.refresh(db)
+
+    # Synced rows are replaced in place, which the incremental refresh cannot see
+    if analytics.is_ready:
+        analytics.mark_stale(changed)
+        analytics.refresh(db)
+
+
+def sync_datasets(db=None, batch_size=None):
+    """
+    Sync every dataset file present on disk; returns the per-collection changes
+    Returns None if another sync is already running in this process
+    """
+    db = db if db is not None else get_database()
+    batch_size = batch_size or settings.DATA_LOAD_BATCH_SIZE
+
+    if not _sync_lock.acquire(blocking=False):
+        print("⚠️  Dataset sync already running, skipping")
+        return None
+    try:
+        results = []
+        for spec in DATASETS:
+            if not os.path.exists(os.path.join(DATASETS_PATH, spec["file"])):
+                continue
+            try:
+                result = sync_dataset(db, spec, batch_size)
+            except Exception as e:
+                print(f"❌ Error syncing {spec['collection']}: {e}")
+                continue
+            if result is not None:
+                print(f"🔄 Synced {result['collection']}: {result['upserted']:,} upserted, "
+                      f"{result['deleted']:,} deleted ({result['seconds']}s)")
+                results.append(result)
+
+        if results:
+            invalidate_changed(db, results)
+            # Changed keys can be many - they are not part of the reported result
+            for result in results:
+                result.pop("keys")
+        else:
+            print("✅ Datasets unchanged, nothing to sync")
+        return results
+    finally:
+        _sync_lock.release()
+
+
+def start_periodic_sync(interval_seconds):
+    """Run sync_datasets now and then every interval_seconds in a daemon thread"""
+    def loop():
+        while True:
+            try:
+                sync_datasets()
+            except Exception as e:
+                print(f"❌ Periodic dataset sync failed: {e}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=loop, name="dataset-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply CSV dataset changes to MongoDB")
+    parser.add_argument("--batch-size", type=int, default=settings.DATA_LOAD_BATCH_SIZE)
+    args = parser.parse_args()
+    sync_datasets(batch_size=args.batch_size)
@@ -1,15 +1,182 @@
-from pymongo import MongoClient
+import os
+import threading
+import pymongo
+from pymongo import MongoClient, monitoring
 from app.config import settings
+from app.metrics import command_listener
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collect connection pool statistics for the shared MongoClient
+    Used to size MONGO_MAX_POOL_SIZE from real traffic (checked-out connections, wait time)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all counters (called whenever a new client is created)"""
+        with self._lock:
+            self.open_connections = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.total_checkouts = 0
+            self.checkout_failures = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.pool_clears = 0
+
+    def snapshot(self):
+        """Return a copy of the current counters as a plain dict"""
+        with self._lock:
+            avg_wait_ms = self.total_wait_ms / self.total_checkouts if self.total_checkouts else 0.0
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "total_checkouts": self.total_checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(avg_wait_ms, 3),
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "pool_clears": self.pool_clears,
+            }
+
+    # Pool lifecycle events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    # Connection lifecycle events
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(0, self.open_connections - 1)
+
+    # Checkout events - duration is the time spent waiting for a pooled connection
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = (getattr(event, "duration", None) or 0.0) * 1000
+        with self._lock:
+            self.checked_out += 1
+            self.total_checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+
+# ============================================================================
+# PROCESS-WIDE CLIENT REGISTRY
+# ============================================================================
+# A MongoClient owns its connection pool and monitor threads, so the whole
+# process shares one client instead of creating a new one per call.
+# The client is keyed by PID: after a fork (uvicorn workers) the child builds
+# its own client rather than reusing the parent's sockets.
+
+_client_lock = threading.Lock()
+_client = None
+_client_pid = None
+pool_stats_listener = PoolStatsListener()
+
+
+def _reset_after_fork():
+    """Drop the inherited client in a forked child - it must never be used there"""
+    global _client_lock, _client, _client_pid
+    _client_lock = threading.Lock()
+    _client = None
+    _client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client():
+    """Get the shared, pooled MongoClient for this process (created lazily)"""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                pool_stats_listener.reset()
+                # connect=False defers all network I/O until the first operation
+                _client = MongoClient(
+                    settings.MONGO_URI,
+                    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                    minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+                    serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    event_listeners=[pool_stats_listener, command_listener],
+                    connect=False,
+                )
+                _client_pid = pid
+    return _client
+
+
+def close_client():
+    """Close the shared MongoClient (called on application shutdown)"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def get_pool_stats():
+    """Get connection pool statistics for the shared client"""
+    stats = pool_stats_listener.snapshot()
+    stats["max_pool_size"] = settings.MONGO_MAX_POOL_SIZE
+    stats["min_pool_size"] = settings.MONGO_MIN_POOL_SIZE
+    stats["client_initialized"] = _client is not None and _client_pid == os.getpid()
+    return stats
+
+
+def ping(timeout_seconds=1.0):
+    """
+    Check that MongoDB answers within timeout_seconds (used by the readiness probe)
+    Bounded by a client-side timeout so a probe never waits for server selection
+    """
+    try:
+        with pymongo.timeout(timeout_seconds):
+            get_client().admin.command("ping")
+        return True
+    except Exception:
+        return False
+
 
 def get_database():
-    """Get MongoDB database connection"""
-    client = MongoClient(settings.MONGO_URI)
-    return client[settings.DATABASE_NAME]
+    """Get MongoDB database from the shared client"""
+    return get_client()[settings.DATABASE_NAME]
 
 def get_collection(collection_name):
     """Get a specific collection from the database"""
     db = get_database()
     return db[collection_name]
-
-# Initialize database connection
-db = get_database()
@@ -0,0 +1,267 @@
+# Nearest distribution center and delivery estimates
+# distribution_centers holds a handful of rows (10 in thelook), so instead of a
+# spatial tree the nearest center of every user is precomputed in bulk when the
+# index is built: users and centers become unit vectors on the sphere, one
+# (users x 3) @ (3 x centers) product ranks every center by central angle, and the
+# haversine distance to the winner is computed vectorized. A chat lookup is then
+# an array read by user id (or a dict read by city).
+
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from app.config import settings
+from app.search import STOPWORDS, SearchIndexHolder
+
+# Mean Earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+# Users are read from MongoDB in batches of this many documents
+USER_BATCH_SIZE = 50_000
+
+# Longest city name, in words, looked up in a message ("rio branco", "salt lake city")
+MAX_CITY_WORDS = 4
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['.-][^\W\d_]+)*")
+
+
+def unit_vectors(latitudes, longitudes):
+    """(n, 3) unit vectors for latitude/longitude arrays in degrees"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (element-wise over arrays)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def nearest_centers(latitudes, longitudes, center_latitudes, center_longitudes):
+    """(center position, distance km) of the nearest center for every point"""
+    if not len(latitudes):
+        return np.empty(0, dtype=np.int16), np.empty(0, dtype=np.float32)
+    # The largest cosine is the smallest central angle, i.e. the nearest center
+    cosines = unit_vectors(latitudes, longitudes) @ unit_vectors(center_latitudes, center_longitudes).T
+    positions = cosines.argmax(axis=1).astype(np.int16)
+    center_latitudes = np.asarray(center_latitudes, dtype=np.float64)
+    center_longitudes = np.asarray(center_longitudes, dtype=np.float64)
+    distances = haversine_km(latitudes, longitudes, center_latitudes[positions], center_longitudes[positions])
+    return positions, distances.astype(np.float32)
+
+
+def shipping_estimate(distance_km):
+    """
+    (earliest, latest) delivery days for a destination distance_km from its center
+    SHIPPING_MIN_DAYS..SHIPPING_MAX_DAYS, shifted by up to the window width for
+    destinations SHIPPING_FAR_KM or more away
+    """
+    low, high = settings.SHIPPING_MIN_DAYS, settings.SHIPPING_MAX_DAYS
+    if distance_km is None:
+        return low, high
+    extra = round(min(distance_km / settings.SHIPPING_FAR_KM, 1.0) * (high - low))
+    return low + extra, high + extra
+
+
+def arrival_window(start, low, high):
+    """Dates low and high days after a thelook timestamp ("Sep 03, 2023"), or None"""
+    if not start:
+        return None
+    try:
+        started = datetime.fromisoformat(str(start).replace(" UTC", "+00:00"))
+    except ValueError:
+        return None
+    return tuple((started + timedelta(days=days)).strftime("%b %d, %Y") for days in (low, high))
+
+
+def nearest_result(origin, center, distance_km):
+    """Nearest-center answer data: origin city, center and distance"""
+    low, high = shipping_estimate(distance_km)
+    return {
+        "origin": origin,
+        "center_id": center.get("id"),
+        "center": center.get("name", "Unknown"),
+        "distance_km": round(float(distance_km), 1),
+        "min_days": low,
+        "max_days": high,
+    }
+
+
+# Per-user arrays are indexed directly by user id unless ids are this sparse
+MAX_ID_SPREAD = 4
+
+
+class NearestCenters:
+    """Per-user and per-city nearest distribution center, precomputed at build time"""
+
+    def __init__(self, centers, user_ids, user_positions, user_distances, user_cities, cities):
+        self.docs = centers
+        # lowercase city -> (display name, center position, distance km); user_cities
+        # holds positions in city_names
+        self.cities = cities
+        self.city_names = [name for name, _, _ in cities.values()]
+        size = int(user_ids.max()) + 1 if len(user_ids) else 0
+        if size <= MAX_ID_SPREAD * len(user_ids) + 1024:
+            # Dense: row = user id (-1 marks ids without a user or coordinates)
+            self.user_ids = None
+            self.user_positions = np.full(size, -1, dtype=np.int16)
+            self.user_distances = np.zeros(size, dtype=np.float32)
+            self.user_cities = np.full(size, -1, dtype=np.int32)
+            self.user_positions[user_ids] = user_positions
+            self.user_distances[user_ids] = user_distances
+            self.user_cities[user_ids] = user_cities
+        else:
+            # Sparse ids: sorted, found by binary search
+            order = np.argsort(user_ids, kind="stable")
+            self.user_ids = user_ids[order]
+            self.user_positions = user_positions[order]
+            self.user_distances = user_distances[order]
+            self.user_cities = user_cities[order]
+
+    def row(self, user_id):
+        """Row of a user in the per-user arrays, or -1"""
+        if self.user_ids is None:
+            if 0 <= user_id < len(self.user_positions) and self.user_positions[user_id] >= 0:
+                return user_id
+            return -1
+        row = int(np.searchsorted(self.user_ids, user_id))
+        return row if row < len(self.user_ids) and self.user_ids[row] == user_id else -1
+
+
+class DistributionCenterIndex(SearchIndexHolder):
+    """
+    Nearest distribution center per user and per city
+    Users are streamed in batches (only id, city and coordinates); each batch gets
+    its nearest center in one vectorized pass. City coordinates are the mean of
+    their users' coordinates.
+    """
+
+    def __init__(self):
+        super().__init__("distribution center")
+
+    def build(self, db):
+        centers = [center for center in db.distribution_centers.find(
+            {}, {"_id": 0, "id": 1, "name": 1, "latitude": 1, "longitude": 1}).sort("id", 1)
+            if center.get("latitude") is not None and center.get("longitude") is not None]
+        if not centers:
+            raise ValueError("no distribution centers with coordinates")
+        center_latitudes = [center["latitude"] for center in centers]
+        center_longitudes = [center["longitude"] for center in centers]
+
+        ids, positions, distances, city_codes = [], [], [], []
+        city_codes_by_name = {}
+        city_sums = []  # [display name, latitude sum, longitude sum, users]
+        cursor = db.users.find(
+            {"latitude": {"$ne": None}, "longitude": {"$ne": None}},
+            {"_id": 0, "id": 1, "city": 1, "latitude": 1, "longitude": 1},
+        ).batch_size(USER_BATCH_SIZE)
+        batch = []
+        for user in cursor:
+            batch.append(user)
+            if len(batch) == USER_BATCH_SIZE:
+                self._add_batch(batch, center_latitudes, center_longitudes, ids, positions, distances,
+                                city_codes, city_codes_by_name, city_sums)
+                batch = []
+        self._add_batch(batch, center_latitudes, center_longitudes, ids, positions, distances,
+                        city_codes, city_codes_by_name, city_sums)
+
+        cities = {}
+        if city_sums:
+            sums = np.array([row[1:] for row in city_sums], dtype=np.float64)
+            city_positions, city_distances = nearest_centers(
+                sums[:, 0] / sums[:, 2], sums[:, 1] / sums[:, 2], center_latitudes, center_longitudes)
+            for (name, *_), position, distance in zip(city_sums, city_positions, city_distances):
+                cities[name.lower()] = (name, int(position), float(distance))
+
+        concat = lambda parts, dtype: np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype)
+        return NearestCenters(centers, concat(ids, np.int64), concat(positions, np.int16),
+                              concat(distances, np.float32), concat(city_codes, np.int32), cities)
+
+    @staticmethod
+    def _add_batch(batch, center_latitudes, center_longitudes, ids, positions, distances,
+                   city_codes, city_codes_by_name, city_sums):
+        """Nearest center for one batch of users; accumulates per-city coordinate sums"""
+        batch = [user for user in batch if isinstance(user.get("id"), int) and user["id"] >= 0
+                 and user.get("latitude") is not None and user.get("longitude") is not None]
+        if not batch:
+            return
+        latitudes = np.array([user["latitude"] for user in batch], dtype=np.float64)
+        longitudes = np.array([user["longitude"] for user in batch], dtype=np.float64)
+        batch_positions, batch_distances = nearest_centers(latitudes, longitudes, center_latitudes, center_longitudes)
+        codes = np.full(len(batch), -1, dtype=np.int32)
+        for i, user in enumerate(batch):
+            city = user.get("city")
+            if not isinstance(city, str) or not city.strip():
+                continue
+            key = city.strip().lower()
+            code = city_codes_by_name.get(key)
+            if code is None:
+                code = city_codes_by_name[key] = len(city_sums)
+                city_sums.append([city.strip(), 0.0, 0.0, 0])
+            sums = city_sums[code]
+            sums[1] += latitudes[i]
+            sums[2] += longitudes[i]
+            sums[3] += 1
+            codes[i] = code
+        ids.append(np.array([user["id"] for user in batch], dtype=np.int64))
+        positions.append(batch_positions)
+        distances.append(batch_distances)
+        city_codes.append(codes)
+
+    def for_user(self, user_id):
+        """Nearest center of a user, or None (unknown user or no coordinates)"""
+        index = self.index
+        if index is None:
+            return None
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        row = index.row(user_id)
+        if row < 0:
+            return None
+        city_code = index.user_cities[row]
+        origin = index.city_names[city_code] if city_code >= 0 else None
+        return nearest_result(origin, index.docs[index.user_positions[row]], index.user_distances[row])
+
+    def for_city(self, city):
+        """Nearest center of a city (case-insensitive exact name), or None"""
+        index = self.index
+        if index is None or not city:
+            return None
+        entry = index.cities.get(city.strip().lower())
+        if entry is None:
+            return None
+        name, position, distance = entry
+        return nearest_result(name, index.docs[position], distance)
+
+    def find_city(self, message):
+        """The longest known city name in the message, or None"""
+        index = self.index
+        if index is None:
+            return None
+        words = WORD_PATTERN.findall(message.lower())
+        best = None
+        for start in range(len(words)):
+            for length in range(min(MAX_CITY_WORDS, len(words) - start), 0, -1):
+                candidate = " ".join(words[start:start + length])
+                if candidate in index.cities and candidate not in STOPWORDS:
+                    if best is None or length > best[1]:
+                        best = (index.cities[candidate][0], length)
+                    break
+        return best[0] if best else None
+
+    def nearest(self, latitude, longitude):
+        """Nearest center of an arbitrary point"""
+        index = self.index
+        if index is None:
+            return None
+        positions, distances = nearest_centers(
+            [latitude], [longitude],
+            [center["latitude"] for center in index.docs], [center["longitude"] for center in index.docs])
+        return nearest_result(None, index.docs[positions[0]], distances[0])
+
+
+distribution_centers = DistributionCenterIndex()
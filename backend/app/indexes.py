@@ -0,0 +1,176 @@
+# Index management for every collection queried by chat_logic and main
+# Declares the required indexes, creates them idempotently, and reports
+# missing/unused indexes plus the query plans of the hot chat queries.
+
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import ServerSelectionTimeoutError
+from app.database import get_database
+
+# ============================================================================
+# REQUIRED INDEXES
+# ============================================================================
+# Keyed by collection; each entry matches a query path in chat_logic or main
+
+INDEX_SPECS = {
+    "orders": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_1"),  # query_order_status
+        IndexModel([("user_id", ASCENDING)], name="user_id_1"),  # query_user_orders
+    ],
+    "order_items": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_1"),  # query_order_status items
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_1"),  # query_user_info
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_1"),  # query_product_by_id
+    ],
+    "inventory_items": [
+        IndexModel([("product_id", ASCENDING)], name="product_id_1"),  # query_inventory_by_product
+    ],
+    "distribution_centers": [
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),  # query_nearest_center ($geoNear)
+    ],
+    "messages": [
+        # Conversation history (sorted by timestamp in both directions);
+        # _id breaks timestamp ties for keyset pagination
+        IndexModel([("conversation_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+                   name="conversation_id_1_timestamp_1__id_1"),
+    ],
+    "conversations": [
+        # Sidebar listing and per-user cleanup (most recent first)
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING)], name="user_id_1_updated_at_-1"),
+    ],
+}
+
+# Hot queries checked with explain() - (name, collection, filter, sort)
+HOT_QUERIES = [
+    ("query_order_status", "orders", {"order_id": 1}, None),
+    ("query_order_status.items", "order_items", {"order_id": 1}, None),
+    ("query_user_orders", "orders", {"user_id": 1}, None),
+    ("query_user_info", "users", {"id": 1}, None),
+    ("query_product_by_id", "products", {"id": 1}, None),
+    ("query_inventory_by_product", "inventory_items", {"product_id": 1}, None),
+    ("get_conversation_messages", "messages", {"conversation_id": ""}, {"timestamp": -1, "_id": -1}),
+    ("get_conversation_messages.after", "messages",
+     {"conversation_id": "", "timestamp": {"$gte": datetime(1970, 1, 1)}}, {"timestamp": 1, "_id": 1}),
+    ("chat.history", "messages", {"conversation_id": ""}, {"timestamp": -1}),
+    ("get_user_conversations", "conversations", {"user_id": ""}, {"updated_at": -1}),
+]
+
+
+def ensure_indexes(db=None):
+    """
+    Create all required indexes (idempotent - existing indexes are left untouched)
+    Returns the index names per collection
+    """
+    db = db if db is not None else get_database()
+    created = {}
+    for collection_name, models in INDEX_SPECS.items():
+        try:
+            created[collection_name] = db[collection_name].create_indexes(models)
+        except ServerSelectionTimeoutError as e:
+            print(f"❌ MongoDB unavailable, skipping index creation: {e}")
+            return created
+        except Exception as e:
+            print(f"❌ Error creating indexes on {collection_name}: {e}")
+    print(f"✅ Indexes ensured on {len(created)} collections")
+    return created
+
+
+def find_missing_indexes(db=None):
+    """Return the required index names that do not exist yet, per collection"""
+    db = db if db is not None else get_database()
+    missing = {}
+    for collection_name, models in INDEX_SPECS.items():
+        existing_keys = [
+            list(info["key"]) for info in db[collection_name].index_information().values()
+        ]
+        for model in models:
+            spec = model.document
+            if list(spec["key"].items()) not in existing_keys:
+                missing.setdefault(collection_name, []).append(spec["name"])
+    return missing
+
+
+def get_index_usage(db=None):
+    """
+    Get per-index operation counts from $indexStats
+    Counters reset when mongod restarts, so "unused" means unused since then
+    """
+    db = db if db is not None else get_database()
+    usage = {}
+    for collection_name in INDEX_SPECS:
+        try:
+            stats = db[collection_name].aggregate([{"$indexStats": {}}])
+            usage[collection_name] = {s["name"]: s["accesses"]["ops"] for s in stats}
+        except Exception as e:
+            print(f"⚠️  $indexStats unavailable for {collection_name}: {e}")
+    return usage
+
+
+def find_unused_indexes(db=None):
+    """Return indexes (other than _id_) with zero recorded operations"""
+    unused = {}
+    for collection_name, ops_by_index in get_index_usage(db).items():
+        names = [name for name, ops in ops_by_index.items() if ops == 0 and name != "_id_"]
+        if names:
+            unused[collection_name] = names
+    return unused
+
+
+def _plan_stages(plan):
+    """Collect the stage names of an explain() winning plan (walks nested input stages)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("queryPlan", "inputStage"):
+            stages.extend(_plan_stages(plan.get(key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+def explain_hot_queries(db=None):
+    """
+    Run explain() on the hot chat queries
+    A query that falls back to COLLSCAN is flagged as a regression
+    """
+    db = db if db is not None else get_database()
+    report = []
+    for name, collection_name, query_filter, sort in HOT_QUERIES:
+        command = {"find": collection_name, "filter": query_filter}
+        if sort:
+            command["sort"] = sort
+        try:
+            explain = db.command("explain", command, verbosity="queryPlanner")
+            stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+            report.append({
+                "query": name,
+                "collection": collection_name,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+            })
+        except Exception as e:
+            report.append({"query": name, "collection": collection_name, "error": str(e)})
+    return report
+
+
+def get_index_report(db=None):
+    """Combined index health report: missing, unused and hot query plans"""
+    db = db if db is not None else get_database()
+    plans = explain_hot_queries(db)
+    return {
+        "missing": find_missing_indexes(db),
+        "unused": find_unused_indexes(db),
+        "hot_queries": plans,
+        "regressions": [p["query"] for p in plans if p.get("collscan")],
+    }
+
+
+if __name__ == "__main__":
+    import json
+    ensure_indexes()
+    print(json.dumps(get_index_report(), indent=2, default=str))
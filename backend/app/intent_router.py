@@ -0,0 +1,228 @@
+# Intent routing for generate_contextual_response
+# All patterns are compiled once into a single alternation regex with named
+# groups, so one scan of the message extracts every entity (order/user/product
+# IDs, product keywords, categories, locations, policy terms). The intent is
+# then picked from a priority-ordered routing table instead of a chain of
+# if-branches, so adding an intent means adding a pattern and a table row.
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Product words that mark an availability query
+PRODUCT_KEYWORDS = [
+    'jacket', 'shirt', 'pants', 'dress', 'shoes', 'denim', 'headband',
+    'size', 'color', 'available', 'in stock', 'satin'
+]
+
+# Categories the bot answers for; "category" on its own defaults to the last one
+CATEGORIES = ['socks', 'accessories']
+DEFAULT_CATEGORY = 'accessories'
+
+# Known locations (lowercase -> display name); "location" on its own uses the default
+LOCATIONS = {'rio branco': 'Rio Branco'}
+DEFAULT_LOCATION = 'Rio Branco'
+
+POLICY_TERMS = ['return', 'refund', 'policy']
+
+# Aggregate questions answered by app.analytics ("top selling products this week")
+ANALYTICS_TERMS = [
+    'top selling', 'best selling', 'best seller', 'most popular',
+    'revenue', 'total sales', 'sales by', 'how many orders', 'number of orders',
+    'order count', 'orders by status', 'average order value',
+]
+
+# Product rankings with an optional count: "top products", "top 5 selling products"
+TOP_PRODUCTS = r"top\s+(?:\d+\s+)?(?:selling\s+)?products?"
+
+# Where an order ships from / when it arrives, answered by app.geo
+SHIPPING_TERMS = [
+    'ship from', 'ships from', 'shipped from', 'ship to', 'shipping', 'arrive', 'arriving',
+    'delivery time', 'delivery estimate', 'estimated delivery', 'distribution center', 'warehouse',
+]
+
+
+def _alternation(words):
+    """Regex alternation of literal words, longest first so multi-word terms win"""
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+# One ID or a pasted list of IDs: "12", "#12", "12, 15 and #18"
+ID_LIST = r"#?\d+(?:\s*(?:,|and|&)\s*#?\d+)*"
+DIGITS_PATTERN = re.compile(r"\d+")
+
+# Every alternative starts with one of these letters
+_FIRST_LETTERS = "".join(sorted(set(
+    "oupi" + "".join(w[0] for w in list(LOCATIONS) + CATEGORIES + PRODUCT_KEYWORDS + POLICY_TERMS + ANALYTICS_TERMS + SHIPPING_TERMS + ["location", "category"])
+)))
+
+# One pass over the lowercased message; the first alternative matching at a
+# position wins, so ID patterns are listed before bare keywords. The leading
+# word boundary + first-letter lookahead reject most positions before any
+# alternative is tried.
+MESSAGE_PATTERN = re.compile(
+    rf"\b(?=[{_FIRST_LETTERS}])(?:"
+    rf"(?P<order>orders?\s+(?:ids?\s+|numbers?\s+)?(?P<order_id>{ID_LIST}))"
+    rf"|(?P<user>users?\s+(?:ids?\s+)?(?P<user_id>{ID_LIST}))"
+    rf"|(?P<product>products?\s+(?:ids?\s+)?(?P<product_id>{ID_LIST}))"
+    r"|(?P<product_details>product\s+details)"
+    r"|(?P<id_ref>id\s+(?P<bare_id>\d+))"
+    rf"|(?P<analytics>{TOP_PRODUCTS}|{_alternation(ANALYTICS_TERMS)})"
+    rf"|(?P<shipping>{_alternation(SHIPPING_TERMS)})"
+    rf"|(?P<location>{_alternation(list(LOCATIONS) + ['location'])})"
+    rf"|(?P<category>{_alternation(CATEGORIES + ['category'])})"
+    rf"|(?P<keyword>{_alternation(PRODUCT_KEYWORDS)})"
+    rf"|(?P<policy>{_alternation(POLICY_TERMS)})"
+    r")"
+)
+
+# Free-text product name guesses, only used when nothing else matched
+QUOTED_PATTERN = re.compile(r'"([^"]+)"')  # Text in quotes like "satin headband"
+PARENTHESIZED_PATTERN = re.compile(r'\(([^)]+)\)')  # Text in parentheses
+WORD_GROUP_PATTERN = re.compile(r'(\w+(?:\s+\w+){1,3})')  # 2-4 word combinations
+
+
+class ExtractedEntities:
+    """Every entity found in one message, in order of appearance"""
+
+    __slots__ = ("message", "order_ids", "user_ids", "product_ids", "bare_ids", "categories",
+                 "locations", "product_keywords", "policy_terms", "analytics_terms", "shipping_terms",
+                 "product_details")
+
+    def __init__(self, message=""):
+        self.message = message
+        self.order_ids = []
+        self.user_ids = []
+        self.product_ids = []
+        self.bare_ids = []
+        self.categories = []
+        self.locations = []
+        self.product_keywords = []
+        self.policy_terms = []
+        self.analytics_terms = []
+        self.shipping_terms = []
+        self.product_details = False
+
+    @property
+    def entity_refs(self):
+        """(kind, id) for every order/user/product ID, when the message references more than one"""
+        refs = ([("order", i) for i in self.order_ids]
+                + [("user", i) for i in self.user_ids]
+                + [("product", i) for i in self.product_ids])
+        return refs if len(refs) > 1 else []
+
+    @property
+    def mixed_user_ids(self):
+        """User IDs referenced as "id N" together with "product details" (mixed queries)"""
+        return self.bare_ids if self.product_details else []
+
+    @property
+    def product_phrases(self):
+        """Free-text product name guesses (quoted text, parentheses, 2-4 word groups)"""
+        phrases = []
+        for pattern in (QUOTED_PATTERN, PARENTHESIZED_PATTERN, WORD_GROUP_PATTERN):
+            for match in pattern.findall(self.message):
+                if len(match) > 3:  # Only consider meaningful product names
+                    phrases.append(match.lower())
+        return phrases
+
+
+@dataclass
+class RoutedMessage:
+    """
+    Routing result: the resolved intent, its values and all extracted entities
+    A handler that retrieves context for the LLM instead of answering directly
+    (semantic product retrieval) stores it in llm_context
+    """
+    intent: str
+    values: list
+    entities: ExtractedEntities
+    llm_context: Optional[str] = None
+
+
+# Outer group name -> ExtractedEntities list for groups whose value is the whole match
+_GROUP_TARGETS = {
+    "category": "categories",
+    "keyword": "product_keywords",
+    "policy": "policy_terms",
+    "analytics": "analytics_terms",
+    "shipping": "shipping_terms",
+}
+
+# Outer group name -> (ExtractedEntities list, inner group holding one or more IDs)
+_ID_GROUP_TARGETS = {
+    "order": ("order_ids", "order_id"),
+    "user": ("user_ids", "user_id"),
+    "product": ("product_ids", "product_id"),
+    "id_ref": ("bare_ids", "bare_id"),
+}
+
+
+def extract_entities(message):
+    """Extract all entities from a message in a single regex scan"""
+    entities = ExtractedEntities(message=message)
+    for match in MESSAGE_PATTERN.finditer(message.lower()):
+        kind = match.lastgroup
+        if kind in _ID_GROUP_TARGETS:
+            attribute, group = _ID_GROUP_TARGETS[kind]
+            values = getattr(entities, attribute)
+            for value in DIGITS_PATTERN.findall(match.group(group)):
+                if value not in values:
+                    values.append(value)
+            continue
+        if kind in _GROUP_TARGETS:
+            values = getattr(entities, _GROUP_TARGETS[kind])
+            value = match.group()
+        elif kind == "location":
+            values = entities.locations
+            value = LOCATIONS.get(match.group(), DEFAULT_LOCATION)
+        else:  # product_details
+            entities.product_details = True
+            continue
+        if value not in values:
+            values.append(value)
+    # "category" alone means the default category; a named category takes precedence
+    if entities.categories:
+        named = [c for c in entities.categories if c != 'category']
+        entities.categories = named or [DEFAULT_CATEGORY]
+    return entities
+
+
+# ============================================================================
+# ROUTING TABLE
+# ============================================================================
+# (intent, entity attribute) in priority order - the first non-empty attribute
+# decides the intent. Messages referencing several order/user/product IDs are
+# answered together (batched retrieval). Free-text product phrases come after policy and mixed
+# queries so that e.g. "what is your return policy?" reaches the policy answer.
+# Aggregate questions come before categories and keywords, so "revenue by
+# category" is answered by the analytics snapshot rather than as a category listing.
+# Shipping questions come right after multi-entity messages: "when will order 12
+# arrive" names an order but asks for a delivery estimate, not its status.
+
+ROUTES = [
+    ("multi_entity", "entity_refs"),
+    ("shipping", "shipping_terms"),
+    ("order", "order_ids"),
+    ("user", "user_ids"),
+    ("analytics", "analytics_terms"),
+    ("category", "categories"),
+    ("location", "locations"),
+    ("product", "product_ids"),
+    ("availability", "product_keywords"),
+    ("policy", "policy_terms"),
+    ("user_orders", "mixed_user_ids"),
+    ("availability", "product_phrases"),
+]
+
+HELP_INTENT = "help"
+
+
+def route_message(message, routes=ROUTES):
+    """Classify a message: extract all entities once, then walk the routing table"""
+    entities = extract_entities(message)
+    for intent, attribute in routes:
+        values = getattr(entities, attribute)
+        if values:
+            return RoutedMessage(intent, values, entities)
+    return RoutedMessage(HELP_INTENT, [], entities)
@@ -0,0 +1,147 @@
+# Response cache for LLM calls made by call_llm_with_context
+# Exact lookup: a normalized hash of (model, system prompt, context, trailing
+# history). Similarity lookup: among answers generated for the same model,
+# system prompt and database context, reuse one whose question is a near
+# duplicate (character-shingle Jaccard similarity), e.g. rephrased FAQs such as
+# the return policy asked in different conversations.
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from app.cache import LRUTTLCache, _MISSING
+from app.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+# Near-duplicate candidates kept per (model, system prompt, context) group
+MAX_SIMILAR_PER_GROUP = 50
+
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", (text or "").lower())).strip()
+
+
+def shingles(text, size=3):
+    """Character shingles of the normalized text (robust to small rewordings and typos)"""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LRU + TTL cache of LLM answers with optional near-duplicate lookup
+    Tracks saved calls and the LLM latency they saved.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, similarity_threshold=None):
+        self.max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.LLM_CACHE_TTL_SECONDS
+        self.similarity_threshold = (similarity_threshold if similarity_threshold is not None
+                                     else settings.LLM_CACHE_SIMILARITY_THRESHOLD)
+        self.exact = LRUTTLCache(self.max_entries)
+        self.groups = OrderedDict()  # group key -> [(expires_at, shingles, entry)]
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "saved_calls": 0, "saved_latency_ms": 0.0}
+
+    # ============================================================================
+    # KEYS
+    # ============================================================================
+
+    def exact_key(self, model, system_prompt, context, chat_history):
+        history = [(m["role"], normalize_text(m["content"])) for m in chat_history]
+        return _digest(model, normalize_text(system_prompt), normalize_text(context), history)
+
+    def group_key(self, model, system_prompt, context):
+        return _digest(model, normalize_text(system_prompt), normalize_text(context))
+
+    # ============================================================================
+    # LOOKUP / STORE
+    # ============================================================================
+
+    def lookup(self, model, system_prompt, context, chat_history):
+        """Return a cached answer for this call, or None"""
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self.exact.get(self.exact_key(model, system_prompt, context, chat_history))
+        if entry is not _MISSING:
+            self._record_hit("exact_hits", entry)
+            return entry["content"]
+
+        if self.similarity_threshold > 0 and chat_history:
+            question = shingles(chat_history[-1]["content"])
+            now = time.monotonic()
+            best, best_score = None, 0.0
+            with self._lock:
+                candidates = self.groups.get(self.group_key(model, system_prompt, context), [])
+                for expires_at, candidate_shingles, candidate in candidates:
+                    if expires_at <= now:
+                        continue
+                    score = jaccard(question, candidate_shingles)
+                    if score > best_score:
+                        best, best_score = candidate, score
+            if best is not None and best_score >= self.similarity_threshold:
+                self._record_hit("similar_hits", best)
+                return best["content"]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def store(self, model, system_prompt, context, chat_history, content, latency_ms):
+        """Cache an LLM answer together with the latency it took to produce"""
+        if self.ttl_seconds <= 0 or not content:
+            return
+        entry = {"content": content, "latency_ms": latency_ms}
+        self.exact.set(self.exact_key(model, system_prompt, context, chat_history), entry, self.ttl_seconds)
+        if self.similarity_threshold > 0 and chat_history:
+            group_key = self.group_key(model, system_prompt, context)
+            now = time.monotonic()
+            with self._lock:
+                candidates = [c for c in self.groups.pop(group_key, []) if c[0] > now]
+                candidates.append((now + self.ttl_seconds, shingles(chat_history[-1]["content"]), entry))
+                self.groups[group_key] = candidates[-MAX_SIMILAR_PER_GROUP:]
+                while len(self.groups) > self.max_entries:
+                    self.groups.popitem(last=False)
+
+    def _record_hit(self, counter, entry):
+        with self._lock:
+            self.stats[counter] += 1
+            self.stats["saved_calls"] += 1
+            self.stats["saved_latency_ms"] += entry["latency_ms"]
+
+    def clear(self):
+        self.exact.clear()
+        with self._lock:
+            self.groups.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["similar_hits"]) / lookups, 4) if lookups else 0.0
+        stats["saved_latency_ms"] = round(stats["saved_latency_ms"], 2)
+        stats["entries"] = len(self.exact)
+        return stats
+
+
+llm_response_cache = LLMResponseCache()
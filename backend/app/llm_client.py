@@ -0,0 +1,446 @@
+# Resilient LLM client shared by chat_logic and async_chat_logic
+# - one pooled HTTP session per process (requests.Session / httpx.AsyncClient),
+#   so calls reuse TCP+TLS connections
+# - at most LLM_MAX_CONCURRENCY calls in flight per process
+# - retries with exponential backoff and full jitter on failures that are safe
+#   to retry (connection errors, timeouts, 429 and 5xx), honouring Retry-After
+# - a circuit breaker per provider: after LLM_BREAKER_FAILURES consecutive
+#   failures the provider is skipped for LLM_BREAKER_RESET_SECONDS, then a single
+#   probe call decides whether it is healthy again
+# - OpenAI (OPENAI_API_KEY) as failover for Groq: tried when Groq's breaker is
+#   open or its call fails, and first while Groq's recent latency is above
+#   LLM_FAILOVER_LATENCY_MS
+# When no provider can answer, complete() returns None and the caller falls back
+# to the rule-based answer instead of waiting on a degraded provider.
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import settings
+
+# Responses worth retrying (rate limited or transient server errors)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Weight of the newest sample in a provider's latency average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class LLMUnavailable(Exception):
+    """No LLM provider could serve the request"""
+
+
+class RetryableResponse(Exception):
+    """A response with a retryable status code"""
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff; the server's Retry-After wins when present"""
+    if retry_after is not None:
+        return retry_after
+    cap = min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+def completion_content(status_code, headers, body):
+    """
+    Message content of a chat completion response
+    Raises RetryableResponse for 429/5xx and ValueError for other errors
+    """
+    if status_code in RETRYABLE_STATUS:
+        raise RetryableResponse(status_code, parse_retry_after(headers.get("Retry-After")))
+    if status_code >= 400:
+        raise ValueError(f"HTTP {status_code}")
+    return body()["choices"][0]["message"]["content"]
+
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures
+    open -> half_open after `reset_seconds`; one probe call is let through and
+    closes the breaker on success or re-opens it on failure
+    """
+    def __init__(self, threshold=None, reset_seconds=None):
+        self.threshold = threshold or settings.LLM_BREAKER_FAILURES
+        self.reset_seconds = reset_seconds or settings.LLM_BREAKER_RESET_SECONDS
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probe_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be made now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_at = None
+            if self.state == "half_open":
+                # One probe at a time (a probe that never reported back is replaced)
+                if self._probe_at is None or now - self._probe_at >= self.reset_seconds:
+                    self._probe_at = now
+                    return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_at = None
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+# ============================================================================
+# PROVIDERS
+# ============================================================================
+
+class Provider:
+    """An OpenAI-compatible chat completion endpoint with its breaker and latency"""
+    def __init__(self, name, url, api_key, model):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.breaker = CircuitBreaker()
+        self.latency_ms = None  # moving average of successful calls
+        self._latency_at = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.last_error = None
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def payload(self, payload):
+        """The request payload with this provider's model"""
+        return dict(payload, model=self.model)
+
+    def record_success(self, latency_ms=None):
+        self.calls += 1
+        self.breaker.record_success()
+        if latency_ms is not None:
+            if self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms += LATENCY_EWMA_ALPHA * (latency_ms - self.latency_ms)
+            self._latency_at = time.monotonic()
+
+    def record_failure(self, error):
+        self.calls += 1
+        self.errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.breaker.record_failure()
+
+    def is_slow(self):
+        """Recent average latency above LLM_FAILOVER_LATENCY_MS (stale samples don't count)"""
+        threshold = settings.LLM_FAILOVER_LATENCY_MS
+        return bool(threshold and self.latency_ms is not None
+                    and self.latency_ms > threshold
+                    and time.monotonic() - self._latency_at < self.breaker.reset_seconds)
+
+    def get_stats(self):
+        return {
+            "name": self.name,
+            "model": self.model,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+def configured_providers():
+    """Groq first, then OpenAI as failover - each only if its API key is set"""
+    providers = []
+    if settings.GROQ_API_KEY:
+        providers.append(Provider("groq", settings.GROQ_API_URL, settings.GROQ_API_KEY, settings.GROQ_MODEL))
+    if settings.OPENAI_API_KEY:
+        providers.append(Provider("openai", settings.OPENAI_API_URL, settings.OPENAI_API_KEY, settings.OPENAI_MODEL))
+    return providers
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+class LLMClient:
+    """Chat completions over the configured providers (sync and async)"""
+    def __init__(self, providers=None):
+        self.providers = configured_providers() if providers is None else providers
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._async_client = None
+        self._semaphore = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+        self._async_semaphore = None
+        self.failovers = 0
+        self.fast_failures = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return bool(self.providers)
+
+    def candidates(self):
+        """Providers in the order to try them for the next call"""
+        ordered = list(self.providers)
+        if len(ordered) > 1 and ordered[0].is_slow() and not ordered[1].is_slow():
+            ordered[0], ordered[1] = ordered[1], ordered[0]
+        return ordered
+
+    def _served(self, provider):
+        if provider is not self.providers[0]:
+            self.failovers += 1
+
+    def get_stats(self):
+        return {
+            "providers": [provider.get_stats() for provider in self.providers],
+            "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+            "failovers": self.failovers,
+            "fast_failures": self.fast_failures,
+            "rejected": self.rejected,
+        }
+
+    # ------------------------------------------------------------------
+    # sync
+    # ------------------------------------------------------------------
+
+    def get_session(self):
+        """Pooled requests session (keeps connections alive between calls)"""
+        with self._session_lock:
+            if self._session is None:
+                adapter = HTTPAdapter(pool_connections=len(self.providers) or 1,
+                                      pool_maxsize=settings.LLM_MAX_CONNECTIONS, max_retries=0)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def close(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def complete(self, payload):
+        """Content of a chat completion, or None if no provider could answer in time"""
+        deadline = time.monotonic() + settings.LLM_TOTAL_TIMEOUT_SECONDS
+        if not self._semaphore.acquire(timeout=settings.LLM_TIMEOUT_SECONDS):
+            self.rejected += 1
+            print("⚠️  LLM concurrency limit reached - using fallback answer")
+            return None
+        try:
+            for provider in self.candidates():
+                if not provider.breaker.allow():
+                    self.fast_failures += 1
+                    continue
+                content = self._call_with_retries(provider, payload, deadline)
+                if content is not None:
+                    self._served(provider)
+                    return content
+            return None
+        finally:
+            self._semaphore.release()
+
+    def _call_with_retries(self, provider, payload, deadline):
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            start = time.perf_counter()
+            try:
+                response = self.get_session().post(
+                    provider.url, headers=provider.headers(), json=provider.payload(payload),
+                    timeout=min(settings.LLM_TIMEOUT_SECONDS, remaining))
+                content = completion_content(response.status_code, response.headers, response.json)
+            except (RetryableResponse, requests.ConnectionError, requests.Timeout) as e:
+                provider.record_failure(e)
+                print(f"⚠️  {provider.name} LLM call failed (attempt {attempt + 1}): {e}")
+                delay = backoff_delay(attempt, getattr(e, "retry_after", None))
+                if not self._may_retry(provider, attempt, delay, deadline):
+                    return None
+                provider.retries += 1
+                time.sleep(delay)
+            except Exception as e:
+                # Client errors and malformed responses are not retried
+                provider.record_failure(e)
+                print(f"❌ {provider.name} LLM call failed: {e}")
+                return None
+            else:
+                provider.record_success((time.perf_counter() - start) * 1000)
+                return content
+        return None
+
+    def _may_retry(self, provider, attempt, delay, deadline):
+        """Retry the same provider unless out of attempts, budget or breaker allowance"""
+        return (attempt < settings.LLM_MAX_RETRIES
+                and delay <= settings.LLM_RETRY_MAX_SECONDS
+                and time.monotonic() + delay < deadline
+                and provider.breaker.allow())
+
+    # ------------------------------------------------------------------
+    # async
+    # ------------------------------------------------------------------
+
+    def get_async_client(self):
+        """Pooled httpx client for the async endpoints"""
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                ),
+            )
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    async def _acquire_async(self):
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        try:
+            await asyncio.wait_for(self._async_semaphore.acquire(), settings.LLM_TIMEOUT_SECONDS)
+            return True
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            print("⚠️  LLM concurrency limit reached - using fallback answer")
+            return False
+
+    async def acomplete(self, payload):
+        """Async version of complete"""
+        deadline = time.monotonic() + settings.LLM_TOTAL_TIMEOUT_SECONDS
+        if not await self._acquire_async():
+            return None
+        try:
+            for provider in self.candidates():
+                if not provider.breaker.allow():
+                    self.fast_failures += 1
+                    continue
+                content = await self._acall_with_retries(provider, payload, deadline)
+                if content is not None:
+                    self._served(provider)
+                    return content
+            return None
+        finally:
+            self._async_semaphore.release()
+
+    async def _acall_with_retries(self, provider, payload, deadline):
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            start = time.perf_counter()
+            try:
+                response = await self.get_async_client().post(
+                    provider.url, headers=provider.headers(), json=provider.payload(payload),
+                    timeout=min(settings.LLM_TIMEOUT_SECONDS, remaining))
+                content = completion_content(response.status_code, response.headers, response.json)
+            except (RetryableResponse, httpx.TransportError) as e:
+                provider.record_failure(e)
+                print(f"⚠️  {provider.name} LLM call failed (attempt {attempt + 1}): {e!r}")
+                delay = backoff_delay(attempt, getattr(e, "retry_after", None))
+                if not self._may_retry(provider, attempt, delay, deadline):
+                    return None
+                provider.retries += 1
+                await asyncio.sleep(delay)
+            except Exception as e:
+                provider.record_failure(e)
+                print(f"❌ {provider.name} LLM call failed: {e}")
+                return None
+            else:
+                provider.record_success((time.perf_counter() - start) * 1000)
+                return content
+        return None
+
+    async def stream_lines(self, payload):
+        """
+        Lines of a streaming (`stream: true`) completion
+        Fails over to the next provider only before the first line arrives - a
+        stream that breaks midway raises. Raises LLMUnavailable if no provider
+        could start a stream.
+        """
+        if not await self._acquire_async():
+            raise LLMUnavailable("LLM concurrency limit reached")
+        try:
+            for provider in self.candidates():
+                if not provider.breaker.allow():
+                    self.fast_failures += 1
+                    continue
+                started = False
+                try:
+                    async with self.get_async_client().stream(
+                            "POST", provider.url, headers=provider.headers(),
+                            json=provider.payload(dict(payload, stream=True))) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not started:
+                                # The provider is answering (the caller may stop reading
+                                # early). Stream durations depend on the answer length,
+                                # so no latency sample.
+                                started = True
+                                provider.record_success()
+                                self._served(provider)
+                            yield line
+                except httpx.HTTPError as e:
+                    provider.record_failure(e)
+                    print(f"⚠️  {provider.name} LLM stream failed: {e!r}")
+                    if started:
+                        raise
+                    continue
+                return
+            raise LLMUnavailable("No LLM provider available")
+        finally:
+            self._async_semaphore.release()
+
+
+# Global LLM client instance
+llm_client = LLMClient()
@@ -1,16 +1,38 @@
 # Main FastAPI application for Think41 E-commerce Chatbot
 # This file handles all API endpoints, conversation management, and data persistence
 
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from bson import ObjectId
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from app.models import User, Conversation, Message
-from app.database import get_database
+from app.database import get_database, close_client, get_pool_stats, ping
 from app.config import settings
 from app.chat_logic import chat_logic
-from app.data_loader import load_sample_data
+from app.async_database import get_async_database, close_async_client, get_async_pool_stats
+from app.async_chat_logic import async_chat_logic, StreamInterrupted
+from app.data_loader import load_sample_data, load_progress
+from app.data_sync import sync_datasets, start_periodic_sync
+from app.retention import retention, ensure_ttl_indexes
+from app.conversations import (
+    record_messages, list_conversations, backfill_summaries, fetch_message_page, encode_cursor,
+)
+from app.chat_store import chat_store, new_message_doc
+from app.context_cache import context_cache
+from app.serialization import FastJSONResponse, dumps
+from app.indexes import ensure_indexes, get_index_report
+from app.search import refresh_search_indexes
+from app.analytics import analytics
+from app.cache import query_cache
+from app.llm_cache import llm_response_cache
+from app.llm_client import llm_client
+from app.metrics import (
+    registry, Gauge, RequestTimer, track_request, stage, slow_requests, resident_memory_bytes,
+)
 from typing import List, Optional
 from datetime import datetime
+import asyncio
+import threading
+import time
 
 # Initialize FastAPI application
 app = FastAPI(title="Think41 E-commerce Chatbot API", version="1.0.0")
@@ -23,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,  # Allow cookies and authentication headers
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Before-Cursor", "X-After-Cursor", "X-Has-More"],  # Message page cursors
 )
 
 def fix_id(doc):
@@ -33,14 +56,201 @@ def fix_id(doc):
     doc["_id"] = str(doc["_id"])
     return doc
 
-# Get database connection - this will be used throughout the application
-db = get_database()
+# Process start time, reported by the liveness probe
+STARTED_AT = time.time()
 
-# Load sample data on application startup
-# This ensures the database has realistic e-commerce data for testing
+# Gauges sampled when /metrics is scraped
+registry.register(Gauge(
+    "mongo_pool_checked_out_connections", "MongoDB connections currently checked out",
+    lambda: [({"client": "sync"}, get_pool_stats()["checked_out"]),
+             ({"client": "async"}, get_async_pool_stats()["checked_out"])]))
+registry.register(Gauge(
+    "context_cache_conversations", "Conversations held in the context window cache",
+    lambda: [({}, len(context_cache))]))
+registry.register(Gauge(
+    "llm_breaker_open", "1 while the provider's circuit breaker is open",
+    lambda: [({"provider": p.name}, int(p.breaker.state == "open")) for p in llm_client.providers]))
+registry.register(Gauge(
+    "process_resident_memory_bytes", "Resident memory of this API process",
+    lambda: [({}, resident_memory_bytes())]))
+
+def seed_database():
+    """
+    Load sample data, ensure indexes and build the search indexes
+    Runs off the event loop - progress is tracked in load_progress
+    """
+    try:
+        if settings.STARTUP_SEED_MODE != "off":
+            load_sample_data()
+            if load_progress.phase == "failed":
+                return
+        load_progress.set_phase("indexing")
+        ensure_indexes()
+        ensure_ttl_indexes()
+        backfill_summaries()
+        refresh_search_indexes()
+        analytics.start()
+        load_progress.set_phase("ready")
+        if settings.DATA_SYNC_INTERVAL_SECONDS > 0:
+            start_periodic_sync(settings.DATA_SYNC_INTERVAL_SECONDS)
+    except Exception as e:
+        print(f"❌ Error seeding database: {e}")
+        load_progress.set_phase("failed", str(e))
+
+# Seed the database on application startup
+# This ensures the database has realistic e-commerce data for testing. By default
+# it runs in a background thread so the API accepts traffic immediately.
 @app.on_event("startup")
 async def startup_event():
-    load_sample_data()
+    if settings.STARTUP_SEED_MODE == "blocking":
+        await asyncio.to_thread(seed_database)
+    else:
+        threading.Thread(target=seed_database, name="seed-database", daemon=True).start()
+    retention.start()
+
+# Close the shared MongoDB client (and its connection pool) on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    retention.stop()
+    analytics.stop()
+    close_client()
+    await close_async_client()
+    await async_chat_logic.aclose()
+
+# ============================================================================
+# HEALTH ENDPOINTS
+# ============================================================================
+
+@app.get("/health/live")
+def liveness():
+    """
+    Liveness probe - the process is up and serving requests
+    Never touches MongoDB, so a slow database does not get the container restarted
+    """
+    return {"status": "alive", "uptime_seconds": round(time.time() - STARTED_AT, 1)}
+
+@app.get("/health/ready")
+def readiness(response: Response):
+    """
+    Readiness probe - MongoDB answers and no seeding run is in progress
+    Returns 503 while starting, with the seeding phase and per-collection progress
+    """
+    mongo_ok = ping()
+    ready = mongo_ok and not load_progress.in_progress
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "starting",
+        "mongo": mongo_ok,
+        "seeding": load_progress.snapshot(),
+    }
+
+# ============================================================================
+# OPERATIONS ENDPOINTS
+# ============================================================================
+
+@app.get("/admin/db/pool-stats")
+def db_pool_stats():
+    """
+    Get MongoDB connection pool statistics for this worker process
+    Used to size MONGO_MAX_POOL_SIZE (checked-out connections, checkout wait time)
+    """
+    return {"sync": get_pool_stats(), "async": get_async_pool_stats()}
+
+@app.get("/admin/indexes")
+def index_report():
+    """
+    Get index health: missing required indexes, unused indexes ($indexStats)
+    and the explain() plans of the hot chat queries (COLLSCAN = regression)
+    """
+    return get_index_report(get_database())
+
+@app.get("/admin/cache-stats")
+def cache_stats():
+    """
+    Get query cache statistics: backend, entry count, TTLs and
+    hit/miss/eviction/invalidation counters per collection
+    """
+    return query_cache.get_stats()
+
+@app.get("/admin/llm-cache-stats")
+def llm_cache_stats():
+    """
+    Get LLM response cache statistics: exact and near-duplicate hits, misses,
+    saved LLM calls and the LLM latency they saved
+    """
+    return llm_response_cache.get_stats()
+
+@app.get("/admin/analytics")
+def analytics_stats():
+    """
+    Get the columnar analytics snapshot state: rows per collection, approximate
+    memory, last refresh time/duration and full reloads
+    """
+    return analytics.get_stats()
+
+@app.post("/admin/cache/invalidate")
+def invalidate_cache(namespace: Optional[str] = None):
+    """
+    Drop cached query results for one collection (or all of them)
+    Call after changing catalog or user data outside of load_sample_data
+    """
+    return {"namespace": namespace, "invalidated": query_cache.invalidate(namespace)}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics: chat request and per-stage latency histograms by
+    intent, MongoDB command latency by command/collection, connection pool and
+    context cache gauges
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/slow-requests")
+def slow_request_log():
+    """Recent chat requests slower than SLOW_REQUEST_MS with their per-stage breakdown"""
+    return list(slow_requests)
+
+@app.get("/admin/llm")
+def llm_client_stats():
+    """
+    Get LLM provider health: circuit breaker state, calls, errors, retries and
+    average latency per provider, plus failovers and fast failures
+    """
+    return llm_client.get_stats()
+
+@app.get("/admin/chat-store")
+def chat_store_stats():
+    """
+    Get chat persistence settings: write mode, write concern, MongoDB round
+    trips per chat turn and context cache size and hit rate
+    """
+    return chat_store.get_stats()
+
+@app.get("/admin/retention")
+def retention_stats():
+    """
+    Get conversation retention settings and sweeper counters
+    """
+    return retention.get_stats()
+
+@app.post("/admin/retention/sweep")
+def retention_sweep():
+    """
+    Trim every user over the conversation limit now (instead of waiting for the sweeper)
+    """
+    return {"deleted_conversations": retention.sweep(get_database(), full=True)}
+
+@app.post("/admin/data/sync")
+def sync_data():
+    """
+    Apply changed dataset CSVs (upserts and deletes by primary key) and
+    invalidate the cached answers and search indexes built from them
+    """
+    results = sync_datasets(get_database())
+    if results is None:
+        raise HTTPException(status_code=409, detail="Dataset sync already running")
+    return {"synced": results}
 
 # ============================================================================
 # CONVERSATION MANAGEMENT ENDPOINTS
@@ -52,8 +262,8 @@ def create_conversation(conv: Conversation):
     Create a new conversation for chat history
     Each conversation represents a chat session between user and bot
     """
-    conv_dict = conv.dict(by_alias=True)
-    db.conversations.insert_one(conv_dict)
+    conv_dict = conv.model_dump(by_alias=True)
+    get_database().conversations.insert_one(conv_dict)
     return conv
 
 @app.get("/conversations/{conv_id}", response_model=Conversation)
@@ -62,45 +272,27 @@ def get_conversation(conv_id: str):
     Retrieve conversation details by conversation ID
     Used for loading chat history
     """
-    conv = db.conversations.find_one({"_id": conv_id})
+    conv = get_database().conversations.find_one({"_id": conv_id})
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    if settings.SKIP_RESPONSE_VALIDATION:
+        return FastJSONResponse(conv)
     return fix_id(conv)
 
 @app.get("/users/{user_id}/conversations", response_model=List[Conversation])
 def get_user_conversations(user_id: str):
     """
     Get all conversations for a specific user
-    Returns only the last 10 conversations (most recent first)
+    Returns only the last MAX_CONVERSATIONS_PER_USER conversations (most recent first)
     This prevents database bloat and improves performance
     """
-    # Get only the last 10 conversations, sorted by most recent first
-    convs = list(db.conversations.find({"user_id": user_id}).sort("updated_at", -1).limit(10))
-    
-    # For each conversation, get the first user message to use as title
-    # This makes the conversation history more readable
-    conversations_with_titles = []
-    for conv in convs:
-        # Get the first user message in this conversation
-        first_message = db.messages.find_one(
-            {"conversation_id": conv["_id"], "sender": "user"},
-            sort=[("timestamp", 1)]
-        )
-        
-        # Create conversation object with title
-        conv_with_title = fix_id(conv)
-        if first_message:
-            # Truncate the message if it's too long (like ChatGPT does)
-            title = first_message["content"]
-            if len(title) > 50:
-                title = title[:47] + "..."
-            conv_with_title["title"] = title
-        else:
-            conv_with_title["title"] = "New conversation"
-        
-        conversations_with_titles.append(conv_with_title)
-    
-    return conversations_with_titles
+    # Older conversations may still exist until the retention sweeper runs
+    # Title, last message and message count are stored on the conversation
+    # itself, so this is a single query on the user_id/updated_at index
+    convs = list_conversations(get_database(), user_id, settings.MAX_CONVERSATIONS_PER_USER)
+    if settings.SKIP_RESPONSE_VALIDATION:
+        return FastJSONResponse(convs)
+    return [fix_id(conv) for conv in convs]
 
 # ============================================================================
 # MESSAGE MANAGEMENT ENDPOINTS
@@ -112,18 +304,50 @@ def create_message(msg: Message):
     Create a new message in the database
     Used for storing individual chat messages
     """
-    msg_dict = msg.dict(by_alias=True)
+    db = get_database()
+    msg_dict = msg.model_dump(by_alias=True)
     db.messages.insert_one(msg_dict)
+    record_messages(db, msg.conversation_id, [msg_dict])
+    # Written outside a chat turn: re-read the context on the next turn
+    context_cache.discard(msg.conversation_id)
     return msg
 
-@app.get("/conversations/{conv_id}/messages", response_model=List[Message])
-def get_conversation_messages(conv_id: str):
+@app.get("/conversations/{conv_id}/messages")
+def get_conversation_messages(
+    conv_id: str,
+    response: Response,
+    limit: int = Query(settings.MESSAGES_PAGE_SIZE, ge=1, le=settings.MESSAGES_MAX_PAGE_SIZE),
+    before: Optional[str] = None,   # Cursor: page of messages older than this one
+    after: Optional[str] = None,    # Cursor: messages newer than this one (polling)
+    since: Optional[datetime] = None,  # Messages newer than this timestamp (polling)
+    fields: Optional[str] = None    # Comma-separated subset, e.g. "sender,content"
+):
     """
-    Get all messages for a specific conversation
-    Used for loading chat history when user clicks on a conversation
+    Get a page of messages for a specific conversation (chronological order)
+    Used for loading chat history when user clicks on a conversation.
+    Without a cursor the newest `limit` messages are returned. Cursors for the
+    next requests come back in the X-Before-Cursor / X-After-Cursor headers.
     """
-    msgs = list(db.messages.find({"conversation_id": conv_id}))
-    return [fix_id(m) for m in msgs]
+    if before and (after or since):
+        raise HTTPException(status_code=400, detail="Use either before or after/since, not both")
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        msgs, has_more = fetch_message_page(get_database(), conv_id, limit, before, after, since, selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    forward = bool(after or since)
+    if msgs:
+        if forward or has_more:
+            response.headers["X-Before-Cursor"] = encode_cursor(msgs[0])
+        response.headers["X-After-Cursor"] = encode_cursor(msgs[-1])
+    elif after:
+        # Nothing new yet - keep polling from the same position
+        response.headers["X-After-Cursor"] = after
+    response.headers["X-Has-More"] = "true" if has_more else "false"
+    # Encoded straight to JSON bytes: no per-message model validation or
+    # jsonable_encoder pass (message _ids are strings, timestamps datetimes)
+    return FastJSONResponse(msgs, headers=response.headers)
 
 # ============================================================================
 # MAIN CHAT API ENDPOINT
@@ -140,88 +364,173 @@ def chat(
     This is the core of the RAG system - it processes user input, queries the database,
     and generates contextual responses using the LLM
     """
-    now = datetime.utcnow()
-    
-    # ============================================================================
-    # CONVERSATION MANAGEMENT
-    # ============================================================================
-    
-    # If conversation_id is provided, use it; else, create new conversation
-    if conversation_id:
-        # Continue existing conversation
-        conv = db.conversations.find_one({"_id": conversation_id})
-        if not conv:
+    # Resolved per request: the shared client is replaced after a fork or close_client()
+    db = get_database()
+    # Every stage below is timed for /metrics and the slow-request log
+    with track_request("/api/chat"):
+        # ============================================================================
+        # CONVERSATION MANAGEMENT AND HISTORY
+        # ============================================================================
+        # chat_store resolves (or creates) the conversation and returns the recent
+        # history including this message. Depending on CHAT_WRITE_MODE the writes
+        # happen now or are batched into finish_turn; the history comes from the
+        # in-memory context cache (warmed from MongoDB on first use). A new
+        # conversation queues the user for the retention sweeper (only the last
+        # MAX_CONVERSATIONS_PER_USER are kept).
+        with stage("conversation"):
+            turn = chat_store.start_turn(db, user_id, message, conversation_id)
+        if turn is None:
             raise HTTPException(status_code=404, detail="Conversation not found")
-        # Update the conversation's last activity timestamp
-        db.conversations.update_one({"_id": conversation_id}, {"$set": {"updated_at": now}})
-    else:
-        # Create new conversation
-        conversation_id = str(ObjectId())
-        conv_doc = {
-            "_id": conversation_id,
-            "user_id": user_id,
-            "created_at": now,
-            "updated_at": now
-        }
-        db.conversations.insert_one(conv_doc)
         
         # ============================================================================
-        # CONVERSATION CLEANUP - Keep only last 10 conversations per user
+        # RAG SYSTEM - RETRIEVAL AND GENERATION
         # ============================================================================
-        # This prevents database bloat and improves performance
-        # Get all conversations for this user, sorted by updated_at descending
-        all_convs = list(db.conversations.find({"user_id": user_id}).sort("updated_at", -1))
-        if len(all_convs) > 10:
-            # Delete conversations beyond the 10th one
-            convs_to_delete = all_convs[10:]
-            for conv in convs_to_delete:
-                conv_id = conv["_id"]
-                # Delete the conversation and all its messages
-                db.conversations.delete_one({"_id": conv_id})
-                db.messages.delete_many({"conversation_id": str(conv_id)})
-    
-    # ============================================================================
-    # MESSAGE STORAGE
-    # ============================================================================
-    
-    # Insert user's message into database
-    user_msg_id = str(ObjectId())
-    user_msg_doc = {
-        "_id": user_msg_id,
-        "conversation_id": conversation_id,
-        "sender": "user",
-        "content": message,
-        "timestamp": now
-    }
-    db.messages.insert_one(user_msg_doc)
+        
+        # Use the enhanced chat logic with RAG
+        # This is where the magic happens - database query + LLM generation
+        try:
+            ai_response = chat_logic.generate_contextual_response(message, turn.history)
+        except Exception:
+            # Keep the user's message even though no reply was generated
+            chat_store.abort_turn(db, turn)
+            raise
+        
+        # ============================================================================
+        # MESSAGE STORAGE
+        # ============================================================================
+        
+        # Store the AI response (plus the user's message in batched modes) and
+        # update the conversation summary
+        ai_msg_doc = new_message_doc(turn.conversation_id, "ai", ai_response, datetime.utcnow())
+        with stage("persist"):
+            chat_store.finish_turn(db, turn, ai_msg_doc)
+        
+        # Return the complete response with conversation tracking
+        return FastJSONResponse({
+            "conversation_id": turn.conversation_id,
+            "user_message": turn.user_msg_doc,
+            "ai_message": ai_msg_doc
+        })
 
-    # ============================================================================
-    # RAG SYSTEM - RETRIEVAL AND GENERATION
-    # ============================================================================
-    
-    # Get conversation history for context (last 10 messages)
-    # This helps the LLM understand the conversation flow
-    history = list(db.messages.find({"conversation_id": conversation_id}).sort("timestamp", -1).limit(10))
-    history = list(reversed(history))  # Reverse to get chronological order
-    
-    # Use the enhanced chat logic with RAG
-    # This is where the magic happens - database query + LLM generation
-    ai_response = chat_logic.generate_contextual_response(message, history)
+# ============================================================================
+# ASYNC CHAT API ENDPOINTS
+# ============================================================================
+
+async def start_chat_turn_async(adb, user_id, message, conversation_id):
+    """
+    Conversation bookkeeping for one async chat turn (see chat_store.start_turn)
+    Raises 404 if conversation_id does not exist
+    """
+    turn = await chat_store.start_turn_async(adb, user_id, message, conversation_id)
+    if turn is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return turn
+
+@app.post("/api/chat/async")
+async def chat_async(
+    user_id: str = Body(...),
+    message: str = Body(...),
+    conversation_id: Optional[str] = Body(None)
+):
+    """
+    asyncio-native version of /api/chat
+    Same request/response contract, but all MongoDB and LLM I/O is awaited on the
+    event loop instead of blocking a threadpool worker
+    """
+    adb = get_async_database()
+    with track_request("/api/chat/async"):
+        with stage("conversation"):
+            turn = await start_chat_turn_async(adb, user_id, message, conversation_id)
+        
+        # Retrieval and generation
+        try:
+            ai_response = await async_chat_logic.generate_contextual_response(message, turn.history)
+        except Exception:
+            await chat_store.abort_turn_async(adb, turn)
+            raise
+        
+        ai_msg_doc = new_message_doc(turn.conversation_id, "ai", ai_response, datetime.utcnow())
+        with stage("persist"):
+            await chat_store.finish_turn_async(adb, turn, ai_msg_doc)
+        
+        return FastJSONResponse({
+            "conversation_id": turn.conversation_id,
+            "user_message": turn.user_msg_doc,
+            "ai_message": ai_msg_doc
+        })
+
+def sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    user_id: str = Body(...),
+    message: str = Body(...),
+    conversation_id: Optional[str] = Body(None)
+):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    Events: `start` (conversation_id, user_message), one `token` per LLM delta,
+    then `done` with the persisted ai_message and timings (time-to-first-token
+    and total latency, measured separately). The AI message is stored only
+    once the stream has completed. If the LLM fails mid-answer, the rule-based
+    answer is stored instead and sent in an `error` event (replacing the tokens).
+    """
+    adb = get_async_database()
+    # The request timer spans the handler and the stream (which runs after it returns)
+    timer = RequestTimer("/api/chat/stream")
+    try:
+        with timer.active(), stage("conversation"):
+            turn = await start_chat_turn_async(adb, user_id, message, conversation_id)
+    except Exception:
+        timer.finish("error")
+        raise
+    conversation_id = turn.conversation_id
     
-    # Insert AI response into database
-    ai_msg_id = str(ObjectId())
-    ai_msg_doc = {
-        "_id": ai_msg_id,
-        "conversation_id": conversation_id,
-        "sender": "ai",
-        "content": ai_response,
-        "timestamp": datetime.utcnow()
-    }
-    db.messages.insert_one(ai_msg_doc)
+    async def event_stream():
+        with timer.active():
+            start = time.perf_counter()
+            timings = {}
+            parts = []
+            interrupted = False
+            try:
+                try:
+                    yield sse_event("start", {"conversation_id": conversation_id, "user_message": turn.user_msg_doc})
+                    async for delta in async_chat_logic.stream_contextual_response(message, turn.history, timings):
+                        if not parts:
+                            timer.first_token()
+                            timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                        parts.append(delta)
+                        yield sse_event("token", {"content": delta})
+                    content = "".join(parts)
+                except StreamInterrupted as e:
+                    # Never store (or reuse as history) a truncated answer
+                    interrupted = True
+                    content = e.answer
+                except BaseException:
+                    # Failed or client disconnected before an answer: keep the user's message
+                    await chat_store.abort_turn_async(adb, turn)
+                    raise
+                
+                # Persist the complete AI message once the stream is finished
+                ai_msg_doc = new_message_doc(conversation_id, "ai", content, datetime.utcnow())
+                with stage("persist"):
+                    await chat_store.finish_turn_async(adb, turn, ai_msg_doc)
+            except BaseException:
+                timer.finish("error")
+                raise
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            if interrupted:
+                timer.finish("interrupted")
+                yield sse_event("error", {"conversation_id": conversation_id, "ai_message": ai_msg_doc, "timings": timings,
+                                          "detail": "The AI service failed mid-answer; ai_message holds the stored answer"})
+                return
+            timer.finish()
+            yield sse_event("done", {"conversation_id": conversation_id, "ai_message": ai_msg_doc, "timings": timings})
     
-    # Return the complete response with conversation tracking
-    return {
-        "conversation_id": conversation_id,
-        "user_message": user_msg_doc,
-        "ai_message": ai_msg_doc
-    }
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,321 @@
+# Chat pipeline metrics
+# Per-request stage timings (conversation bookkeeping, history reads, intent
+# routing, retrieval, LLM, persistence) tagged with the resolved intent, MongoDB
+# command timings from a pymongo CommandListener, and a slow-request log with
+# the per-stage breakdown. Rendered in the Prometheus text format by /metrics.
+#
+# Stage times are exclusive: a stage nested in another (history inside
+# conversation) is subtracted from its parent, so the stages of a request add
+# up to at most its total time.
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+from app.config import settings
+
+# Histogram buckets in seconds (1 ms .. 10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    type_name = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels.get(name, "")) for name in self.label_names)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram(Counter):
+    """Cumulative-bucket histogram with labels (values in seconds)"""
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        rows = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    rows.append((f"{self.name}_bucket", key + (("le", repr(bound)),), bucket_count))
+                rows.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+                rows.append((f"{self.name}_sum", key, round(total, 6)))
+                rows.append((f"{self.name}_count", key, count))
+        return rows
+
+
+class Gauge:
+    """Gauge whose samples come from a callback at scrape time"""
+    type_name = "gauge"
+
+    def __init__(self, name, help_text, collect):
+        self.name = name
+        self.help = help_text
+        self.collect = collect  # () -> [(labels dict, value)]
+
+    def samples(self):
+        try:
+            return [(self.name, tuple(labels.items()), value) for labels, value in self.collect()]
+        except Exception as e:
+            print(f"⚠️  Metric {self.name} unavailable: {e}")
+            return []
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+chat_requests = registry.register(Counter(
+    "chat_requests_total", "Chat requests by endpoint, resolved intent and outcome",
+    ("endpoint", "intent", "status")))
+chat_request_seconds = registry.register(Histogram(
+    "chat_request_duration_seconds", "End-to-end chat request latency",
+    ("endpoint", "intent")))
+chat_stage_seconds = registry.register(Histogram(
+    "chat_stage_duration_seconds", "Exclusive time per chat pipeline stage",
+    ("endpoint", "stage", "intent")))
+chat_first_token_seconds = registry.register(Histogram(
+    "chat_first_token_seconds", "Time from request start to the first streamed token",
+    ("endpoint", "intent")))
+chat_slow_requests = registry.register(Counter(
+    "chat_slow_requests_total", "Chat requests slower than SLOW_REQUEST_MS", ("endpoint",)))
+mongo_command_seconds = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency (from the command listener)",
+    ("command", "collection")))
+mongo_command_failures = registry.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("command", "collection")))
+
+
+def resident_memory_bytes():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+# ============================================================================
+# REQUEST TIMING
+# ============================================================================
+
+_current = contextvars.ContextVar("chat_request_timer", default=None)
+
+# Most recent slow requests with their stage breakdown (GET /admin/slow-requests)
+slow_requests = deque(maxlen=settings.SLOW_REQUEST_LOG_SIZE)
+
+
+class RequestTimer:
+    """Stage timings of one chat request"""
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.intent = "unknown"
+        self.stages = {}  # stage -> exclusive seconds
+        self.mongo_seconds = 0.0
+        self.mongo_commands = 0
+        self._stack = []  # [stage, time spent in nested stages]
+        self._start = time.perf_counter()
+        self._first_token = None
+        self._finished = False
+
+    @contextmanager
+    def active(self):
+        """Make this the current request's timer within the block"""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def stage(self, name):
+        frame = [name, 0.0]
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def first_token(self):
+        """Mark the first streamed token of the response (time-to-first-token)"""
+        if self._first_token is None:
+            self._first_token = time.perf_counter() - self._start
+
+    def add_mongo(self, seconds):
+        self.mongo_seconds += seconds
+        self.mongo_commands += 1
+
+    def finish(self, status="ok"):
+        """Record the request in the metrics (and the slow log if it was slow)"""
+        if self._finished:
+            return
+        self._finished = True
+        total = time.perf_counter() - self._start
+        chat_requests.inc(endpoint=self.endpoint, intent=self.intent, status=status)
+        chat_request_seconds.observe(total, endpoint=self.endpoint, intent=self.intent)
+        for name, seconds in self.stages.items():
+            chat_stage_seconds.observe(seconds, endpoint=self.endpoint, stage=name, intent=self.intent)
+        if self._first_token is not None:
+            chat_first_token_seconds.observe(self._first_token, endpoint=self.endpoint, intent=self.intent)
+
+        if settings.SLOW_REQUEST_MS and total * 1000 >= settings.SLOW_REQUEST_MS:
+            chat_slow_requests.inc(endpoint=self.endpoint)
+            entry = self.breakdown(total)
+            slow_requests.append(entry)
+            stages = " ".join(f"{name}={ms}ms" for name, ms in entry["stages_ms"].items())
+            print(f"🐢 Slow {self.endpoint} ({self.intent}): {entry['total_ms']}ms - {stages} "
+                  f"mongo={entry['mongo_ms']}ms/{self.mongo_commands} cmds")
+
+    def breakdown(self, total):
+        stages_ms = {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        stages_ms["other"] = round(max(0.0, total - sum(self.stages.values())) * 1000, 2)
+        return {
+            "at": time.time(),
+            "endpoint": self.endpoint,
+            "intent": self.intent,
+            "total_ms": round(total * 1000, 2),
+            "first_token_ms": round(self._first_token * 1000, 2) if self._first_token is not None else None,
+            "stages_ms": stages_ms,
+            "mongo_ms": round(self.mongo_seconds * 1000, 2),
+            "mongo_commands": self.mongo_commands,
+        }
+
+
+@contextmanager
+def track_request(endpoint):
+    """Time a chat request; stages recorded inside the block belong to it"""
+    timer = RequestTimer(endpoint)
+    with timer.active():
+        try:
+            yield timer
+        except Exception:
+            timer.finish("error")
+            raise
+    timer.finish()
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage of the current request (no-op outside a request)"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def set_intent(intent):
+    """Tag the current request with its resolved intent"""
+    timer = _current.get()
+    if timer is not None:
+        timer.intent = intent
+
+
+# ============================================================================
+# MONGODB COMMAND LISTENER
+# ============================================================================
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Times every MongoDB command and attributes it to the current chat request"""
+
+    def __init__(self):
+        self._collections = {}  # (connection_id, request_id) -> collection
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = (
+                target if isinstance(target, str) else "")
+
+    def _finished(self, event, failed):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_seconds.observe(seconds, command=event.command_name, collection=collection)
+        if failed:
+            mongo_command_failures.inc(command=event.command_name, collection=collection)
+        timer = _current.get()
+        if timer is not None:
+            timer.add_mongo(seconds)
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+
+command_listener = CommandMetricsListener()
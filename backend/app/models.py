@@ -14,6 +14,12 @@ class Conversation(BaseModel):
     user_id: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Denormalized summary, maintained on every message write
+    title: Optional[str] = None
+    last_message: Optional[str] = None
+    last_sender: Optional[str] = None
+    message_count: int = 0
+    last_activity: Optional[datetime] = None
 
 # Message schema
 class Message(BaseModel):
@@ -0,0 +1,182 @@
+# Conversation retention - keeps the newest MAX_CONVERSATIONS_PER_USER
+# conversations per user and deletes the rest (with their messages) in
+# batched $in deletes from a background sweeper, off the request path.
+# Optionally expires idle conversations and old messages with TTL indexes.
+
+import threading
+import time
+
+from pymongo.errors import OperationFailure
+
+from app.config import settings
+from app.context_cache import context_cache
+from app.database import get_database
+
+TTL_INDEXES = {
+    # collection: (field, index name)
+    "conversations": ("updated_at", "updated_at_ttl"),
+    "messages": ("timestamp", "timestamp_ttl"),
+}
+
+
+def batched(items, size):
+    """Split a list into lists of at most size items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ============================================================================
+# TTL INDEXES
+# ============================================================================
+
+def ensure_ttl_indexes(db=None, ttl_days=None):
+    """
+    Create, update or drop the TTL indexes to match CONVERSATION_TTL_DAYS
+    0 days disables expiry (existing TTL indexes are dropped)
+    """
+    db = db if db is not None else get_database()
+    ttl_days = settings.CONVERSATION_TTL_DAYS if ttl_days is None else ttl_days
+    expire_after = int(ttl_days * 86400)
+
+    for collection_name, (field, name) in TTL_INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = collection.index_information().get(name)
+            if not expire_after:
+                if existing:
+                    collection.drop_index(name)
+                    print(f"✅ Dropped TTL index {collection_name}.{name}")
+                continue
+            if existing is None:
+                collection.create_index(field, name=name, expireAfterSeconds=expire_after)
+            elif existing.get("expireAfterSeconds") != expire_after:
+                # collMod changes the expiry in place instead of rebuilding the index
+                db.command("collMod", collection_name,
+                           index={"name": name, "expireAfterSeconds": expire_after})
+            print(f"✅ TTL index {collection_name}.{name}: {ttl_days} days")
+        except OperationFailure as e:
+            print(f"❌ Error updating TTL index {collection_name}.{name}: {e}")
+
+
+# ============================================================================
+# SWEEPER
+# ============================================================================
+
+class RetentionSweeper:
+    """
+    Trims each user's conversations to the configured limit
+    The chat endpoints only mark the user; the sweeper thread does the deletes.
+    """
+    def __init__(self, max_conversations=None, batch_size=None):
+        self.max_conversations = max_conversations or settings.MAX_CONVERSATIONS_PER_USER
+        self.batch_size = batch_size or settings.RETENTION_DELETE_BATCH_SIZE
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.deleted_conversations = 0
+        self.deleted_messages = 0
+        self.last_sweep_at = None
+
+    def mark_user(self, user_id):
+        """Queue a user whose conversation count may now exceed the limit"""
+        with self._lock:
+            self._pending.add(user_id)
+
+    def excess_conversation_ids(self, db, user_id):
+        """IDs of the user's conversations beyond the newest max_conversations"""
+        cursor = (db.conversations.find({"user_id": user_id}, {"_id": 1})
+                  .sort("updated_at", -1)
+                  .skip(self.max_conversations))
+        return [conv["_id"] for conv in cursor]
+
+    def over_limit_users(self, db):
+        """Users holding more than max_conversations conversations"""
+        pipeline = [
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": self.max_conversations}}},
+        ]
+        return [row["_id"] for row in db.conversations.aggregate(pipeline)]
+
+    def delete_conversations(self, db, conversation_ids):
+        """Delete conversations and their messages in batched $in deletes"""
+        deleted = 0
+        for ids in batched(conversation_ids, self.batch_size):
+            deleted += db.conversations.delete_many({"_id": {"$in": ids}}).deleted_count
+            # Message conversation_id is always the string form of the conversation _id
+            message_ids = [str(conv_id) for conv_id in ids]
+            for conv_id in message_ids:
+                context_cache.discard(conv_id)
+            self.deleted_messages += db.messages.delete_many(
+                {"conversation_id": {"$in": message_ids}}).deleted_count
+        self.deleted_conversations += deleted
+        return deleted
+
+    def trim_users(self, db, user_ids):
+        """Apply the limit to the given users; returns the number of deleted conversations"""
+        excess = []
+        for user_id in user_ids:
+            excess.extend(self.excess_conversation_ids(db, user_id))
+        return self.delete_conversations(db, excess) if excess else 0
+
+    def sweep(self, db=None, full=False):
+        """
+        Trim the users marked since the last sweep (or every user when full=True)
+        """
+        db = db if db is not None else get_database()
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        try:
+            user_ids = self.over_limit_users(db) if full else list(pending)
+            deleted = self.trim_users(db, user_ids)
+        except Exception as e:
+            # Put the users back so the next sweep retries them
+            with self._lock:
+                self._pending.update(pending)
+            print(f"❌ Retention sweep failed: {e}")
+            return 0
+        self.last_sweep_at = time.time()
+        if deleted:
+            print(f"🧹 Retention sweep deleted {deleted} conversation(s)")
+        return deleted
+
+    def start(self, interval_seconds=None):
+        """Run a full sweep, then sweep marked users every interval_seconds"""
+        interval = interval_seconds or settings.RETENTION_SWEEP_INTERVAL_SECONDS
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+
+        def loop():
+            self.sweep(full=True)
+            while not self._stop.is_set():
+                self._wake.wait(interval)
+                self._wake.clear()
+                if not self._stop.is_set():
+                    self.sweep()
+
+        self._thread = threading.Thread(target=loop, name="retention-sweeper", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stop the sweeper thread (pending users are swept on the next start)"""
+        self._stop.set()
+        self._wake.set()
+
+    def get_stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "max_conversations_per_user": self.max_conversations,
+            "pending_users": pending,
+            "deleted_conversations": self.deleted_conversations,
+            "deleted_messages": self.deleted_messages,
+            "last_sweep_at": self.last_sweep_at,
+            "ttl_days": settings.CONVERSATION_TTL_DAYS,
+        }
+
+
+# Global retention sweeper instance
+retention = RetentionSweeper()
@@ -0,0 +1,282 @@
+# In-process search indexes for product and location lookups
+# Replaces the unanchored, case-insensitive $regex scans in chat_logic with an
+# inverted index (per-field postings + sorted vocabulary for prefix matching)
+# that is built once from MongoDB and rebuilt whenever the data is reloaded.
+
+import bisect
+import math
+import re
+import threading
+import time
+import numpy as np
+from app.database import get_database
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that never identify a product - skipped when searching
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "available", "do", "does", "for", "have", "i",
+    "in", "is", "me", "my", "of", "on", "or", "price", "show", "size", "stock",
+    "the", "to", "what", "with", "you", "your",
+}
+
+# Prefix matches count less than exact token matches
+PREFIX_MATCH_WEIGHT = 0.5
+
+# Score bonus for in-stock products - only decides between equally relevant results
+STOCK_TIE_BREAK = 1e-3
+
+
+def tokenize(text):
+    """Lowercase a string and split it into alphanumeric tokens"""
+    if not isinstance(text, str):
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def query_terms(keywords):
+    """Turn extracted keywords/phrases into distinct search terms (stopwords removed)"""
+    terms = []
+    for keyword in keywords:
+        for token in tokenize(keyword):
+            if token not in STOPWORDS and token not in terms:
+                terms.append(token)
+    return terms
+
+
+class InvertedIndex:
+    """
+    Weighted, field-aware inverted index with relevance ranking and prefix matching
+    Postings are stored per field so a search can be restricted to some fields
+    (e.g. category only) while sharing the same index. After finalize() each
+    posting list is a pair of numpy arrays, so scoring is vectorized.
+    """
+
+    def __init__(self, field_weights):
+        self.field_weights = field_weights
+        self.docs = []
+        self.postings = {field: {} for field in field_weights}
+        self.vocabulary = {field: [] for field in field_weights}
+        self.doc_boost = None
+
+    def add(self, doc):
+        """Index one document (a dict containing the indexed fields)"""
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        for field in self.field_weights:
+            for token in tokenize(doc.get(field)):
+                postings = self.postings[field].setdefault(token, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def finalize(self, doc_boost=None):
+        """
+        Freeze the index: posting lists become (doc ids, weighted tf * idf) arrays
+        and each field's vocabulary is sorted for prefix lookups.
+        doc_boost is an optional small per-document bonus used to break ties.
+        """
+        total_docs = len(self.docs) or 1
+        for field, postings in self.postings.items():
+            weight = self.field_weights[field]
+            for token, tf_by_doc in postings.items():
+                idf = math.log(1 + total_docs / len(tf_by_doc))
+                doc_ids = np.fromiter(tf_by_doc.keys(), dtype=np.int32, count=len(tf_by_doc))
+                tfs = np.fromiter(tf_by_doc.values(), dtype=np.float32, count=len(tf_by_doc))
+                postings[token] = (doc_ids, tfs * np.float32(weight * idf))
+            self.vocabulary[field] = sorted(postings)
+        if doc_boost is not None:
+            self.doc_boost = np.asarray(doc_boost, dtype=np.float32)
+
+    def _expand(self, field, term, prefix):
+        """Yield (token, weight) for the exact term and, optionally, tokens starting with it"""
+        if term in self.postings[field]:
+            yield term, 1.0
+        if prefix:
+            vocabulary = self.vocabulary[field]
+            i = bisect.bisect_right(vocabulary, term)
+            while i < len(vocabulary) and vocabulary[i].startswith(term):
+                yield vocabulary[i], PREFIX_MATCH_WEIGHT
+                i += 1
+
+    def score(self, terms, fields=None, prefix=True, match_all=False):
+        """
+        Score every document: sum of field weight * idf * term frequency per matching term
+        With match_all, documents missing any term score 0
+        """
+        fields = fields or list(self.field_weights)
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        matched_terms = np.zeros(len(self.docs), dtype=np.int16) if match_all else None
+        for term in terms:
+            term_scores = np.zeros(len(self.docs), dtype=np.float32) if match_all else scores
+            for field in fields:
+                for token, match_weight in self._expand(field, term, prefix):
+                    doc_ids, weighted_tfs = self.postings[field][token]
+                    # doc ids are unique within a posting list, so fancy-index += is safe
+                    term_scores[doc_ids] += weighted_tfs * np.float32(match_weight)
+            if match_all:
+                matched_terms += term_scores > 0
+                scores += term_scores
+        if match_all:
+            scores[matched_terms < len(terms)] = 0
+        return scores
+
+    def search(self, terms, k=5, fields=None, prefix=True, match_all=False):
+        """Return the top-k documents for the given terms, most relevant first"""
+        scores = self.score(terms, fields, prefix, match_all)
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        candidate_scores = scores[candidates]
+        if self.doc_boost is not None:
+            candidate_scores = candidate_scores + self.doc_boost[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            candidates, candidate_scores = candidates[top], candidate_scores[top]
+        order = np.argsort(-candidate_scores, kind="stable")
+        return [self.docs[doc_id] for doc_id in candidates[order]]
+
+
+class SearchIndexHolder:
+    """
+    Holds the current index and swaps in a rebuilt one atomically
+    Readers never see a half-built index; is_ready is False until the first build
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.index = None
+        self.built_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self):
+        return self.index is not None
+
+    def build(self, db):
+        raise NotImplementedError
+
+    def refresh(self, db=None):
+        """(Re)build the index from MongoDB - call after data is (re)loaded"""
+        db = db if db is not None else get_database()
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                index = self.build(db)
+            except Exception as e:
+                print(f"❌ Error building {self.name} search index: {e}")
+                return False
+            self.index = index
+            self.built_at = time.time()
+            print(f"✅ Built {self.name} search index: {len(index.docs)} docs in {time.perf_counter() - start:.2f}s")
+            return True
+
+    def invalidate(self):
+        """Drop the index - queries fall back to MongoDB until the next refresh"""
+        self.index = None
+        self.built_at = None
+
+
+class ProductSearchIndex(SearchIndexHolder):
+    """
+    Product search over name/brand/category/department with stock counts
+    Stock counts come from a single $group over inventory_items at build time,
+    so a search returns ranked products with availability without any round trip.
+    """
+
+    FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "category": 2.0, "department": 1.0}
+
+    def __init__(self):
+        super().__init__("product")
+
+    def build(self, db):
+        # Unsold items have a null/missing sold_at (NaN when loaded from CSV)
+        stock_counts = {
+            row["_id"]: row["in_stock"]
+            for row in db.inventory_items.aggregate([
+                {"$group": {
+                    "_id": "$product_id",
+                    "in_stock": {"$sum": {"$cond": [
+                        {"$in": [{"$type": "$sold_at"}, ["string", "date"]]}, 0, 1
+                    ]}},
+                }}
+            ])
+        }
+        projection = {"_id": 0, "id": 1, "name": 1, "brand": 1, "category": 1,
+                      "department": 1, "retail_price": 1, "sku": 1}
+        return self.build_from_documents(db.products.find({}, projection), stock_counts)
+
+    def build_from_documents(self, products, stock_counts):
+        """Build the index from product documents and a product_id -> units in stock map"""
+        index = InvertedIndex(self.FIELD_WEIGHTS)
+        for product in products:
+            product["stock"] = stock_counts.get(product.get("id"), 0)
+            index.add(product)
+        # Among equally relevant products, prefer the ones in stock
+        index.finalize(doc_boost=[STOCK_TIE_BREAK if doc["stock"] > 0 else 0.0 for doc in index.docs])
+        return index
+
+    def search_availability(self, keywords, k=5):
+        """Top-k products matching the keywords, in the availability answer format"""
+        terms = query_terms(keywords)
+        if not terms or not self.is_ready:
+            return []
+        results = self.index.search(terms, k=k)
+        return [{
+            "id": doc.get("id"),
+            "name": doc.get("name", "Unknown"),
+            "category": doc.get("category", "Unknown"),
+            "brand": doc.get("brand", "Unknown"),
+            "price": doc.get("retail_price", 0),
+            "available": doc.get("stock", 0) > 0,
+            "stock": doc.get("stock", 0),
+            "sku": doc.get("sku", ""),
+            "department": doc.get("department", ""),
+        } for doc in results]
+
+    def search_category(self, category, k=5):
+        """Top-k products whose category matches (products collection format)"""
+        terms = query_terms([category])
+        if not terms or not self.is_ready:
+            return []
+        return self.index.search(terms, k=k, fields=["category"])
+
+
+class UserLocationIndex(SearchIndexHolder):
+    """User lookup by city/state/country (only the fields used in answers are kept)"""
+
+    FIELD_WEIGHTS = {"city": 3.0, "state": 2.0, "country": 1.0}
+
+    def __init__(self):
+        super().__init__("user location")
+
+    def build(self, db):
+        index = InvertedIndex(self.FIELD_WEIGHTS)
+        projection = {"_id": 0, "id": 1, "first_name": 1, "last_name": 1,
+                      "city": 1, "state": 1, "country": 1}
+        for user in db.users.find({}, projection):
+            index.add(user)
+        index.finalize()
+        return index
+
+    def search_location(self, location, k=5):
+        """Top-k users whose city/state/country matches every word of the location"""
+        terms = query_terms([location])
+        if not terms or not self.is_ready:
+            return []
+        # "rio branco" must not match every city that merely contains "rio"
+        return self.index.search(terms, k=k, match_all=True)
+
+
+product_search = ProductSearchIndex()
+user_location_search = UserLocationIndex()
+
+
+def refresh_search_indexes(db=None):
+    """Rebuild all search indexes (startup and after every data load)"""
+    db = db if db is not None else get_database()
+    product_search.refresh(db)
+    user_location_search.refresh(db)
+    # Imported here: app.geo and app.vector_search build on SearchIndexHolder
+    from app.geo import distribution_centers
+    from app.vector_search import product_vectors
+    distribution_centers.refresh(db)
+    product_vectors.refresh(db)
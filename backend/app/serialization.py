@@ -0,0 +1,45 @@
+# Fast JSON responses
+# Encodes MongoDB documents straight to JSON bytes: ObjectId becomes its string
+# form and datetimes are written as ISO 8601, with no fix_id copy, no
+# jsonable_encoder walk and no Pydantic re-validation. Uses orjson when it is
+# installed and falls back to the standard json module otherwise.
+
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    """Encode types the JSON encoder does not handle natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """JSON bytes for documents containing ObjectIds and datetimes"""
+    if orjson is not None:
+        # Non-string keys (e.g. integer ids in stats dicts) are allowed like in json
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with dumps (skips FastAPI's jsonable_encoder)"""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
@@ -0,0 +1,245 @@
+# Dense product retrieval for free-text questions ("something warm for winter")
+# Products are embedded locally with a hashed embedding: every token of
+# name/brand/category/department maps to a fixed pseudo-random unit vector
+# (seeded by a hash of the token, so no model or vocabulary file is needed),
+# weighted by field and idf, summed and normalized. Queries are embedded the same
+# way after expanding everyday paraphrases into catalog words (PARAPHRASES). The
+# float32 matrix is written to VECTOR_INDEX_DIR as .npy and memory-mapped, so it
+# lives in the page cache rather than the Python heap and is shared by workers.
+
+import hashlib
+import json
+import math
+import os
+from array import array
+import numpy as np
+from app.config import settings
+from app.search import STOPWORDS, SearchIndexHolder, tokenize
+
+# Bumped whenever the embedding changes, so stale files are never reused
+EMBEDDING_VERSION = 1
+
+FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "category": 2.0, "department": 2.0}
+
+# Products embedded per vectorized step while building
+BUILD_BATCH_SIZE = 4096
+
+# Everyday words -> catalog words (thelook categories, departments and product names)
+PARAPHRASES = {
+    "warm": ["fleece", "wool", "thermal", "sweater", "sweaters", "outerwear", "coats", "parka"],
+    "winter": ["fleece", "wool", "thermal", "sweaters", "outerwear", "coats", "parka", "beanie", "scarf"],
+    "cold": ["fleece", "wool", "thermal", "outerwear", "coats", "parka", "beanie"],
+    "cozy": ["fleece", "sweater", "hoodie", "lounge", "cardigan"],
+    "summer": ["shorts", "swim", "tees", "lightweight"],
+    "beach": ["swim", "shorts"],
+    "rain": ["waterproof", "jacket", "outerwear"],
+    "rainy": ["waterproof", "jacket", "outerwear"],
+    "gym": ["active", "leggings", "shorts"],
+    "workout": ["active", "leggings", "shorts"],
+    "running": ["active", "shorts"],
+    "yoga": ["active", "leggings"],
+    "sleep": ["sleep", "lounge"],
+    "pajamas": ["sleep", "lounge"],
+    "office": ["blazers", "shirt", "pants"],
+    "work": ["blazers", "shirt", "pants"],
+    "formal": ["blazers", "dress", "shirt"],
+    "party": ["dress", "dresses"],
+    "wedding": ["dress", "dresses", "blazers"],
+    "gift": ["accessories", "scarf", "beanie"],
+    "present": ["accessories", "scarf", "beanie"],
+    "dad": ["men"], "father": ["men"], "husband": ["men"], "boyfriend": ["men"],
+    "brother": ["men"], "son": ["men"], "him": ["men"], "grandpa": ["men"],
+    "mom": ["women"], "mother": ["women"], "wife": ["women"], "girlfriend": ["women"],
+    "sister": ["women"], "daughter": ["women"], "her": ["women"], "grandma": ["women"],
+}
+
+
+def stem(token):
+    """Crude plural folding shared by products and queries ("sweaters" -> "sweater")"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def product_features(product):
+    """{feature: field-weighted count} for one product document"""
+    features = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(product.get(field)):
+            if len(token) > 1:
+                feature = stem(token)
+                features[feature] = features.get(feature, 0.0) + weight
+    return features
+
+
+def query_features(text):
+    """{feature: weight} for a free-text question, paraphrases expanded"""
+    features = {}
+    for token in tokenize(text):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        feature = stem(token)
+        features[feature] = features.get(feature, 0.0) + 1.0
+        # A paraphrase carries the weight of one word, shared by its catalog words
+        expansions = PARAPHRASES.get(token, ())
+        for expansion in expansions:
+            expansion = stem(expansion)
+            features[expansion] = features.get(expansion, 0.0) + 1.0 / math.sqrt(len(expansions))
+    return features
+
+
+def feature_vector(feature, dim):
+    """Fixed pseudo-random unit vector of a feature (same in every process)"""
+    seed = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class ProductFeatures:
+    """
+    Sparse product features in CSR layout: the features of product i are
+    feature_ids/weights[indptr[i]:indptr[i + 1]] (weights already idf-scaled)
+    """
+
+    def __init__(self, products):
+        self.vocabulary = {}
+        ids = array("q")
+        indptr = array("q", [0])
+        feature_ids = array("i")
+        weights = array("f")
+        for product in products:
+            product_id = product.get("id")
+            if not isinstance(product_id, int):
+                continue
+            for feature, weight in product_features(product).items():
+                feature_ids.append(self.vocabulary.setdefault(feature, len(self.vocabulary)))
+                weights.append(weight)
+            ids.append(product_id)
+            indptr.append(len(feature_ids))
+        self.ids = np.frombuffer(ids, dtype=np.int64)
+        self.indptr = np.frombuffer(indptr, dtype=np.int64)
+        self.feature_ids = np.frombuffer(feature_ids, dtype=np.int32)
+        # Features are distinct within a product, so counts are document frequencies
+        frequencies = np.bincount(self.feature_ids, minlength=len(self.vocabulary))
+        self.idf = np.log1p(len(self.ids) / np.maximum(frequencies, 1)).astype(np.float32)
+        self.weights = np.frombuffer(weights, dtype=np.float32) * self.idf[self.feature_ids]
+
+    def embed(self, path, dim):
+        """Write the (products x dim) unit-row float32 matrix to path as .npy"""
+        basis = np.stack([feature_vector(feature, dim) for feature in self.vocabulary]) \
+            if self.vocabulary else np.zeros((0, dim), dtype=np.float32)
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(self.ids), dim))
+        for start in range(0, len(self.ids), BUILD_BATCH_SIZE):
+            stop = min(start + BUILD_BATCH_SIZE, len(self.ids))
+            offsets = self.indptr[start:stop + 1]
+            rows = np.zeros((stop - start, dim), dtype=np.float32)
+            nonempty = np.flatnonzero(np.diff(offsets))
+            if len(nonempty):
+                first, last = offsets[0], offsets[-1]
+                contributions = basis[self.feature_ids[first:last]] * self.weights[first:last, None]
+                rows[nonempty] = np.add.reduceat(contributions, offsets[:-1][nonempty] - first, axis=0)
+            norms = np.linalg.norm(rows, axis=1, keepdims=True)
+            matrix[start:stop] = rows / np.maximum(norms, 1e-12)
+        matrix.flush()
+        del matrix
+
+
+class ProductVectors:
+    """Memory-mapped product embeddings with vectorized top-k cosine search"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "products.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != EMBEDDING_VERSION:
+            raise ValueError(f"vector index version {meta.get('version')} != {EMBEDDING_VERSION}")
+        self.dim = meta["dim"]
+        self.idf = meta["idf"]
+        self.matrix = np.load(os.path.join(directory, "products.f32.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, "products.ids.npy"))
+        # SearchIndexHolder.refresh reports len(docs); answers fetch products by id
+        self.docs = self.ids
+        self._basis = {}
+
+    def embed_query(self, text):
+        """Unit query vector, or None when no word of the question occurs in the catalog"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in query_features(text).items():
+            idf = self.idf.get(feature)
+            if idf is None:
+                continue
+            basis = self._basis.get(feature)
+            if basis is None:
+                basis = self._basis[feature] = feature_vector(feature, self.dim)
+            vector += basis * np.float32(weight * idf)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def top_k(self, queries, k):
+        """(positions, scores) of the k best rows per query row, best first"""
+        scores = np.asarray(queries, dtype=np.float32) @ self.matrix.T
+        k = min(k, scores.shape[1])
+        if not k:
+            empty = np.empty((len(scores), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def search(self, text, k=5, min_score=0.0):
+        """[(product id, cosine)] of the k products closest to the question"""
+        query = self.embed_query(text)
+        if query is None:
+            return []
+        positions, scores = self.top_k(query[None, :], k)
+        return [(int(self.ids[position]), float(score))
+                for position, score in zip(positions[0], scores[0]) if score >= min_score]
+
+
+def build_vectors(products, directory, dim):
+    """
+    Embed products into directory (products.f32.npy, products.ids.npy, products.json)
+    Files are written under temporary names and swapped in, so a process that
+    still maps the previous matrix keeps a consistent view
+    """
+    os.makedirs(directory, exist_ok=True)
+    features = ProductFeatures(products)
+    suffix = f".{os.getpid()}.tmp"
+    paths = {name: os.path.join(directory, name) for name in ("products.f32.npy", "products.ids.npy", "products.json")}
+    features.embed(paths["products.f32.npy"] + suffix, dim)
+    with open(paths["products.ids.npy"] + suffix, "wb") as f:
+        np.save(f, features.ids)
+    with open(paths["products.json"] + suffix, "w") as f:
+        json.dump({"version": EMBEDDING_VERSION, "dim": dim, "count": len(features.ids),
+                   "idf": {feature: round(float(features.idf[i]), 6) for feature, i in features.vocabulary.items()}}, f)
+    for path in paths.values():
+        os.replace(path + suffix, path)
+    return features
+
+
+class ProductVectorIndex(SearchIndexHolder):
+    """
+    Semantic product retrieval (hashed embeddings, memory-mapped float32 matrix)
+    Rebuilt from MongoDB like the other search indexes; the matrix file in
+    VECTOR_INDEX_DIR is replaced on every build.
+    """
+
+    def __init__(self):
+        super().__init__("product vector")
+
+    def build(self, db):
+        projection = {"_id": 0, "id": 1, "name": 1, "brand": 1, "category": 1, "department": 1}
+        build_vectors(db.products.find({}, projection).batch_size(BUILD_BATCH_SIZE),
+                      settings.VECTOR_INDEX_DIR, settings.VECTOR_DIM)
+        return ProductVectors(settings.VECTOR_INDEX_DIR)
+
+    def search(self, text, k=None, min_score=None):
+        """[(product id, cosine)] for a free-text question; [] until the index is built"""
+        index = self.index
+        if index is None:
+            return []
+        return index.search(text, k or settings.VECTOR_TOP_K,
+                            settings.VECTOR_MIN_SCORE if min_score is None else min_score)
+
+
+product_vectors = ProductVectorIndex()
@@ -0,0 +1,119 @@
+"""
+Analytics benchmark: columnar snapshot vs the equivalent $group aggregation
+
+Generates a thelook-shaped dataset (--inventory-rows), loads it into the scratch
+database ecommerce_bot_bench, builds the app.analytics snapshot and times each
+aggregate question both ways: AnalyticsSnapshot.run (NumPy, in memory) and
+app.aggregations.analytics_pipeline on MongoDB. Reports the snapshot build and
+incremental refresh time, its memory, median/best milliseconds per question and
+whether both answers agree.
+
+Without --mongo-uri an in-process mongomock server stands in; it does not
+implement $lookup sub-pipelines, so the questions that join products report an
+error on the $group side. Use a local mongod for the real comparison.
+
+Usage (from backend/):
+    python -m benchmarks.bench_analytics --mongo-uri mongodb://localhost:27017 --inventory-rows 1000000
+"""
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import harness
+from benchmarks.synthetic import write_thelook_datasets
+
+QUESTIONS = [
+    "top selling products this year",
+    "top 10 best sellers by revenue",
+    "top 5 products by revenue",
+    "revenue by category last 90 days",
+    "sales by brand",
+    "revenue by status",
+    "how many orders are still Processing",
+    "how many orders this month",
+    "average order value",
+    "total sales last week",
+]
+
+
+def time_ms(fn, repeat):
+    """(median, best) milliseconds over repeat calls, and the last result"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 3), round(min(timings), 3), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="local mongod (default: in-process mongomock)")
+    parser.add_argument("--inventory-rows", type=int, default=30_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--now", default="2023-09-01",
+                        help="date the relative periods are anchored to (synthetic data ends in 2023)")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    backend = harness.use_database(args.mongo_uri)
+    from app.aggregations import analytics_pipeline
+    from app.analytics import AnalyticsSnapshot, parse_question, result_from_pipeline
+    from app.data_loader import DATASETS, PROGRESS_COLLECTION, load_sample_data
+    from app.database import get_database
+
+    db = get_database()
+    directory = tempfile.mkdtemp(prefix="thelook-")
+    try:
+        counts = write_thelook_datasets(directory, args.inventory_rows, args.seed)
+        for spec in DATASETS:
+            db.drop_collection(spec["collection"])
+        db.drop_collection(PROGRESS_COLLECTION)
+        load_sample_data(restart=True, db=db, datasets_path=directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    snapshot = AnalyticsSnapshot()
+    start = time.perf_counter()
+    snapshot.refresh(db)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    snapshot.refresh(db)  # nothing new: the incremental path's fixed cost
+    refresh_seconds = time.perf_counter() - start
+
+    now = datetime.fromisoformat(args.now).replace(tzinfo=timezone.utc)
+    results = []
+    for message in QUESTIONS:
+        question = parse_question(message, now)
+        row = {"question": message}
+        row["snapshot_ms"], row["snapshot_best_ms"], answer = time_ms(lambda: snapshot.run(question), args.repeat)
+        answer.pop("data_through", None)
+        collection, pipeline = analytics_pipeline(question)
+        try:
+            row["group_ms"], row["group_best_ms"], rows = time_ms(
+                lambda: list(db[collection].aggregate(pipeline)), args.repeat)
+            row["speedup"] = round(row["group_ms"] / row["snapshot_ms"], 1) if row["snapshot_ms"] else None
+            row["same_answer"] = answer == result_from_pipeline(question, rows)
+        except Exception as e:
+            row["group_error"] = str(e)
+        results.append(row)
+
+    stats = snapshot.get_stats()
+    harness.emit("analytics", {
+        "config": {"backend": backend, "inventory_rows": args.inventory_rows, "dataset": counts,
+                   "repeat": args.repeat, "now": args.now},
+        "snapshot": {"build_seconds": round(build_seconds, 3),
+                     "incremental_refresh_seconds": round(refresh_seconds, 3),
+                     "rows": stats["rows"], "approx_mb": round(stats["approx_bytes"] / (1024 * 1024), 2)},
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
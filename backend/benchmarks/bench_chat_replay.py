@@ -0,0 +1,240 @@
+"""
+Chat replay load test: a realistic message mix through /api/chat, per intent
+
+Replays the weighted support message mix from benchmarks.synthetic as
+multi-turn conversations (--turns messages per conversation_id) and reports
+throughput and p50/p95/p99 latency overall and per intent, plus memory.
+
+In-process (default): generates a thelook-shaped dataset (--inventory-rows),
+loads it with load_sample_data into the scratch database ecommerce_bot_bench
+(a local mongod with --mongo-uri, otherwise an in-process mongomock server) and
+drives the app through FastAPI's TestClient. --fake-llm-port also starts
+benchmarks.fake_llm_server as the Groq endpoint. Memory per intent is the
+tracemalloc allocation peak of a request (--memory, measured in a separate pass
+so it does not skew the latencies).
+
+Remote (--base-url): sends the mix to a running backend with --concurrency
+clients; the ids in the messages assume it was seeded with a dataset of the same
+--inventory-rows. Memory is the server RSS from /metrics before and after.
+
+Usage (from backend/):
+    python -m benchmarks.bench_chat_replay --requests 2000 --memory --output results/replay.json
+    python -m benchmarks.bench_chat_replay --mongo-uri mongodb://localhost:27017 --inventory-rows 1000000
+    python -m benchmarks.bench_chat_replay --base-url http://localhost:8000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import harness
+from benchmarks.synthetic import make_chat_messages, scale_counts, write_thelook_datasets
+
+
+def conversations(mix, turns):
+    """Split the mix into conversations of `turns` messages: [(user_id, [(intent, message)])]"""
+    return [(f"bench-{i // turns}", mix[i:i + turns]) for i in range(0, len(mix), turns)]
+
+
+def summarize(samples, elapsed, errors):
+    """samples: [(intent, latency_ms)] -> overall and per-intent summaries"""
+    by_intent = defaultdict(list)
+    for intent, latency in samples:
+        by_intent[intent].append(latency)
+    # Per-intent throughput is per unit of request time: how many requests of
+    # that intent one worker could serve per second
+    return {
+        "overall": harness.latency_summary([latency for _, latency in samples], elapsed,
+                                           sum(errors.values())),
+        "intents": {
+            intent: harness.latency_summary(latencies, sum(latencies) / 1000,
+                                            errors.get(intent, 0))
+            for intent, latencies in sorted(by_intent.items())
+        },
+    }
+
+
+# ============================================================================
+# IN-PROCESS
+# ============================================================================
+
+def replay_in_process(client, sessions):
+    samples = []
+    errors = defaultdict(int)
+    start = time.perf_counter()
+    for user_id, turns in sessions:
+        conversation_id = None
+        for intent, message in turns:
+            began = time.perf_counter()
+            response = client.post("/api/chat", json={
+                "user_id": user_id, "message": message, "conversation_id": conversation_id})
+            latency = (time.perf_counter() - began) * 1000
+            if response.status_code != 200:
+                errors[intent] += 1
+                continue
+            conversation_id = response.json()["conversation_id"]
+            samples.append((intent, latency))
+    return samples, time.perf_counter() - start, errors
+
+
+def memory_per_intent(client, mix, per_intent):
+    """Mean and max tracemalloc peak (KiB) of single requests, per intent"""
+    by_intent = defaultdict(list)
+    for intent, message in mix:
+        if len(by_intent[intent]) < per_intent:
+            by_intent[intent].append(message)
+
+    tracemalloc.start()
+    report = {}
+    try:
+        for intent, messages in sorted(by_intent.items()):
+            peaks = []
+            for message in messages:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                client.post("/api/chat", json={"user_id": "bench-memory", "message": message})
+                peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+            report[intent] = {"requests": len(peaks),
+                              "mean_peak_kib": round(sum(peaks) / len(peaks), 1),
+                              "max_peak_kib": round(max(peaks), 1)}
+    finally:
+        tracemalloc.stop()
+    return report
+
+
+def run_in_process(args, mix):
+    backend = harness.use_database(args.mongo_uri)
+    fake_llm = harness.start_fake_llm(args.fake_llm_port) if args.fake_llm_port else None
+
+    # Imported only now: the app creates its MongoDB and LLM clients at import time
+    from fastapi.testclient import TestClient
+    from app.context_cache import context_cache
+    from app.data_loader import DATASETS, PROGRESS_COLLECTION, load_sample_data
+    from app.database import get_database
+    from app.main import app
+    from app.search import refresh_search_indexes
+
+    directory = args.datasets_dir or tempfile.mkdtemp(prefix="thelook-")
+    try:
+        counts = write_thelook_datasets(directory, args.inventory_rows, args.seed)
+        db = get_database()
+        for spec in DATASETS:
+            db.drop_collection(spec["collection"])
+        for name in (PROGRESS_COLLECTION, "conversations", "messages"):
+            db.drop_collection(name)
+
+        start = time.perf_counter()
+        load_sample_data(restart=True, db=db, datasets_path=directory)
+        load_seconds = time.perf_counter() - start
+        try:
+            refresh_search_indexes(db)
+        except Exception as e:
+            print(f"⚠️  Search indexes not built ({e}); availability uses the query fallback")
+        context_cache.clear()
+
+        # No `with`: the startup hook would seed app's default datasets
+        client = TestClient(app)
+        rss_before = harness.rss_mb()
+        samples, elapsed, errors = replay_in_process(client, conversations(mix, args.turns))
+        results = summarize(samples, elapsed, errors)
+        results["memory"] = {"rss_before_mb": rss_before, "rss_after_mb": harness.rss_mb()}
+        if args.memory:
+            results["memory"]["intents"] = memory_per_intent(client, mix, args.memory_samples)
+    finally:
+        if fake_llm is not None:
+            fake_llm.terminate()
+        if not args.datasets_dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {"backend": backend, "dataset": counts, "load_seconds": round(load_seconds, 2)}, results
+
+
+# ============================================================================
+# REMOTE
+# ============================================================================
+
+RSS_SAMPLE = re.compile(r"^process_resident_memory_bytes (\S+)$", re.MULTILINE)
+
+
+async def server_rss_mb(client):
+    try:
+        match = RSS_SAMPLE.search((await client.get("/metrics")).text)
+        return round(float(match.group(1)) / (1024 * 1024), 1) if match else None
+    except Exception:
+        return None
+
+
+async def replay_remote(args, mix):
+    sessions = conversations(mix, args.turns)
+    samples = []
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        async def session(user_id, turns):
+            # Turns of one conversation are sequential; conversations run concurrently
+            async with semaphore:
+                conversation_id = None
+                for intent, message in turns:
+                    began = time.perf_counter()
+                    try:
+                        response = await client.post("/api/chat", json={
+                            "user_id": user_id, "message": message,
+                            "conversation_id": conversation_id})
+                        response.raise_for_status()
+                    except Exception:
+                        errors[intent] += 1
+                        continue
+                    samples.append((intent, (time.perf_counter() - began) * 1000))
+                    conversation_id = response.json()["conversation_id"]
+
+        rss_before = await server_rss_mb(client)
+        start = time.perf_counter()
+        await asyncio.gather(*(session(user_id, turns) for user_id, turns in sessions))
+        elapsed = time.perf_counter() - start
+        rss_after = await server_rss_mb(client)
+
+    results = summarize(samples, elapsed, errors)
+    results["memory"] = {"server_rss_before_mb": rss_before, "server_rss_after_mb": rss_after}
+    return {"backend": args.base_url, "concurrency": args.concurrency}, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="replay against a running backend instead of in-process")
+    parser.add_argument("--mongo-uri", help="local mongod for the in-process run (default: mongomock)")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=4, help="messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent conversations (--base-url)")
+    parser.add_argument("--inventory-rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--datasets-dir", help="write the generated CSVs here instead of a temp dir")
+    parser.add_argument("--fake-llm-port", type=int, help="start the fake Groq server on this port")
+    parser.add_argument("--memory", action="store_true", help="measure the allocation peak per intent")
+    parser.add_argument("--memory-samples", type=int, default=20, help="requests per intent for --memory")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    mix = make_chat_messages(args.requests, scale_counts(args.inventory_rows), args.seed)
+    if args.base_url:
+        setup, results = asyncio.run(replay_remote(args, mix))
+    else:
+        setup, results = run_in_process(args, mix)
+
+    harness.emit("chat_replay", {
+        "config": {**setup, "requests": args.requests, "turns": args.turns,
+                   "inventory_rows": args.inventory_rows, "seed": args.seed},
+        **results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Load benchmark: sync /api/chat vs async /api/chat/async
+
+Fires the same message mix at both endpoints of a running backend with a fixed
+number of concurrent clients and reports throughput and latency percentiles.
+
+Usage (from backend/, with the API and MongoDB running):
+    python -m benchmarks.bench_chat_throughput --base-url http://localhost:8000 --requests 500 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+# Realistic message mix covering every intent in generate_contextual_response
+MESSAGES = [
+    "What is the status of order 1626?",
+    "user 24731",
+    "what products you have under socks category?",
+    "any user from Rio Branco",
+    "product 14235",
+    "satin headband price",
+    "what is your return policy?",
+    "hello",
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_endpoint(base_url, path, total_requests, concurrency):
+    """Send total_requests chat messages to path with the given concurrency"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def one(i):
+            nonlocal errors
+            payload = {"user_id": f"bench-{i % concurrency}", "message": MESSAGES[i % len(MESSAGES)]}
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=payload)
+                    response.raise_for_status()
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": path,
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    results = []
+    for path in ("/api/chat", "/api/chat/async"):
+        result = await run_endpoint(args.base_url, path, args.requests, args.concurrency)
+        results.append(result)
+        print(f"{path:<18} {result['throughput_rps']:>8} req/s  p50={result['p50_ms']}ms  "
+              f"p95={result['p95_ms']}ms  p99={result['p99_ms']}ms  errors={result['errors']}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Conversation listing benchmark: denormalized summaries vs per-conversation title lookups
+
+Seeds one user with --conversations conversations, then for each messages-per-
+conversation size times GET /users/{id}/conversations as it used to work (one
+messages.find_one per conversation for the title) against the single query on
+the stored summaries (app.conversations.list_conversations).
+
+Needs a MongoDB server; the database is dropped afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.bench_conversation_listing --mongo-uri mongodb://localhost:27017
+    python -m benchmarks.bench_conversation_listing --sizes 1 10 100 1000 5000 --repeat 300
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from app.conversations import backfill_summaries, list_conversations
+from app.indexes import ensure_indexes
+from benchmarks.bench_chat_throughput import percentile
+
+USER_ID = "bench-user"
+
+
+def seed(db, conversations, messages_per_conversation):
+    """One user with `conversations` conversations of alternating user/ai messages"""
+    db.conversations.delete_many({})
+    db.messages.delete_many({})
+    start = datetime(2024, 1, 1)
+    db.conversations.insert_many([
+        {"_id": f"conv-{c}", "user_id": USER_ID, "created_at": start,
+         "updated_at": start + timedelta(hours=c)}
+        for c in range(conversations)
+    ])
+    for c in range(conversations):
+        db.messages.insert_many([
+            {"conversation_id": f"conv-{c}", "sender": "user" if m % 2 == 0 else "ai",
+             "content": f"message {m} of conversation {c}", "timestamp": start + timedelta(seconds=m)}
+            for m in range(messages_per_conversation)
+        ], ordered=False)
+    backfill_summaries(db, force=True)
+
+
+def legacy_listing(db, limit):
+    """The previous implementation: one messages lookup per listed conversation"""
+    convs = list(db.conversations.find({"user_id": USER_ID}).sort("updated_at", -1).limit(limit))
+    for conv in convs:
+        first_message = db.messages.find_one(
+            {"conversation_id": conv["_id"], "sender": "user"}, sort=[("timestamp", 1)])
+        title = first_message["content"] if first_message else "New conversation"
+        conv["title"] = title[:47] + "..." if len(title) > 50 else title
+    return convs
+
+
+def time_listing(fn, repeat):
+    """Latency stats (ms) over `repeat` calls"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="conversation_listing_bench")
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.database]
+    ensure_indexes(db)
+
+    results = []
+    try:
+        for size in args.sizes:
+            seed(db, args.conversations, size)
+            results.append({
+                "messages_per_conversation": size,
+                "legacy_n_plus_1": time_listing(lambda: legacy_listing(db, args.conversations), args.repeat),
+                "summaries": time_listing(
+                    lambda: list_conversations(db, USER_ID, args.conversations), args.repeat),
+            })
+    finally:
+        db.client.drop_database(args.database)
+
+    print(json.dumps({"conversations": args.conversations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+load_sample_data micro-benchmark
+
+Generates thelook-shaped CSVs at each --inventory-rows scale (other collections
+scaled in thelook proportions, see benchmarks.synthetic.SCALE_RATIOS) and loads
+them with app.data_loader.load_sample_data for every batch size / worker count
+combination. Reports total and per-collection rows/sec, wall time and memory
+(process RSS, plus the Python allocation peak with --trace-memory).
+
+The datasets go into the scratch database ecommerce_bot_bench, whose collections
+are dropped before every load. Without --mongo-uri an in-process mongomock
+server stands in (fine up to ~100k rows; use a local mongod for larger scales).
+
+Usage (from backend/):
+    python -m benchmarks.bench_data_loader
+    python -m benchmarks.bench_data_loader --mongo-uri mongodb://localhost:27017 \\
+        --inventory-rows 10000 1000000 10000000 --batch-sizes 5000 20000 --workers 1 4
+"""
+
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import harness
+from benchmarks.synthetic import write_thelook_datasets
+
+
+def prepare_datasets(directory, inventory_rows, seed):
+    """Generate the CSVs unless directory already holds this scale"""
+    marker = os.path.join(directory, f".rows-{inventory_rows}-seed-{seed}")
+    if os.path.exists(marker):
+        return None
+    start = time.perf_counter()
+    counts = write_thelook_datasets(directory, inventory_rows, seed)
+    open(marker, "w").close()
+    return {"counts": counts, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def load_once(db, directory, batch_size, workers, trace_memory):
+    from app.data_loader import DATASETS, PROGRESS_COLLECTION, load_sample_data
+
+    for spec in DATASETS:
+        db.drop_collection(spec["collection"])
+    db.drop_collection(PROGRESS_COLLECTION)
+
+    if trace_memory:
+        tracemalloc.start()
+    rss_before = harness.rss_mb()
+    start = time.perf_counter()
+    results = load_sample_data(batch_size, workers, restart=True, db=db, datasets_path=directory)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    rows = sum(result["rows"] for result in results)
+    return {
+        "batch_size": batch_size,
+        "workers": workers,
+        "rows": rows,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(rows / elapsed) if elapsed else rows,
+        "rss_before_mb": rss_before,
+        "rss_after_mb": harness.rss_mb(),
+        "python_peak_mb": round(peak / (1024 * 1024), 1) if peak is not None else None,
+        "collections": {result["collection"]: result["rows_per_sec"] for result in results},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", help="local mongod to load into (default: in-process mongomock)")
+    parser.add_argument("--inventory-rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[5000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--datasets-dir", help="keep generated CSVs here (reused across runs)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report the tracemalloc peak (slows the load down)")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    backend = harness.use_database(args.mongo_uri)
+    from app.database import get_database
+    db = get_database()
+
+    root = args.datasets_dir or tempfile.mkdtemp(prefix="thelook-")
+    scales = []
+    try:
+        for inventory_rows in args.inventory_rows:
+            directory = os.path.join(root, str(inventory_rows))
+            generated = prepare_datasets(directory, inventory_rows, args.seed)
+            runs = [load_once(db, directory, batch_size, workers, args.trace_memory)
+                    for batch_size, workers in itertools.product(args.batch_sizes, args.workers)]
+            scales.append({"inventory_rows": inventory_rows, "generated": generated, "loads": runs})
+    finally:
+        if not args.datasets_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    harness.emit("data_loader", {
+        "config": {"backend": backend, "seed": args.seed, "batch_sizes": args.batch_sizes,
+                   "workers": args.workers},
+        "results": scales,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Entity extraction micro-benchmark
+
+Times EcommerceChatLogic.extract_order_info, extract_product_info and
+extract_user_info (plus route_message, which the chat path actually uses) over
+the synthetic support message mix, overall and per intent. No database access.
+
+Usage (from backend/):
+    python -m benchmarks.bench_extract
+    python -m benchmarks.bench_extract --messages 5000 --repeat 5 --output results/extract.json
+"""
+
+import argparse
+import time
+from collections import defaultdict
+
+from app.chat_logic import EcommerceChatLogic
+from app.intent_router import route_message
+
+from benchmarks.harness import emit
+from benchmarks.synthetic import make_chat_messages
+
+
+def best_seconds(fn, messages, repeat):
+    """Best-of-repeat time to run fn over every message"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(message_count=2000, repeat=5, seed=7):
+    logic = EcommerceChatLogic()
+    functions = {
+        "extract_order_info": logic.extract_order_info,
+        "extract_product_info": logic.extract_product_info,
+        "extract_user_info": logic.extract_user_info,
+        "route_message": route_message,
+    }
+    mix = make_chat_messages(message_count, seed=seed)
+    by_intent = defaultdict(list)
+    for intent, message in mix:
+        by_intent[intent].append(message)
+    messages = [message for _, message in mix]
+
+    results = {}
+    for name, fn in functions.items():
+        seconds = best_seconds(fn, messages, repeat)
+        results[name] = {
+            "messages_per_sec": round(len(messages) / seconds),
+            "mean_us": round(seconds / len(messages) * 1e6, 3),
+            "intents_mean_us": {
+                intent: round(best_seconds(fn, group, repeat) / len(group) * 1e6, 3)
+                for intent, group in sorted(by_intent.items())
+            },
+        }
+    return {"config": {"messages": message_count, "repeat": repeat, "seed": seed},
+            "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    emit("extract", run(args.messages, args.repeat, args.seed), args.output)
+
+
+if __name__ == "__main__":
+    main()
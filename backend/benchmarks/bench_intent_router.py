@@ -0,0 +1,88 @@
+"""
+Intent routing micro-benchmark
+
+Classifies a corpus of realistic support messages with app.intent_router and
+reports messages/sec per intent, next to the previous if-chain classifier
+(uncompiled re.search calls and repeated keyword scans) as a baseline.
+No database access - routing only.
+
+Usage (from backend/):
+    python -m benchmarks.bench_intent_router --repeat 2000
+"""
+
+import argparse
+import json
+import re
+import time
+from app.intent_router import route_message
+
+CORPUS = {
+    "order": ["What is the status of order 1626?", "where is my order #88213", "order number 4521 status please"],
+    "user": ["user 24731", "can you look up user id 553", "show me details for user #12"],
+    "category": ["what products you have under socks category?", "show accessories", "list the socks"],
+    "location": ["any user from Rio Branco", "users by location please"],
+    "product": ["product 14235", "tell me about product id 9921"],
+    "availability": ["satin headband price", "is the denim jacket available in size M?", 'do you sell "wool beanie"'],
+    "policy": ["what is your return policy?", "how do I get a refund"],
+    "user_orders": ["customer id 457 product details"],
+    "help": ["hello", "thanks"],
+}
+
+
+def legacy_classify(message):
+    """The branch chain generate_contextual_response used before the router (classification only)"""
+    message_lower = message.lower()
+    if re.search(r'order\s+(?:id\s+)?(?:#?)?(\d+)', message_lower):
+        return "order"
+    if re.search(r'user\s+(?:id\s+)?(\d+)', message_lower):
+        return "user"
+    if 'category' in message_lower or 'socks' in message_lower or 'accessories' in message_lower:
+        return "category"
+    if 'rio branco' in message_lower or 'location' in message_lower:
+        return "location"
+    if re.search(r'product\s+(?:id\s+)?(\d+)', message_lower):
+        return "product"
+    keywords = [k for k in ['jacket', 'shirt', 'pants', 'dress', 'shoes', 'denim', 'headband',
+                            'size', 'color', 'available', 'in stock', 'satin'] if k in message.lower()]
+    if not keywords:
+        for pattern in (r'"([^"]+)"', r'\(([^)]+)\)', r'(\w+(?:\s+\w+){1,3})'):
+            keywords += [m.lower() for m in re.findall(pattern, message) if len(m) > 3]
+    if keywords:
+        return "availability"
+    if any(k in message_lower for k in ['return', 'refund', 'policy']):
+        return "policy"
+    return "help"
+
+
+def messages_per_second(classify, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            classify(message)
+    elapsed = time.perf_counter() - start
+    return round(repeat * len(messages) / elapsed, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    for intent, messages in CORPUS.items():
+        misrouted = [m for m in messages if route_message(m).intent != intent]
+        results[intent] = {
+            "router_msgs_per_s": messages_per_second(route_message, messages, args.repeat),
+            "legacy_msgs_per_s": messages_per_second(legacy_classify, messages, args.repeat),
+            "misrouted": misrouted,
+        }
+    all_messages = [m for messages in CORPUS.values() for m in messages]
+    results["all"] = {
+        "router_msgs_per_s": messages_per_second(route_message, all_messages, args.repeat),
+        "legacy_msgs_per_s": messages_per_second(legacy_classify, all_messages, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Nearest distribution center micro-benchmark
+
+Assigns every user of a synthetic population (--users, uniformly spread over
+land-ish latitudes) its nearest of the thelook distribution centers two ways:
+app.geo.nearest_centers (one vectorized pass, as DistributionCenterIndex.build
+does) and a per-user Python haversine loop over the centers (timed on a sample and
+extrapolated). Also reports the per-message lookup cost of
+DistributionCenterIndex.for_user on the precomputed arrays, their memory, and
+whether both assignments agree. No database access.
+
+Usage (from backend/):
+    python -m benchmarks.bench_nearest_center
+    python -m benchmarks.bench_nearest_center --users 100000 1000000 --output results/nearest_center.json
+"""
+
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from app.geo import EARTH_RADIUS_KM, DistributionCenterIndex, NearestCenters, nearest_centers
+from benchmarks.harness import emit
+from benchmarks.synthetic import DISTRIBUTION_CENTERS
+
+
+def haversine_loop(latitude, longitude, centers):
+    """Nearest center position and distance for one point, in plain Python"""
+    best, best_km = -1, float("inf")
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    for position, (_, _, center_latitude, center_longitude) in enumerate(centers):
+        lat2, lon2 = math.radians(center_latitude), math.radians(center_longitude)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+        if km < best_km:
+            best, best_km = position, km
+    return best, best_km
+
+
+def run_scale(users, sample, lookups, seed):
+    rng = np.random.default_rng(seed)
+    latitudes = rng.uniform(-55, 70, users)
+    longitudes = rng.uniform(-180, 180, users)
+    center_latitudes = [center[2] for center in DISTRIBUTION_CENTERS]
+    center_longitudes = [center[3] for center in DISTRIBUTION_CENTERS]
+
+    start = time.perf_counter()
+    positions, distances = nearest_centers(latitudes, longitudes, center_latitudes, center_longitudes)
+    vectorized = time.perf_counter() - start
+
+    sample = min(sample, users)
+    start = time.perf_counter()
+    loop = [haversine_loop(latitudes[i], longitudes[i], DISTRIBUTION_CENTERS) for i in range(sample)]
+    loop_seconds = (time.perf_counter() - start) * users / sample
+    agree = sum(position == positions[i] for i, (position, _) in enumerate(loop)) / sample
+
+    index = DistributionCenterIndex()
+    centers = [{"id": c[0], "name": c[1], "latitude": c[2], "longitude": c[3]} for c in DISTRIBUTION_CENTERS]
+    user_ids = np.arange(1, users + 1, dtype=np.int64)
+    index.index = NearestCenters(centers, user_ids, positions, distances,
+                                 np.full(users, -1, dtype=np.int32), {})
+    probe_rng = random.Random(seed)
+    probe = [probe_rng.randint(1, users) for _ in range(lookups)]
+    start = time.perf_counter()
+    for user_id in probe:
+        index.for_user(user_id)
+    lookup_us = (time.perf_counter() - start) / lookups * 1e6
+
+    arrays = index.index.user_positions.nbytes + index.index.user_distances.nbytes + index.index.user_cities.nbytes
+    return {
+        "users": users,
+        "vectorized_seconds": round(vectorized, 4),
+        "python_loop_seconds": round(loop_seconds, 2),
+        "speedup": round(loop_seconds / vectorized, 1) if vectorized else None,
+        "users_per_sec": round(users / vectorized) if vectorized else None,
+        "lookup_us": round(lookup_us, 3),
+        "arrays_mb": round(arrays / (1024 * 1024), 2),
+        "same_assignment": round(agree, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--sample", type=int, default=20_000, help="users timed with the Python loop")
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    emit("nearest_center", {
+        "config": {"centers": len(DISTRIBUTION_CENTERS), "sample": args.sample,
+                   "lookups": args.lookups, "seed": args.seed},
+        "results": [run_scale(users, args.sample, args.lookups, args.seed) for users in args.users],
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
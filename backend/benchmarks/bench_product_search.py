@@ -0,0 +1,97 @@
+"""
+Product search benchmark: in-process inverted index vs the $regex path
+
+Compares app.search.ProductSearchIndex against the unanchored, case-insensitive
+$regex query built by EcommerceChatLogic.build_product_availability_query.
+Without --mongo-uri the regex path is evaluated in Python over the same
+documents (equivalent to the COLLSCAN MongoDB performs for it).
+
+Usage (from backend/):
+    python -m benchmarks.bench_product_search --products 30000 --queries 500
+    python -m benchmarks.bench_product_search --mongo-uri mongodb://localhost:27017 --database bench
+"""
+
+import argparse
+import json
+import re
+import time
+from benchmarks.synthetic import make_inventory_items, make_products, make_search_queries
+from app.chat_logic import EcommerceChatLogic
+from app.search import ProductSearchIndex
+
+
+def python_regex_search(items, keywords, limit=5):
+    """Evaluate the availability $regex query in Python (first `limit` matches in natural order)"""
+    patterns = [re.compile(re.escape(k), re.IGNORECASE) for k in keywords]
+    fields = ("product_name", "product_category", "product_brand", "product_department")
+    results = []
+    for item in items:
+        if any(p.search(item[f]) for p in patterns for f in fields):
+            results.append(item)
+            if len(results) == limit:
+                break
+    return results
+
+
+def build_index(products, items):
+    """Build a ProductSearchIndex directly from in-memory documents"""
+    stock = {}
+    for item in items:
+        stock[item["product_id"]] = stock.get(item["product_id"], 0) + (item["sold_at"] is None)
+    holder = ProductSearchIndex()
+    holder.index = holder.build_from_documents((dict(p) for p in products), stock)
+    return holder
+
+
+def time_queries(fn, queries):
+    """Run fn over every query, return (queries/sec, mean ms)"""
+    start = time.perf_counter()
+    for keywords in queries:
+        fn(keywords)
+    elapsed = time.perf_counter() - start
+    return round(len(queries) / elapsed, 1), round(elapsed / len(queries) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=30000)
+    parser.add_argument("--items-per-product", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--mongo-uri", default=None, help="time the real $regex query against this server")
+    parser.add_argument("--database", default="search_bench")
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    items = make_inventory_items(products, args.items_per_product)
+    queries = make_search_queries(args.queries)
+
+    start = time.perf_counter()
+    holder = build_index(products, items)
+    build_s = time.perf_counter() - start
+
+    results = {
+        "products": len(products),
+        "inventory_items": len(items),
+        "index_build_s": round(build_s, 3),
+    }
+    qps, mean_ms = time_queries(holder.search_availability, queries)
+    results["index"] = {"qps": qps, "mean_ms": mean_ms}
+    qps, mean_ms = time_queries(lambda k: python_regex_search(items, k), queries)
+    results["regex_python"] = {"qps": qps, "mean_ms": mean_ms}
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo_uri)[args.database]
+        db.inventory_items.drop()
+        db.inventory_items.insert_many(items, ordered=False)
+        logic = EcommerceChatLogic.__new__(EcommerceChatLogic)
+        qps, mean_ms = time_queries(
+            lambda k: list(db.inventory_items.find(logic.build_product_availability_query(k)).limit(5)), queries)
+        results["regex_mongo"] = {"qps": qps, "mean_ms": mean_ms}
+        db.client.drop_database(args.database)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Response serialization benchmark: fix_id + response_model validation vs direct JSON bytes
+
+Builds message documents shaped like MongoDB returns them (ObjectId _id,
+datetime timestamp) and times, per 1,000 messages:
+  validated  - fix_id copy + List[Message] validation + jsonable_encoder + json.dumps
+               (the response_model path)
+  encoder    - jsonable_encoder + json.dumps (a plain-dict return, no response_model)
+  fast       - app.serialization.dumps (orjson, or the json fallback)
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --sizes 100 1000 10000 --repeat 20
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import serialization
+from app.models import Message
+
+
+def make_messages(count, seed=41):
+    """Alternating user/ai message documents with ObjectId ids"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    conversation_id = str(ObjectId())
+    return [{
+        "_id": ObjectId(),
+        "conversation_id": conversation_id,
+        "sender": "user" if i % 2 == 0 else "ai",
+        "content": " ".join(rng.choice(["order", "status", "shipped", "return", "jeans", "socks",
+                                        "delivered", "tracking", "size", "refund"])
+                            for _ in range(rng.randint(5, 60))),
+        "timestamp": start + timedelta(seconds=i * 7),
+    } for i in range(count)]
+
+
+def validated(messages, adapter):
+    """What response_model=List[Message] does after fix_id"""
+    docs = [dict(m, _id=str(m["_id"])) for m in messages]
+    models = adapter.validate_python(docs)
+    return json.dumps(jsonable_encoder(models, by_alias=True)).encode()
+
+
+def encoder(messages):
+    """What a plain-dict return without response_model does"""
+    return json.dumps(jsonable_encoder(messages, custom_encoder={ObjectId: str})).encode()
+
+
+def time_per_thousand(fn, messages, repeat):
+    """Best-of-repeat milliseconds, scaled to 1,000 messages"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(messages)
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000 * 1000 / len(messages), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[Message])
+    orjson_module = serialization.orjson
+    results = []
+    for size in args.sizes:
+        messages = make_messages(size)
+        row = {
+            "messages": size,
+            "validated_ms_per_1k": time_per_thousand(lambda m: validated(m, adapter), messages, args.repeat),
+            "encoder_ms_per_1k": time_per_thousand(encoder, messages, args.repeat),
+        }
+        if orjson_module is not None:
+            row["fast_orjson_ms_per_1k"] = time_per_thousand(serialization.dumps, messages, args.repeat)
+        serialization.orjson = None
+        try:
+            row["fast_json_ms_per_1k"] = time_per_thousand(serialization.dumps, messages, args.repeat)
+        finally:
+            serialization.orjson = orjson_module
+        results.append(row)
+
+    print(json.dumps({"orjson": orjson_module is not None, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Streaming latency benchmark: time-to-first-token vs total latency
+
+Sends chat messages to /api/chat/stream of a running backend and measures,
+client-side, the time until the first `token` event and until the `done`
+event, next to the server-reported timings. Run the backend against the fake
+completion server (benchmarks.fake_llm_server) for reproducible numbers.
+
+Usage (from backend/):
+    python -m benchmarks.bench_streaming --base-url http://localhost:8000 --requests 50
+"""
+
+import argparse
+import json
+import time
+import httpx
+from benchmarks.bench_chat_throughput import MESSAGES, percentile
+
+
+def stream_once(client, message):
+    """Send one message, return (client ttft ms, client total ms, server timings)"""
+    start = time.perf_counter()
+    ttft_ms = None
+    server_timings = {}
+    event = None
+    with client.stream("POST", "/api/chat/stream", json={"user_id": "bench-stream", "message": message}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                if event == "token" and ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                elif event == "done":
+                    server_timings = json.loads(line[len("data:"):]).get("timings", {})
+    return ttft_ms or 0.0, (time.perf_counter() - start) * 1000, server_timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    ttfts, totals, server_ttfts = [], [], []
+    with httpx.Client(base_url=args.base_url, timeout=60) as client:
+        for i in range(args.requests):
+            ttft_ms, total_ms, server_timings = stream_once(client, MESSAGES[i % len(MESSAGES)])
+            ttfts.append(ttft_ms)
+            totals.append(total_ms)
+            if server_timings.get("ttft_ms") is not None:
+                server_ttfts.append(server_timings["ttft_ms"])
+
+    ttfts.sort()
+    totals.sort()
+    server_ttfts.sort()
+    print(json.dumps({
+        "requests": args.requests,
+        "client_ttft_ms": {"p50": round(percentile(ttfts, 50), 2), "p95": round(percentile(ttfts, 95), 2)},
+        "client_total_ms": {"p50": round(percentile(totals, 50), 2), "p95": round(percentile(totals, 95), 2)},
+        "server_ttft_ms": {"p50": round(percentile(server_ttfts, 50), 2), "p95": round(percentile(server_ttfts, 95), 2)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
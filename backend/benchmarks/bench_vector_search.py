@@ -0,0 +1,175 @@
+"""
+Semantic product retrieval benchmark (app.vector_search)
+
+Embeds a synthetic catalog at each --products size into a memory-mapped float32
+matrix (build_vectors, the same code the app runs) and reports:
+
+- build time, matrix size and process RSS once the matrix is mapped
+- queries/sec of single searches (embed + top-k cosine over the whole matrix)
+  and of --batch queries per matrix product
+- recall@k of the hashed embedding against exact sparse TF-IDF cosine over the
+  same features: a hit is any result scoring at least the exact k-th best
+  (synthetic catalogs repeat names, so ties are common), and within
+  --tolerance of it (hashing noise reorders near-ties, e.g. the same two words
+  in a longer or shorter name)
+- precision@5 of paraphrased questions ("something warm for winter") judged by
+  the catalog words they should reach
+
+No database access; the matrix is written to a temporary directory.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_search
+    python -m benchmarks.bench_vector_search --products 30000 1000000 --dims 128 256 --output results/vectors.json
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.search import tokenize
+from app.vector_search import ProductVectors, build_vectors, query_features
+from benchmarks import harness
+from benchmarks.synthetic import iter_products, make_search_queries
+
+WARM = {"fleece", "wool", "thermal", "sweater", "sweaters", "outerwear", "coats", "parka", "beanie", "scarf"}
+
+# (question, words a relevant product has in its name/category, department or None)
+PARAPHRASE_QUERIES = [
+    ("something warm for winter", WARM, None),
+    ("a gift for my dad", {"accessories", "scarf", "beanie"}, "Men"),
+    ("what should I wear to the gym", {"active", "leggings", "shorts"}, None),
+    ("comfy pajamas for my wife", {"sleep", "lounge"}, "Women"),
+    ("a jacket for rainy days", {"waterproof", "jacket", "jackets", "outerwear"}, None),
+    ("summer clothes for the beach", {"swim", "shorts", "lightweight", "tees"}, None),
+]
+
+
+def exact_scorer(features):
+    """Exact cosine over the sparse idf-weighted features (ground truth for recall)"""
+    counts = np.diff(features.indptr)
+    rows = np.repeat(np.arange(len(features.ids)), counts)
+    norms = np.sqrt(np.bincount(rows, weights=features.weights.astype(np.float64) ** 2,
+                                minlength=len(features.ids)))
+    normalized = features.weights / np.maximum(norms[rows], 1e-12)
+    order = np.argsort(features.feature_ids, kind="stable")
+    posting_rows, posting_weights = rows[order], normalized[order].astype(np.float32)
+    bounds = np.searchsorted(features.feature_ids[order], np.arange(len(features.vocabulary) + 1))
+
+    def score(text):
+        scores = np.zeros(len(features.ids), dtype=np.float32)
+        for feature, weight in query_features(text).items():
+            feature_id = features.vocabulary.get(feature)
+            if feature_id is None:
+                continue
+            start, stop = bounds[feature_id], bounds[feature_id + 1]
+            scores[posting_rows[start:stop]] += np.float32(weight * features.idf[feature_id]) * posting_weights[start:stop]
+        return scores
+
+    return score
+
+
+def recall_at_k(vectors, exact, queries, k, tolerance=0.0):
+    recalls = []
+    for text in queries:
+        query = vectors.embed_query(text)
+        if query is None:
+            continue
+        positions, _ = vectors.top_k(query[None, :], k)
+        scores = exact(text)
+        kth_best = np.partition(scores, len(scores) - k)[len(scores) - k]
+        recalls.append(float(np.mean(scores[positions[0]] >= kth_best * (1 - tolerance) - 1e-5)))
+    return round(float(np.mean(recalls)), 4) if recalls else None
+
+
+def queries_per_second(vectors, queries, k, batch):
+    # Fault the mapped pages in first: a running server keeps them in the page cache
+    vectors.search(queries[0], k)
+    start = time.perf_counter()
+    for text in queries:
+        vectors.search(text, k)
+    single = len(queries) / (time.perf_counter() - start)
+
+    embedded = np.stack([q for q in (vectors.embed_query(text) for text in queries) if q is not None])
+    start = time.perf_counter()
+    for i in range(0, len(embedded), batch):
+        vectors.top_k(embedded[i:i + batch], k)
+    batched = len(embedded) / (time.perf_counter() - start)
+    return round(single, 1), round(batched, 1)
+
+
+def paraphrase_precision(vectors, count, seed):
+    """precision@5 per paraphrased question (products re-generated to judge the hits)"""
+    hits = {text: [product_id for product_id, _ in vectors.search(text, 5)] for text, _, _ in PARAPHRASE_QUERIES}
+    wanted = {product_id for ids in hits.values() for product_id in ids}
+    products = {p["id"]: p for p in iter_products(count, seed) if p["id"] in wanted}
+    results = {}
+    for text, words, department in PARAPHRASE_QUERIES:
+        relevant = 0
+        for product_id in hits[text]:
+            product = products[product_id]
+            tokens = set(tokenize(product["name"])) | set(tokenize(product["category"]))
+            if tokens & words and (department is None or product["department"] == department):
+                relevant += 1
+        results[text] = relevant / 5 if hits[text] else 0.0
+    return results
+
+
+def run_scale(count, dim, args):
+    directory = tempfile.mkdtemp(prefix="vectors-")
+    try:
+        start = time.perf_counter()
+        features = build_vectors(iter_products(count, args.seed), directory, dim)
+        build_seconds = time.perf_counter() - start
+        rss_before = harness.rss_mb()
+        vectors = ProductVectors(directory)
+
+        queries = [" ".join(words) for words in make_search_queries(args.queries, args.seed)]
+        queries += [text for text, _, _ in PARAPHRASE_QUERIES]
+        single_qps, batched_qps = queries_per_second(vectors, queries, args.k, args.batch)
+        exact = exact_scorer(features)
+        recall_queries = queries[:args.recall_queries]
+        precision = paraphrase_precision(vectors, count, args.seed)
+        return {
+            "products": count,
+            "dim": dim,
+            "build_seconds": round(build_seconds, 2),
+            "matrix_mb": round(os.path.getsize(os.path.join(directory, "products.f32.npy")) / (1024 * 1024), 1),
+            "rss_before_mb": rss_before,
+            "rss_after_search_mb": harness.rss_mb(),
+            "single_qps": single_qps,
+            "batched_qps": batched_qps,
+            f"recall_at_{args.k}": recall_at_k(vectors, exact, recall_queries, args.k),
+            f"recall_at_{args.k}_within_tolerance": recall_at_k(vectors, exact, recall_queries, args.k, args.tolerance),
+            "paraphrase_precision_at_5": precision,
+            "paraphrase_mean_precision": round(sum(precision.values()) / len(precision), 3),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[30_000, 1_000_000])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--recall-queries", type=int, default=100, help="queries scored exactly for recall")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="relative score gap to the exact k-th best still counted as a hit")
+    parser.add_argument("--batch", type=int, default=32, help="queries per matrix product for batched_qps")
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    harness.emit("vector_search", {
+        "config": {"queries": args.queries, "k": args.k, "tolerance": args.tolerance,
+                   "batch": args.batch, "seed": args.seed},
+        "results": [run_scale(count, dim, args) for count in args.products for dim in args.dims],
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Local fake OpenAI-compatible chat completion server (Groq stand-in)
+
+Serves POST /v1/chat/completions, both regular and `stream: true` (SSE), with
+configurable latency and injected failures (HTTP errors, optionally with
+Retry-After) so LLM-dependent paths, including retries, the circuit breaker and
+OpenAI failover in app.llm_client, can be tested and benchmarked offline.
+Point the backend at it with GROQ_API_URL (and a second one with OPENAI_API_URL).
+
+Usage (from backend/):
+    python -m benchmarks.fake_llm_server --port 9100 --ttft-ms 300 --token-ms 20 --tokens 40
+    python -m benchmarks.fake_llm_server --port 9101 --error-rate 0.5 --error-status 429 --retry-after 1
+    GROQ_API_KEY=fake GROQ_API_URL=http://localhost:9100/v1/chat/completions uvicorn app.main:app
+
+GET /stats returns the request and injected error counts; POST /config changes
+the settings of a running server (e.g. {"error_rate": 1.0} to simulate an outage).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeLLMConfig:
+    """Latency and content of the fake completions"""
+
+    def __init__(self, ttft_ms=300, token_ms=20, tokens=40, model="fake-llm",
+                 error_rate=0.0, error_status=503, retry_after=None):
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.model = model
+        self.error_rate = error_rate      # share of requests answered with error_status
+        self.error_status = error_status
+        self.retry_after = retry_after    # Retry-After header (seconds) on injected errors
+
+
+def create_app(config=None):
+    """Build the fake completion app"""
+    config = config or FakeLLMConfig()
+    app = FastAPI(title="Fake LLM server")
+    app.state.config = config
+    app.state.requests = 0
+    app.state.errors = 0
+
+    def completion_tokens(messages):
+        last = messages[-1]["content"] if messages else ""
+        words = (f"Here is what I found about: {last}. " * config.tokens).split()
+        return [word + " " for word in words[:config.tokens]]
+
+    @app.post("/v1/chat/completions")
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        if config.error_rate and random.random() < config.error_rate:
+            app.state.errors += 1
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after is not None else None
+            return JSONResponse({"error": {"message": "injected failure"}},
+                                status_code=config.error_status, headers=headers)
+        body = await request.json()
+        tokens = completion_tokens(body.get("messages", []))
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep((config.ttft_ms + config.token_ms * len(tokens)) / 1000)
+            return JSONResponse({
+                "id": f"fake-{app.state.requests}",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", config.model),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+            })
+
+        async def stream():
+            await asyncio.sleep(config.ttft_ms / 1000)
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(config.token_ms / 1000)
+                chunk = {
+                    "id": f"fake-{app.state.requests}",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model", config.model),
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "errors": app.state.errors}
+
+    @app.post("/config")
+    async def update_config(request: Request):
+        for key, value in (await request.json()).items():
+            if hasattr(config, key):
+                setattr(config, key, value)
+        return vars(config)
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None)
+    args = parser.parse_args()
+    app = create_app(FakeLLMConfig(args.ttft_ms, args.token_ms, args.tokens,
+                                   error_rate=args.error_rate, error_status=args.error_status,
+                                   retry_after=args.retry_after))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
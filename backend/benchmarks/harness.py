@@ -0,0 +1,127 @@
+"""
+Shared setup and reporting for the benchmark suite
+
+Benchmarks that run the app in-process call use_database() (and optionally
+start_fake_llm()) BEFORE importing anything that opens a MongoDB client or the
+LLM client, since both read their settings when they are created. Results are
+emitted as one JSON document with run metadata so runs can be compared over time.
+"""
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.metrics import resident_memory_bytes
+
+from benchmarks.bench_chat_throughput import percentile
+
+# Scratch database for benchmark data (never the app's own database)
+BENCH_DATABASE = "ecommerce_bot_bench"
+
+
+def use_database(mongo_uri=None, database=BENCH_DATABASE):
+    """
+    Point the app at the benchmark database
+    With mongo_uri the app talks to that mongod; without it an in-process
+    mongomock server stands in (optional dependency: pip install mongomock).
+    Returns the backend name reported in the results.
+    """
+    settings.DATABASE_NAME = database
+    if mongo_uri:
+        settings.MONGO_URI = mongo_uri
+        return "mongod"
+
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("❌ No --mongo-uri given and mongomock is not installed "
+                 "(pip install mongomock for the in-process stand-in)")
+    from pymongo import uri_parser
+    mongomock.patch(servers=uri_parser.parse_uri(settings.MONGO_URI)["nodelist"]).start()
+    return "mongomock"
+
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_fake_llm(port, ttft_ms=50, token_ms=5, tokens=40):
+    """
+    Start benchmarks.fake_llm_server in a subprocess and use it as the Groq endpoint
+    Returns the process; terminate it when the run is over.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port),
+         "--ttft-ms", str(ttft_ms), "--token-ms", str(token_ms), "--tokens", str(tokens)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if not wait_for_port("127.0.0.1", port):
+        process.terminate()
+        sys.exit(f"❌ Fake LLM server did not start on port {port}")
+    settings.GROQ_API_KEY = settings.GROQ_API_KEY or "fake"
+    settings.GROQ_API_URL = f"http://127.0.0.1:{port}/v1/chat/completions"
+    return process
+
+
+def rss_mb():
+    return round(resident_memory_bytes() / (1024 * 1024), 1)
+
+
+def latency_summary(latencies_ms, elapsed_s, errors=0):
+    """Throughput and p50/p95/p99 of a list of request latencies"""
+    latencies = sorted(latencies_ms)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed_s, 1) if elapsed_s else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata():
+    """Where and when the numbers were taken"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def emit(benchmark, results, output=None):
+    """Print the results as JSON (and write them to output, e.g. results/<date>.json)"""
+    document = {"benchmark": benchmark, "run": run_metadata(), **results}
+    text = json.dumps(document, indent=2, default=str)
+    print(text)
+    if output:
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    return document
@@ -0,0 +1,307 @@
+"""
+Synthetic thelook-shaped records for benchmarks
+Deterministic for a given seed so runs are comparable.
+"""
+
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+BRANDS = ["Allegra K", "Calvin Klein", "Carhartt", "Columbia", "Hanes", "Levi's", "Nike",
+          "ONE", "Quiksilver", "Tommy Hilfiger", "Under Armour", "Wrangler"]
+CATEGORIES = ["Accessories", "Active", "Blazers & Jackets", "Dresses", "Fashion Hoodies & Sweatshirts",
+              "Intimates", "Jeans", "Outerwear & Coats", "Pants", "Shorts", "Sleep & Lounge",
+              "Socks", "Sweaters", "Swim", "Tops & Tees", "Underwear"]
+DEPARTMENTS = ["Men", "Women"]
+ADJECTIVES = ["Classic", "Cotton", "Denim", "Fleece", "Lightweight", "Satin", "Slim Fit",
+              "Striped", "Thermal", "Vintage", "Waterproof", "Wool"]
+NOUNS = ["Beanie", "Boxer", "Cardigan", "Dress", "Headband", "Hoodie", "Jacket", "Jeans",
+         "Leggings", "Parka", "Scarf", "Shirt", "Shorts", "Socks", "Sweater", "T-Shirt"]
+
+
+def iter_products(count, seed=41):
+    """Generate products-collection documents one at a time (large catalogs)"""
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        brand = rng.choice(BRANDS)
+        yield {
+            "id": i,
+            "name": f"{brand} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+            "brand": brand,
+            "category": rng.choice(CATEGORIES),
+            "department": rng.choice(DEPARTMENTS),
+            "retail_price": round(rng.uniform(5, 150), 2),
+            "sku": f"SKU{i:08d}",
+        }
+
+
+def make_products(count, seed=41):
+    """Generate products-collection documents"""
+    return list(iter_products(count, seed))
+
+
+def make_inventory_items(products, per_product=3, seed=41):
+    """Generate inventory_items documents (denormalized product fields, sold_at set for sold items)"""
+    rng = random.Random(seed)
+    items = []
+    item_id = 1
+    for product in products:
+        for _ in range(per_product):
+            items.append({
+                "id": item_id,
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "product_brand": product["brand"],
+                "product_category": product["category"],
+                "product_department": product["department"],
+                "product_retail_price": product["retail_price"],
+                "product_sku": product["sku"],
+                "sold_at": "2023-01-01 00:00:00 UTC" if rng.random() < 0.6 else None,
+            })
+            item_id += 1
+    return items
+
+
+# Terms that match nothing - the worst case for an unindexed scan
+MISSING_TERMS = ["cashmere", "tuxedo", "kimono", "poncho"]
+
+
+def make_search_queries(count, seed=7, missing_ratio=0.2):
+    """Keyword lists as produced by EcommerceChatLogic.extract_product_info"""
+    rng = random.Random(seed)
+    vocab = [w.lower() for w in ADJECTIVES + NOUNS + BRANDS]
+    queries = []
+    for _ in range(count):
+        if rng.random() < missing_ratio:
+            queries.append([rng.choice(MISSING_TERMS)])
+        else:
+            queries.append([rng.choice(vocab), rng.choice(vocab)])
+    return queries
+
+
+# ============================================================================
+# THELOOK-SHAPED CSV DATASETS
+# ============================================================================
+# Row counts relative to inventory_items, taken from the real thelook dataset
+# (~490k inventory items, 29k products, 100k users, 125k orders, 181k order items)
+SCALE_RATIOS = {"products": 1 / 17, "users": 1 / 5, "orders": 1 / 4, "order_items": 1 / 3}
+
+DISTRIBUTION_CENTERS = [
+    (1, "Memphis TN", 35.1174, -89.9711), (2, "Chicago IL", 41.8369, -87.6847),
+    (3, "Houston TX", 29.7604, -95.3698), (4, "Los Angeles CA", 34.05, -118.25),
+    (5, "New Orleans LA", 29.95, -90.0667),
+    (6, "Port Authority of New York/New Jersey NY/NJ", 40.634, -73.7834),
+    (7, "Philadelphia PA", 39.95, -75.1667), (8, "Mobile AL", 30.6944, -88.0431),
+    (9, "Charleston SC", 32.7833, -79.9333), (10, "Savannah GA", 32.0167, -81.1167),
+]
+# (city, state, country, latitude, longitude)
+CITIES = [
+    ("Rio Branco", "Acre", "Brasil", -9.9747, -67.8076),
+    ("São Paulo", "São Paulo", "Brasil", -23.5505, -46.6333),
+    ("Chicago", "Illinois", "United States", 41.8781, -87.6298),
+    ("Houston", "Texas", "United States", 29.7604, -95.3698),
+    ("Shanghai", "Shanghai", "China", 31.2304, 121.4737),
+    ("Guangzhou", "Guangdong", "China", 23.1291, 113.2644),
+    ("Seoul", "Seoul", "South Korea", 37.5665, 126.978),
+    ("Madrid", "Madrid", "Spain", 40.4168, -3.7038),
+    ("Paris", "Île-de-France", "France", 48.8566, 2.3522),
+    ("Berlin", "Berlin", "Germany", 52.52, 13.405),
+]
+FIRST_NAMES = ["Amanda", "Brian", "Carlos", "Diana", "Emily", "Felipe", "Grace", "Hiro",
+               "Isabel", "James", "Kim", "Lucas", "Maria", "Noah", "Olivia", "Paul"]
+LAST_NAMES = ["Gilmore", "Smith", "Johnson", "Garcia", "Lee", "Martin", "Nguyen", "Silva",
+              "Brown", "Davis", "Kim", "Lopez"]
+TRAFFIC_SOURCES = ["Search", "Organic", "Facebook", "Email", "Display"]
+ORDER_STATUSES = ["Complete", "Shipped", "Processing", "Cancelled", "Returned"]
+
+COLUMNS = {
+    "distribution_centers": ["id", "name", "latitude", "longitude"],
+    "products": ["id", "cost", "category", "name", "brand", "retail_price", "department",
+                 "sku", "distribution_center_id"],
+    "users": ["id", "first_name", "last_name", "email", "age", "gender", "state",
+              "street_address", "postal_code", "city", "country", "latitude", "longitude",
+              "traffic_source", "created_at"],
+    "orders": ["order_id", "user_id", "status", "gender", "created_at", "returned_at",
+               "shipped_at", "delivered_at", "num_of_item"],
+    "order_items": ["id", "order_id", "user_id", "product_id", "inventory_item_id", "status",
+                    "created_at", "shipped_at", "delivered_at", "returned_at", "sale_price"],
+    "inventory_items": ["id", "product_id", "created_at", "sold_at", "cost", "product_category",
+                        "product_name", "product_brand", "product_retail_price",
+                        "product_department", "product_sku", "product_distribution_center_id"],
+}
+
+EPOCH = datetime(2022, 1, 1)
+
+
+def scale_counts(inventory_rows):
+    """Row count per collection for a given number of inventory items"""
+    counts = {name: max(10, int(inventory_rows * ratio)) for name, ratio in SCALE_RATIOS.items()}
+    counts["inventory_items"] = inventory_rows
+    counts["distribution_centers"] = len(DISTRIBUTION_CENTERS)
+    return counts
+
+
+def _pick(i, salt, n):
+    """Deterministic pseudo-random index in [0, n) for row i (stable across files)"""
+    return ((i * 2654435761 + salt * 40503) & 0xFFFFFFFF) % n
+
+
+def _timestamp(minutes):
+    return (EPOCH + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+def _order_dates(order_id, status):
+    """created, shipped, delivered, returned timestamps consistent with the status"""
+    created = _pick(order_id, 3, 60 * 24 * 600)
+    shipped = _timestamp(created + 60 * 24) if status in ("Shipped", "Complete", "Returned") else None
+    delivered = _timestamp(created + 60 * 24 * 4) if status in ("Complete", "Returned") else None
+    returned = _timestamp(created + 60 * 24 * 9) if status == "Returned" else None
+    return _timestamp(created), shipped, delivered, returned
+
+
+def _product_row(product_id, rng):
+    brand = rng.choice(BRANDS)
+    price = round(rng.uniform(5, 150), 2)
+    return [product_id, round(price * rng.uniform(0.35, 0.6), 2), rng.choice(CATEGORIES),
+            f"{brand} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}", brand, price,
+            rng.choice(DEPARTMENTS), f"SKU{product_id:08d}", _pick(product_id, 1, 10) + 1]
+
+
+def write_thelook_datasets(directory, inventory_rows, seed=41):
+    """
+    Write the six thelook CSVs data_loader reads, scaled to inventory_rows
+    Rows are streamed to disk (nothing is held in memory but the product table),
+    and foreign keys line up: order items point at existing orders, users,
+    products and sold inventory items. Returns the row count per collection.
+    """
+    os.makedirs(directory, exist_ok=True)
+    counts = scale_counts(inventory_rows)
+    rng = random.Random(seed)
+
+    def writer(name):
+        f = open(os.path.join(directory, f"{name}.csv"), "w", newline="", encoding="utf-8")
+        out = csv.writer(f)
+        out.writerow(COLUMNS[name])
+        return f, out
+
+    f, out = writer("distribution_centers")
+    with f:
+        out.writerows(DISTRIBUTION_CENTERS)
+
+    products = [_product_row(i, rng) for i in range(1, counts["products"] + 1)]
+    f, out = writer("products")
+    with f:
+        out.writerows(products)
+
+    f, out = writer("users")
+    with f:
+        for user_id in range(1, counts["users"] + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            city, state, country, lat, lon = CITIES[_pick(user_id, 2, len(CITIES))]
+            out.writerow([user_id, first, last, f"{first.lower()}{last.lower()}{user_id}@example.com",
+                          rng.randint(12, 70), "FM"[user_id % 2], state,
+                          f"{rng.randint(1, 9999)} {rng.choice(LAST_NAMES)} Street",
+                          f"{rng.randint(10000, 99999)}", city, country,
+                          round(lat + rng.uniform(-0.2, 0.2), 5), round(lon + rng.uniform(-0.2, 0.2), 5),
+                          rng.choice(TRAFFIC_SOURCES), _timestamp(rng.randint(0, 60 * 24 * 365))])
+
+    # Order item k belongs to order (k % orders) + 1 and sells inventory item k + 1
+    order_count, item_count = counts["orders"], counts["order_items"]
+
+    def order_user(order_id):
+        return _pick(order_id, 4, counts["users"]) + 1
+
+    def order_status(order_id):
+        return ORDER_STATUSES[_pick(order_id, 5, len(ORDER_STATUSES))]
+
+    def item_product(item_id):
+        return products[_pick(item_id, 6, len(products))]
+
+    f, out = writer("orders")
+    with f:
+        for order_id in range(1, order_count + 1):
+            status = order_status(order_id)
+            created, shipped, delivered, returned = _order_dates(order_id, status)
+            items = item_count // order_count + (1 if order_id <= item_count % order_count else 0)
+            out.writerow([order_id, order_user(order_id), status, "FM"[order_user(order_id) % 2],
+                          created, returned, shipped, delivered, items])
+
+    f, out = writer("order_items")
+    with f:
+        for k in range(item_count):
+            order_id = k % order_count + 1
+            status = order_status(order_id)
+            created, shipped, delivered, returned = _order_dates(order_id, status)
+            product = item_product(k + 1)
+            out.writerow([k + 1, order_id, order_user(order_id), product[0], k + 1, status,
+                          created, shipped, delivered, returned, product[5]])
+
+    f, out = writer("inventory_items")
+    with f:
+        for item_id in range(1, inventory_rows + 1):
+            product = item_product(item_id)
+            # Items sold by order item k were stocked before that order was placed
+            stocked = _pick(item_id, 7, 60 * 24 * 600)
+            sold_at = None
+            if item_id <= item_count:
+                sold_at, _, _, _ = _order_dates((item_id - 1) % order_count + 1, "Complete")
+                stocked = _pick((item_id - 1) % order_count + 1, 3, 60 * 24 * 600) - _pick(item_id, 8, 60 * 24 * 90)
+            out.writerow([item_id, product[0], _timestamp(stocked), sold_at,
+                          product[1], product[2], product[3], product[4], product[5], product[6],
+                          product[7], product[8]])
+
+    return counts
+
+
+# ============================================================================
+# CHAT MESSAGE MIX
+# ============================================================================
+# (intent, weight, templates) - weights approximate support traffic: mostly
+# order tracking and product questions, a tail of policy/help messages.
+# Placeholders are filled with ids that exist in a dataset of the given counts.
+MESSAGE_MIX = [
+    ("order", 0.24, ["What is the status of order {order}?", "where is my order #{order}",
+                     "order number {order} status please"]),
+    ("availability", 0.15, ["satin headband price", "is the denim jacket available in size M?",
+                            "do you have a wool jacket in stock?", 'do you sell "{phrase}"']),
+    ("product", 0.12, ["product {product}", "tell me about product id {product}"]),
+    ("user", 0.10, ["user {user}", "can you look up user id {user}"]),
+    ("category", 0.08, ["what products you have under socks category?", "show accessories",
+                        "list the socks"]),
+    ("policy", 0.08, ["what is your return policy?", "how do I get a refund"]),
+    ("help", 0.08, ["hello", "thanks", "help"]),
+    ("location", 0.05, ["any user from Rio Branco", "users by location please"]),
+    ("user_orders", 0.05, ["customer id {user} product details"]),
+    ("analytics", 0.03, ["top selling products this week", "revenue by category",
+                         "how many orders are still Processing"]),
+    ("shipping", 0.03, ["when will order {order} arrive", "where does order {order} ship from",
+                        "shipping time to user {user}"]),
+    ("multi_entity", 0.05, ["order {order} and order {order2} for user {user}",
+                            "compare product {product} and product {product2}"]),
+]
+
+
+def make_chat_messages(count, counts=None, seed=7):
+    """
+    Weighted message mix for replaying through /api/chat
+    Returns (intent, message) pairs; ids are drawn from the given dataset counts.
+    """
+    counts = counts or scale_counts(10_000)
+    rng = random.Random(seed)
+    intents = [intent for intent, _, _ in MESSAGE_MIX]
+    weights = [weight for _, weight, _ in MESSAGE_MIX]
+    templates = {intent: options for intent, _, options in MESSAGE_MIX}
+    # Socks would route to the socks category instead
+    phrases = [f"{adjective} {noun}".lower() for adjective in ADJECTIVES for noun in NOUNS
+               if noun != "Socks"]
+
+    messages = []
+    for intent in rng.choices(intents, weights, k=count):
+        template = rng.choice(templates[intent])
+        messages.append((intent, template.format(
+            order=rng.randint(1, counts["orders"]), order2=rng.randint(1, counts["orders"]),
+            user=rng.randint(1, counts["users"]), product=rng.randint(1, counts["products"]),
+            product2=rng.randint(1, counts["products"]), phrase=rng.choice(phrases),
+        )))
+    return messages